@@ -16,5 +16,5 @@ import sys
 # see https://www.python.org/dev/peps/pep-0440/
 __version__ = '0.1.2'
 
-__all__ = ['cur', 'dmd', 'eigen', 'interp_decomp', 'lu', 'nmf', 'pca',
-           'qb', 'sketch', 'svd', 'utils']
+__all__ = ['autotune', 'cur', 'dmd', 'eigen', 'estimate', 'interp_decomp', 'lu', 'nmf', 'pca',
+           'qb', 'qr', 'sketch', 'svd', 'utils']
@@ -0,0 +1,279 @@
+"""
+Autotuning of Randomized Decomposition Parameters.
+"""
+# Authors: N. Benjamin Erichson
+#          Joseph Knox
+# License: GNU General Public License v3.0
+from __future__ import division
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+from scipy import sparse
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # pragma: no cover
+    threadpool_limits = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+_CACHE_ENV = 'RISTRETTO_CACHE_DIR'
+_CACHE_FILE = 'autotune.json'
+
+
+def _hardware_fingerprint():
+    """hash of the properties of the machine which influence the timings"""
+    info = (platform.system(), platform.machine(), platform.processor(),
+            str(os.cpu_count()), np.__version__)
+    return hashlib.sha1('|'.join(info).encode('utf8')).hexdigest()[:16]
+
+
+def _bucket(x):
+    """round x up to the next power of two"""
+    return 1 << max(int(x) - 1, 0).bit_length()
+
+
+def _default_cache_path():
+    cache_dir = os.environ.get(_CACHE_ENV)
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+            'ristretto')
+    return os.path.join(cache_dir, _CACHE_FILE)
+
+
+class AutotuneCache(object):
+    """On-disk cache of tuned parameter plans.
+
+    Plans are stored as json, keyed by hardware fingerprint, routine, shape
+    bucket and dtype. The file is read once, hits are served from memory.
+    New plans are merged under a file lock with the plans other processes
+    stored in the meantime, and the file is replaced atomically. If more
+    than `max_entries` plans are stored, the least recently used ones are
+    evicted, counting the hits served from memory.
+
+    Parameters
+    ----------
+    path : str or None, optional (default ``None``)
+        Location of the cache file. If None, the file `autotune.json` in the
+        directory `$RISTRETTO_CACHE_DIR` (or `~/.cache/ristretto`) is used.
+
+    max_entries : integer, optional (default: 128)
+        Maximum number of plans to keep.
+    """
+
+    def __init__(self, path=None, max_entries=128):
+        if max_entries < 1:
+            raise ValueError('max_entries must be >= 1, not %d' % max_entries)
+
+        self.path = _default_cache_path() if path is None else path
+        self.max_entries = max_entries
+        self._entries = None
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    @contextmanager
+    def _lock(self):
+        """exclusive lock of the cache file across processes"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        if fcntl is None:  # pragma: no cover
+            yield
+            return
+
+        with open(self.path + '.lock', 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _merge(self):
+        """re-read the entries on disk and add the hits served from memory,
+        must be called under the lock"""
+        entries = self._read()
+        for key, entry in self._load().items():
+            if key in entries:
+                entries[key]['last_used'] = max(entries[key]['last_used'],
+                                                 entry['last_used'])
+        self._entries = entries
+        return entries
+
+    def _dump(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+
+        # write atomically, so concurrent processes never see partial files
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._entries, f, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self._load())
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def get(self, key):
+        """Return the plan stored under `key` or None."""
+        entry = self._load().get(key)
+        if entry is None:
+            return None
+        entry['last_used'] = time.time()
+        return entry['plan']
+
+    def put(self, key, plan):
+        """Store `plan` under `key`, evicting the least recently used plans."""
+        with self._lock():
+            entries = self._merge()
+            entries[key] = {'plan': plan, 'last_used': time.time()}
+
+            if len(entries) > self.max_entries:
+                lru = sorted(entries, key=lambda k: entries[k]['last_used'])
+                for k in lru[:len(entries) - self.max_entries]:
+                    del entries[k]
+
+            self._dump()
+
+    def clear(self):
+        """Remove all plans."""
+        with self._lock():
+            self._entries = {}
+            self._dump()
+
+
+_DEFAULT_CACHES = {}
+
+
+def get_default_cache():
+    """Return the default on-disk cache, shared by all calls of a process."""
+    path = _default_cache_path()
+    if path not in _DEFAULT_CACHES:
+        _DEFAULT_CACHES[path] = AutotuneCache(path)
+    return _DEFAULT_CACHES[path]
+
+
+def get_cache_key(name, A, rank, oversample, n_subspace):
+    """Key of the shape class of `A` for the routine `name`."""
+    m, n = A.shape
+    kind = 'sparse' if sparse.issparse(A) else 'dense'
+    return '%s|%s|%dx%d|l%d|q%d|%s|%s' % (
+        name, _hardware_fingerprint(), _bucket(m), _bucket(n),
+        _bucket(rank + oversample), n_subspace, np.dtype(A.dtype).name, kind)
+
+
+def candidate_plans(A, rank, oversample):
+    """Generate the parameter plans which are benchmarked.
+
+    The candidates differ in the sketch (dense or sparse), the number of
+    row blocks and, if `threadpoolctl` is available, the number of BLAS
+    threads.
+    """
+    m = A.shape[0]
+    l = rank + oversample
+
+    n_threads = [None]
+    if threadpool_limits is not None:
+        n_cpus = os.cpu_count() or 1
+        n_threads = sorted(set([n_cpus, max(n_cpus // 2, 1), 1]), reverse=True)
+
+    plans = []
+    for sparse_sketch in (False, True):
+        for n_blocks in (1, 2, 4):
+            # each block has to be large enough to be sketched
+            if n_blocks > 1 and m // n_blocks < l:
+                continue
+            for threads in n_threads:
+                plans.append({'sparse': sparse_sketch, 'n_blocks': n_blocks,
+                              'n_threads': threads})
+    return plans
+
+
+def run_plan(func, plan, A, rank, **kwargs):
+    """Call `func` with the parameters of `plan`."""
+    kwargs = dict(kwargs, sparse=plan['sparse'], n_blocks=plan['n_blocks'])
+
+    n_threads = plan.get('n_threads')
+    if n_threads is None or threadpool_limits is None:
+        return func(A, rank, **kwargs)
+
+    with threadpool_limits(limits=n_threads, user_api='blas'):
+        return func(A, rank, **kwargs)
+
+
+def tune(func, A, rank, oversample=10, n_subspace=2, cache=None,
+         random_state=None):
+    """Look up or determine the fastest parameter plan for `func`.
+
+    On the first call for a shape class every candidate plan is timed on `A`
+    and the winner is stored in `cache`. Subsequent calls return the cached
+    plan without any tuning overhead.
+
+    Parameters
+    ----------
+    func : callable
+        Routine with signature `func(A, rank, oversample=, n_subspace=,
+        n_blocks=, sparse=, random_state=)`, e.g., `compute_rqb`.
+
+    A : array_like, shape `(m, n)`.
+        Input array.
+
+    rank : integer
+        Target rank.
+
+    oversample : integer, optional (default: 10)
+        Oversampling parameter passed to `func`.
+
+    n_subspace : integer, default: 2.
+        Number of subspace iterations passed to `func`.
+
+    cache : AutotuneCache or None, optional (default ``None``)
+        Cache to use. If None, the default on-disk cache is used.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        Passed to `func` during benchmarking.
+
+    Returns
+    -------
+    plan : dict
+        Tuned values of `sparse`, `n_blocks` and `n_threads`.
+    """
+    if cache is None:
+        cache = get_default_cache()
+
+    key = get_cache_key(func.__name__, A, rank, oversample, n_subspace)
+    plan = cache.get(key)
+    if plan is not None:
+        return plan
+
+    timings = []
+    for candidate in candidate_plans(A, rank, oversample):
+        t0 = time.perf_counter()
+        run_plan(func, candidate, A, rank, oversample=oversample,
+                 n_subspace=n_subspace, random_state=random_state)
+        timings.append((time.perf_counter() - t0, candidate))
+
+    plan = min(timings, key=lambda t: t[0])[1]
+    cache.put(key, plan)
+    return plan
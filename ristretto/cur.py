@@ -8,11 +8,121 @@ from __future__ import division
 
 import numpy as np
 from scipy import linalg
+from scipy import sparse as sp
+from sklearn.utils import check_random_state
+from sklearn.utils.extmath import safe_sparse_dot
+
+from .estimate import _check_estimate_error, estimate_residual_norm
+from .interp_decomp import _column_norms_sq, compute_interp_decomp
+from .qb import compute_rqb
+from .utils import conjugate_transpose, _asarray_chkfinite
+
+
+def _indexable(A):
+    """A itself if it supports slicing, otherwise A as CSR matrix"""
+    return A if A.format in ('csr', 'csc') else A.tocsr()
+
+
+def _column_skeleton(A, J):
+    """columns J of A, as CSC matrix if A is sparse"""
+    if sp.issparse(A):
+        # slice first, only the skeleton is converted
+        return _indexable(A)[:, J].tocsc()
+    return A[:, J]
+
+
+def _row_skeleton(A, I):
+    """rows I of A, as CSR matrix if A is sparse"""
+    if sp.issparse(A):
+        return _indexable(A)[I, :].tocsr()
+    return A[I, :]
+
+
+_VALID_CORES = ('lstsq', 'intersection', 'pinv')
+_VALID_SAMPLINGS = ('norm', 'leverage')
+
+
+def _compute_core(A, V, R, I, J, core):
+    """compute U of the CUR from the interpolation matrix V, `V = U * R`"""
+    if core is None:
+        core = 'intersection' if sp.issparse(A) else 'lstsq'
+
+    if core == 'intersection':
+        # pseudo-inverse of the (rank, rank) intersection A[I, J]
+        if sp.issparse(A):
+            W = _indexable(A)[I][:, J].toarray()
+        else:
+            W = A[np.ix_(I, J)]
+        return linalg.pinv(W)
+
+    R = R.toarray() if sp.issparse(R) else R
+    if core == 'pinv':
+        return V.dot(linalg.pinv(R))
+
+    # least-squares solution of U * R = V via the QR decomposition of R.H,
+    # i.e., U = V * Q * R11**-H
+    Q, R11 = linalg.qr(conjugate_transpose(R), mode='economic',
+                       check_finite=False)
+    W = conjugate_transpose(V.dot(Q))
+    # R11 has noise level singular values if `rank` exceeds the numerical
+    # rank of A, which are truncated like in a pseudo-inverse
+    cond = np.sqrt(np.finfo(R11.dtype).eps)
+    U = linalg.lstsq(R11, W, cond=cond, check_finite=False)[0]
+    return conjugate_transpose(U)
+
+
+# number of entries of the row blocks of the single pass norm computation
+_NORM_CHUNK = 2**16
+
+
+def _abs_sq(x):
+    if np.iscomplexobj(x):
+        return x.real**2 + x.imag**2
+    return x * x
+
+
+def _squared_norms(A):
+    """squared column and row norms of a dense or sparse A, in one pass"""
+    m, n = A.shape
+    if sp.issparse(A):
+        if A.format not in ('csr', 'csc'):
+            A = A.tocsr()
+        # squared entries, summed by minor index and by major index
+        data = _abs_sq(A.data)
+        n_major = A.indptr.size - 1
+        minor = np.bincount(A.indices, weights=data,
+                            minlength=n if A.format == 'csr' else m)
+        major = np.bincount(np.repeat(np.arange(n_major), np.diff(A.indptr)),
+                            weights=data, minlength=n_major)
+        return (minor, major) if A.format == 'csr' else (major, minor)
+
+    col_norms = np.zeros(n)
+    row_norms = np.empty(m)
+    step = max(_NORM_CHUNK // max(n, 1), 1)
+    for start in range(0, m, step):
+        block = _abs_sq(A[start:start + step])
+        col_norms += block.sum(axis=0)
+        row_norms[start:start + step] = block.sum(axis=1)
+    return col_norms, row_norms
+
+
+def _sample(weights, size, exclude, random_state):
+    """sample indices without replacement with probabilities proportional
+    to weights, skipping the indices in exclude"""
+    p = np.array(weights, dtype=np.float64)
+    p[exclude] = 0
+    size = min(size, np.count_nonzero(p))
+    if size == 0:
+        return np.empty(0, dtype=np.intp)
+    return random_state.choice(p.size, size, replace=False, p=p / p.sum())
+
 
-from .interp_decomp import compute_interp_decomp, compute_rinterp_decomp
-
-
-def compute_cur(A, rank=None, index_set=False):
+def _dense(A):
+    return A.toarray() if sp.issparse(A) else np.asarray(A)
+
+
+def compute_cur(A, rank=None, index_set=False, qr_method='householder',
+                random_state=None, core=None):
     """CUR decomposition.
 
     Algorithm for computing the low-rank CUR
@@ -23,10 +133,13 @@ def compute_cur(A, rank=None, index_set=False):
     a subset of rows of `A` also called the partial row skeleton.
     The factor matrix `U` is formed so that `U = C**-1 * A * R**-1` is satisfied.
 
+    If `A` is sparse, `C` is returned as CSC and `R` as CSR matrix.
+    The pivoted QR decompositions still work on a dense copy of `A`.
+
 
     Parameters
     ----------
-    A : array_like, shape `(m, n)`.
+    A : array_like or sparse matrix, shape `(m, n)`.
         Input array.
 
     rank : integer
@@ -35,6 +148,26 @@ def compute_cur(A, rank=None, index_set=False):
     index_set: str `{'True', 'False'}`, default: `index_set='False'`.
         'True' : Return column/row index set instead of `C` and `R`.
 
+    qr_method : str `{'householder', 'randomized'}`, default: `qr_method='householder'`.
+        Column pivoted QR decomposition used for the skeletons,
+        see `compute_interp_decomp`.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+        Only used if `qr_method='randomized'`.
+
+    core : str `{'lstsq', 'intersection', 'pinv'}` or None, optional (default ``None``)
+        How `U` is computed from the interpolation matrix `V` of the column ID.
+        'lstsq' : Least-squares solution of `U * R = V` via a QR decomposition
+        of `R`, `O(n * rank**2)`, singular values of `R` below `sqrt(eps)`
+        times the largest one are truncated.
+        'intersection' : Pseudo-inverse of the intersection `A[I, J]`,
+        `O(rank**3)`, exact if `A` has rank `rank`.
+        'pinv' : `V * pinv(R)` via the SVD of `R`.
+        None selects 'intersection' for sparse and 'lstsq' for dense `A`.
+
     Returns
     -------
     C:  array_like, shape `(m, k)`.
@@ -55,20 +188,35 @@ def compute_cur(A, rank=None, index_set=False):
     and GPU architectures" (2015).
     (available at `arXiv <http://arxiv.org/abs/1502.05366>`_).
     """
+    if core is not None and core not in _VALID_CORES:
+        raise ValueError('core must be one of %s, not %s'
+                         % (' '.join(_VALID_CORES), core))
+
+    random_state = check_random_state(random_state)
+
+    # converts A to array, raise ValueError if A has inf or nan
+    A = _asarray_chkfinite(A)
+    is_sparse = sp.issparse(A)
+
     # compute column ID
-    J, V = compute_interp_decomp(A, rank, mode='column', index_set=True)
+    J, V = compute_interp_decomp(A.toarray() if is_sparse else A, rank,
+                                 mode='column', index_set=True,
+                                 qr_method=qr_method, random_state=random_state,
+                                 compact=True)
 
     # select column subset
-    C = A[:, J]
+    C = _column_skeleton(A, J)
 
     # compute row ID of C
-    Z, I = compute_interp_decomp(C, rank, mode='row', index_set=True)
+    Z, I = compute_interp_decomp(C.toarray() if is_sparse else C, rank,
+                                 mode='row', index_set=True,
+                                 qr_method=qr_method, random_state=random_state)
 
     # select row subset
-    R = A[I, :]
+    R = _row_skeleton(A, I)
 
     # compute U
-    U = V.dot(linalg.pinv2(R))
+    U = _compute_core(A, V, R, I, J, core)
 
     # return ID
     if index_set:
@@ -76,7 +224,9 @@ def compute_cur(A, rank=None, index_set=False):
     return C, U, R
 
 
-def compute_rcur(A, rank, oversample=10, n_subspace=2, index_set=False, random_state=None):
+def compute_rcur(A, rank, oversample=10, n_subspace=2, index_set=False,
+                 random_state=None, estimate_error=False, confidence=0.99,
+                 core=None):
     """Randomized CUR decomposition.
 
     Randomized algorithm for computing the approximate low-rank CUR
@@ -87,14 +237,21 @@ def compute_rcur(A, rank, oversample=10, n_subspace=2, index_set=False, random_s
     a subset of rows of `A` also called the partial row skeleton.
     The factor matrix `U` is formed so that `U = C**-1 * A * R**-1` is satisfied.
 
+    A single randomized QB decomposition `A = Q * B` is computed. The column
+    skeleton is selected by a column ID of `B`, and the row skeleton by a
+    row ID of the selected columns `C`, so `A` is only sketched once.
+
     The quality of the approximation can be controlled via the oversampling
     parameter `oversample` and `n_subspace` which specifies the number of
     subspace iterations.
 
+    If `A` is sparse, it is never densified: `C` is returned as CSC and `R`
+    as CSR matrix.
+
 
     Parameters
     ----------
-    A : array_like, shape `(m, n)`.
+    A : array_like or sparse matrix, shape `(m, n)`.
         Input array.
 
     rank : integer
@@ -116,6 +273,17 @@ def compute_rcur(A, rank, oversample=10, n_subspace=2, index_set=False, random_s
         If RandomState instance, random_state is the random number generator;
         If None, the random number generator is the RandomState instance used by np.random.
 
+    estimate_error : bool or str `{'spectral', 'fro'}`, optional (default: False)
+        If not False, an upper bound of the chosen norm of the residual
+        `A - C * U * R` is computed with a few Gaussian probes and returned
+        as well. True selects the spectral norm.
+
+    confidence : float, optional (default: 0.99)
+        Probability with which the error bound holds.
+
+    core : str `{'lstsq', 'intersection', 'pinv'}` or None, optional (default ``None``)
+        How `U` is computed, see `compute_cur`.
+
 
     Returns
     -------
@@ -128,6 +296,9 @@ def compute_rcur(A, rank, oversample=10, n_subspace=2, index_set=False, random_s
     R : array_like, shape `(rank, n)`.
             Partial row skeleton.
 
+    err : float, if `estimate_error` is not False.
+            Upper bound of the norm of `A - C * U * R`.
+
 
     References
     ----------
@@ -137,26 +308,185 @@ def compute_rcur(A, rank, oversample=10, n_subspace=2, index_set=False, random_s
     and GPU architectures" (2015).
     (available at `arXiv <http://arxiv.org/abs/1502.05366>`_).
     """
-    # Compute column ID
-    J, V = compute_rinterp_decomp(
-        A, rank, oversample=oversample, n_subspace=n_subspace, mode='column',
-        index_set=True, random_state=random_state)
+    if core is not None and core not in _VALID_CORES:
+        raise ValueError('core must be one of %s, not %s'
+                         % (' '.join(_VALID_CORES), core))
+
+    # draws of the sketches and the error probes have to be independent
+    random_state = check_random_state(random_state)
+    norm = _check_estimate_error(estimate_error)
+
+    # converts A to array, raise ValueError if A has inf or nan
+    A = _asarray_chkfinite(A)
+    is_sparse = sp.issparse(A)
+
+    # A single range finder provides both skeletons
+    Q, B = compute_rqb(A, rank, oversample=oversample, n_subspace=n_subspace,
+                       random_state=random_state)
+
+    # Compute column ID of B
+    J, V = compute_interp_decomp(B, rank, mode='column', index_set=True,
+                                 compact=True)
 
     # Select column subset
-    C = A[:, J]
+    C = _column_skeleton(A, J)
 
-    # Compute row ID of C
-    Z, I = compute_rinterp_decomp(
-        A, rank, oversample=oversample, n_subspace=n_subspace, mode='row',
-        index_set=True, random_state=random_state)
+    # Compute row ID of C, as in the deterministic CUR
+    Z, I = compute_interp_decomp(C.toarray() if is_sparse else C, rank,
+                                 mode='row', index_set=True)
 
     # Select row subset
-    R = A[I, :]
+    R = _row_skeleton(A, I)
 
     # Compute U
-    U = V.dot(linalg.pinv2(R))
+    U = _compute_core(A, V, R, I, J, core)
 
     # Return ID
+    factors = (J, U, I) if index_set else (C, U, R)
+
+    if norm is not None:
+        err = estimate_residual_norm(A, safe_sparse_dot(C, U, dense_output=True),
+                                     R, norm=norm,
+                                     confidence=confidence,
+                                     random_state=random_state)
+        return factors + (err,)
+    return factors
+
+
+def compute_sampling_cur(A, rank, oversample=10, sampling='norm', n_adaptive=0,
+                         index_set=False, random_state=None):
+    """Sampling CUR decomposition.
+
+    Randomized algorithm for computing the approximate low-rank CUR
+    decomposition of a rectangular `(m, n)` matrix `A`, with target rank
+    `rank << min{m, n}`, by sampling columns and rows instead of sketching.
+    The input matrix is factored as `A = C * U * R`, where `C` and `R` are
+    sampled columns and rows of `A`, and `U` is the rank `rank` truncated
+    pseudo-inverse of their intersection `W = A[I, J]`.
+
+    The algorithm needs a single pass over `A` to compute the squared column
+    and row norms, and afterwards only reads the sampled columns and rows,
+    which makes it suitable for matrices which are too large to be sketched.
+
+    If `sampling='leverage'`, the columns (rows) are sampled by approximate
+    leverage scores, computed from the SVD of rows (columns) which are first
+    sampled by their norms. Each of the `n_adaptive` adaptive rounds samples
+    `rank` additional columns and rows with probabilities proportional to
+    the squared norms of the residuals of the sampled rows and columns,
+    after projection onto the current intersection.
+
+    Parameters
+    ----------
+    A : array_like or sparse matrix, shape `(m, n)`.
+        Input array.
+
+    rank : integer
+        Target rank. Best if `rank << min{m,n}`
+
+    oversample : integer, optional (default: 10)
+        Number of columns and rows sampled in addition to `rank`.
+
+    sampling : str `{'norm', 'leverage'}`, default: `sampling='norm'`.
+        'norm' : Sampling proportional to the squared column/row norms.
+        'leverage' : Sampling proportional to approximate leverage scores.
+
+    n_adaptive : integer, default: 0.
+        Number of adaptive resampling rounds.
+
+    index_set: str `{'True', 'False'}`, default: `index_set='False'`.
+        'True' : Return column/row index set instead of `C` and `R`.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+    Returns
+    -------
+    C:  array_like, shape `(m, c)`.
+            Sampled columns, with `c = rank + oversample + n_adaptive * rank`
+            for full rank `A`.
+
+    U : array_like, shape `(c, r)`.
+            Truncated pseudo-inverse of the intersection.
+
+    R : array_like, shape `(r, n)`.
+            Sampled rows.
+
+    References
+    ----------
+    P. Drineas, R. Kannan, and M. Mahoney.
+    "Fast Monte Carlo algorithms for matrices III: Computing a compressed
+    approximate matrix decomposition" (2006).
+    SIAM Journal on Computing 36.1: 184-206.
+
+    M. Mahoney and P. Drineas.
+    "CUR matrix decompositions for improved data analysis" (2009).
+    Proceedings of the National Academy of Sciences 106.3: 697-702.
+
+    S. Wang and Z. Zhang.
+    "Improving CUR matrix decomposition and the Nystrom approximation via
+    adaptive sampling" (2013).
+    (available at `arXiv <https://arxiv.org/abs/1303.4207>`_).
+    """
+    if sampling not in _VALID_SAMPLINGS:
+        raise ValueError('sampling must be one of %s, not %s'
+                         % (' '.join(_VALID_SAMPLINGS), sampling))
+
+    random_state = check_random_state(random_state)
+
+    # converts A to array, raise ValueError if A has inf or nan
+    A = _asarray_chkfinite(A)
+
+    m, n = A.shape
+    if rank < 1 or rank > min(m, n):
+        raise ValueError("Target rank must be >= 1 or < min(m, n), not %d" % rank)
+
+    # the only full pass over A
+    col_weights, row_weights = _squared_norms(A)
+
+    n_samples = rank + oversample
+    none = np.empty(0, dtype=np.intp)
+    J = _sample(col_weights, n_samples, none, random_state)
+    I = _sample(row_weights, n_samples, none, random_state)
+
+    if sampling == 'leverage':
+        # leverage scores from the dominant singular vectors of the
+        # norm sampled rows and columns
+        Vt = linalg.svd(_dense(_row_skeleton(A, I)), full_matrices=False)[2]
+        X = linalg.svd(_dense(_column_skeleton(A, J)), full_matrices=False)[0]
+        J = _sample(_column_norms_sq(Vt[:rank]), n_samples, none, random_state)
+        I = _sample(_column_norms_sq(conjugate_transpose(X[:, :rank])),
+                    n_samples, none, random_state)
+
+    for _ in range(n_adaptive):
+        A_I = _dense(_row_skeleton(A, I))
+        A_J = _dense(_column_skeleton(A, J))
+        W = A_J[I]
+
+        # residuals of the sampled rows onto the column space of W, and of
+        # the sampled columns onto the row space of W
+        Q = linalg.orth(W)
+        E_I = A_I - Q.dot(conjugate_transpose(Q).dot(A_I))
+        Q = linalg.orth(conjugate_transpose(W))
+        E_J = A_J - A_J.dot(Q).dot(conjugate_transpose(Q))
+
+        J = np.concatenate((J, _sample(_column_norms_sq(E_I), rank, J,
+                                       random_state)))
+        I = np.concatenate((I, _sample(_column_norms_sq(conjugate_transpose(E_J)),
+                                       rank, I, random_state)))
+
+    C = _column_skeleton(A, J)
+    R = _row_skeleton(A, I)
+
+    # rank truncated pseudo-inverse of the intersection
+    X, s, Yt = linalg.svd(_dense(_row_skeleton(C, I)), full_matrices=False)
+    # the intersection is empty or zero if no sampled entry is nonzero, then
+    # U is zero
+    cutoff = max(m, n) * np.finfo(s.dtype).eps * s[0] if s.size else 0
+    k = min(rank, np.count_nonzero(s > cutoff))
+    U = (conjugate_transpose(Yt[:k]) / s[:k]).dot(conjugate_transpose(X[:, :k]))
+
     if index_set:
         return J, U, I
     return C, U, R
@@ -11,8 +11,10 @@ Dynamic Mode Decomposition (DMD).
 from __future__ import division
 
 import numpy as np
+from joblib import Parallel, delayed
 from scipy import linalg
 from sklearn.base import BaseEstimator
+from sklearn.utils import check_random_state
 from sklearn.utils.validation import check_is_fitted
 
 from .qb import compute_rqb
@@ -221,6 +223,196 @@ def compute_rdmd(A, rank, dt=1, oversample=10, n_subspace=2, modes='standard',
     return F, l, omega
 
 
+def _append_svd(U, s, C, tol):
+    """SVD of `[U * diag(s), C]` for an orthonormal U, returned as `U_ext`,
+    `G`, `s`, `Hh` with `U_ext * G * diag(s) * Hh`, where `U_ext = [U, Q]` is
+    extended by the part of C outside of the range of U above tol"""
+    # part of C outside of the range of U, orthogonalized twice
+    K = conjugate_transpose(U).dot(C)
+    R = C - U.dot(K)
+    K2 = conjugate_transpose(U).dot(R)
+    R -= U.dot(K2)
+    K += K2
+    Q, T, perm = linalg.qr(R, mode='economic', pivoting=True,
+                           check_finite=False)
+
+    scale = max(linalg.norm(C, axis=0).max(), np.finfo(float).tiny)
+    n_new = np.sum(np.abs(np.diag(T)) > tol * scale)
+    T_new = np.empty((n_new, T.shape[1]), dtype=T.dtype)
+    T_new[:, perm] = T[:n_new]
+
+    r = U.shape[1]
+    K = np.block([[np.diag(s).astype(K.dtype), K],
+                  [np.zeros((n_new, r), dtype=K.dtype), T_new]])
+    G, s, Hh = linalg.svd(K, full_matrices=False, check_finite=False)
+    return np.concatenate((U, Q[:, :n_new]), axis=1), G, s, Hh
+
+
+def _window_svd(A, start, window, rank, oversample, n_subspace,
+                random_state):
+    """truncated SVD `U * diag(s) * V^H` of the window at start from scratch"""
+    Q, B = compute_rqb(A[:, start:start + window], rank, oversample=oversample,
+                       n_subspace=n_subspace, random_state=random_state)
+    U, s, Vh = linalg.svd(B, full_matrices=False, check_finite=False)
+    return Q.dot(U), s, conjugate_transpose(Vh)
+
+
+def _slide_svd(A, U, s, V, start, stride, window, l):
+    """updates the truncated SVD of the window at `start - stride` to the
+    window at start, by removing the leaving and appending the entering
+    snapshots"""
+    # downdate, the remaining columns are U * diag(s) * R^H * P^H
+    P, R = linalg.qr(V[stride:], mode='economic', check_finite=False)
+    G, s, Hh = linalg.svd(s[:, None] * conjugate_transpose(R),
+                          full_matrices=False, check_finite=False)
+    U, V = U.dot(G), P.dot(conjugate_transpose(Hh))
+
+    # update, truncated to the dominant l singular vectors
+    C = A[:, start + window - stride:start + window]
+    U_ext, G, s, Hh = _append_svd(U, s, C,
+                                  np.finfo(s.dtype).eps * max(A.shape))
+    k = min(l, s.size)
+    H = conjugate_transpose(Hh[:k])
+    V = np.concatenate((V.dot(H[:V.shape[1]]), H[V.shape[1]:]), axis=0)
+    return U_ext.dot(G[:, :k]), s[:k], V
+
+
+def _window_dmd(U, s, V, rank, dt, modes, order):
+    """DMD of the window with truncated SVD `U * diag(s) * V^H`"""
+    # DMD of the reduced snapshots, from their SVD as in compute_dmd
+    Z = s[:, None] * conjugate_transpose(V)
+    F, l, omega = compute_dmd(Z, rank=rank, dt=dt, modes=modes, order=order)
+    return U.dot(F), l, omega
+
+
+def _scratch_window_dmd(A, start, window, rank, dt, oversample, n_subspace,
+                        modes, order, random_state):
+    """DMD of a single window from scratch"""
+    U, s, V = _window_svd(A, start, window, rank, oversample, n_subspace,
+                          random_state)
+    return _window_dmd(U, s, V, rank, dt, modes, order)
+
+
+def compute_rdmd_windows(A, window, stride, rank, dt=1, oversample=10,
+                         n_subspace=2, modes='standard', order=True,
+                         refresh=20, n_jobs=None, random_state=None):
+    """Randomized Dynamic Mode Decomposition of sliding windows.
+
+    Computes the DMD of the windows `A[:, start:start + window]` for
+    `start = 0, stride, 2 * stride, ...`. Each window is represented by a
+    truncated SVD `U * diag(s) * V^H` with `l = rank + oversample` singular
+    vectors, so the basis `U` follows the subspace of the current window
+    even if the series is not stationary. Instead of being recomputed, the
+    SVD is downdated by the `stride` snapshots leaving and updated by the
+    `stride` snapshots entering the window. Hence, after the randomized SVD
+    of the first window, a window costs `O(m * l * (l + stride))` operations
+    for the update plus `O(window * l**2)` for the DMD of its reduced
+    snapshots.
+
+    Parameters
+    ----------
+    A : array_like, shape `(m, n)`.
+        Input array, the columns are the snapshots of the series.
+
+    window : integer
+        Number of snapshots per window.
+
+    stride : integer
+        Offset between the starts of consecutive windows.
+
+    rank : integer
+        Target rank. Best if `rank << min{m,window}`
+
+    dt : scalar, optional (default: 1)
+        Factor specifying the time difference between the observations.
+
+    oversample : integer, optional (default: 10)
+        Controls the oversampling of column space of each window.
+        Increasing this parameter may improve numerical accuracy.
+
+    n_subspace : integer, default: 2.
+        Parameter to control number of subspace iterations. Increasing this
+        parameter may improve numerical accuracy.
+
+    modes : str `{'standard', 'exact', 'exact_scaled'}`
+        Definition of the dynamic modes, see `compute_dmd`.
+
+    order :  bool `{True, False}`
+        True: return modes sorted.
+
+    refresh : integer or None, optional (default: 20)
+        The SVD of the window is recomputed from scratch every `refresh`
+        windows to remove the truncation and rounding errors of the updates.
+        If None, it is never recomputed.
+
+    n_jobs : integer or None, optional (default ``None``)
+        If not None, the windows are computed independently of each other,
+        without updates, by `n_jobs` parallel threads.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+
+    Yields
+    ------
+    F : array_like
+        Matrix containing the dynamic modes of the window, shape `(m, rank)`.
+
+    l : array_like
+        1-D array containing the eigenvalues of length `rank`.
+
+    omega : array_like
+        Time scaled eigenvalues: `ln(l)/dt`.
+    """
+    # converts A to array, raise ValueError if A has inf or nan
+    A = np.asarray_chkfinite(A)
+    m, n = A.shape
+
+    if modes not in _VALID_MODES:
+        raise ValueError('modes must be one of %s, not %s'
+                         % (' '.join(_VALID_MODES), modes))
+
+    if window < 2 or window > n:
+        raise ValueError('window must be >= 2 and <= n, not %d' % window)
+
+    if stride < 1:
+        raise ValueError('stride must be >= 1, not %d' % stride)
+
+    if rank < 1 or rank > window - 1:
+        raise ValueError('rank must be >= 1 and < window, not %d' % rank)
+
+    if refresh is not None and refresh < 1:
+        raise ValueError('refresh must be >= 1, not %d' % refresh)
+
+    random_state = check_random_state(random_state)
+    starts = range(0, n - window + 1, stride)
+
+    if n_jobs is not None:
+        seeds = random_state.randint(np.iinfo(np.int32).max, size=len(starts))
+        results = Parallel(n_jobs=n_jobs, prefer='threads',
+                           return_as='generator')(
+            delayed(_scratch_window_dmd)(A, start, window, rank, dt,
+                                         oversample, n_subspace, modes,
+                                         order, seed)
+            for start, seed in zip(starts, seeds))
+        for result in results:
+            yield result
+        return
+
+    l = rank + oversample
+    for i, start in enumerate(starts):
+        if (i == 0 or stride >= window
+                or (refresh is not None and i % refresh == 0)):
+            U, s, V = _window_svd(A, start, window, rank, oversample,
+                                  n_subspace, random_state)
+        else:
+            U, s, V = _slide_svd(A, U, s, V, start, stride, window, l)
+
+        yield _window_dmd(U, s, V, rank, dt, modes, order)
+
+
 def get_amplitudes(A, F):
     '''Compute amplitueds b using least-squares: Fb=x1'''
     return linalg.lstsq(F, A[:, 0])[0]
@@ -231,6 +423,113 @@ def get_vandermonde(A, l):
     return np.fliplr(np.vander(l, N=A.shape[1]))
 
 
+def get_time_dynamics(omega, b, t):
+    '''Compute time dynamics `b * exp(omega * t)`, shape `(rank, len(t))`'''
+    t = np.asarray(t)
+    return b[:, None] * np.exp(np.outer(omega, t))
+
+
+def iter_dmd_predictions(F, b, omega, t, chunk_size=None):
+    """Lazy DMD reconstruction and forecast.
+
+    Evaluates the snapshots `x(t) = F * diag(b) * exp(omega * t)` at the
+    times `t` in chunks of `chunk_size` times, so neither the Vandermonde
+    matrix nor the full `(m, len(t))` result is formed. The times are in the
+    units of `dt` used to compute `omega = ln(l)/dt`, with the first
+    snapshot at `t = 0`; they need not be equispaced or lie within the
+    observed interval.
+
+    Parameters
+    ----------
+    F : array_like, shape `(m, rank)`.
+        Matrix containing the dynamic modes.
+
+    b : array_like, shape `(rank,)`.
+        1-D array containing the amplitudes.
+
+    omega : array_like, shape `(rank,)`.
+        Time scaled eigenvalues: `ln(l)/dt`.
+
+    t : array_like, shape `(n,)`.
+        Times at which the snapshots are evaluated.
+
+    chunk_size : integer or None, optional (default ``None``)
+        Number of times per chunk. If None, chunks of about `2**20` entries
+        are used.
+
+    Yields
+    ------
+    X : array_like, shape `(m, chunk_size)`.
+        Complex snapshots at the next chunk of times.
+    """
+    F = np.asarray(F)
+    b = np.asarray(b)
+    omega = np.asarray(omega)
+    t = np.asarray(t).ravel()
+
+    if chunk_size is None:
+        chunk_size = max(2**20 // max(F.shape[0], 1), 1)
+
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be >= 1, not %d' % chunk_size)
+
+    for start in range(0, t.shape[0], chunk_size):
+        yield F.dot(get_time_dynamics(omega, b, t[start:start + chunk_size]))
+
+
+def predict_dmd(F, b, omega, t, chunk_size=None, out=None):
+    """DMD reconstruction and forecast.
+
+    Evaluates the snapshots `x(t) = F * diag(b) * exp(omega * t)` at the
+    times `t`, see `iter_dmd_predictions`. The result is written in chunks
+    of `chunk_size` times into `out`, which can be a `numpy.memmap`, so that
+    long forecasts of large states never reside in memory at once.
+
+    Parameters
+    ----------
+    F : array_like, shape `(m, rank)`.
+        Matrix containing the dynamic modes.
+
+    b : array_like, shape `(rank,)`.
+        1-D array containing the amplitudes.
+
+    omega : array_like, shape `(rank,)`.
+        Time scaled eigenvalues: `ln(l)/dt`.
+
+    t : array_like, shape `(n,)`.
+        Times at which the snapshots are evaluated.
+
+    chunk_size : integer or None, optional (default ``None``)
+        Number of times per chunk. If None, chunks of about `2**20` entries
+        are used.
+
+    out : array_like or None, shape `(m, n)`, optional (default ``None``)
+        Output array. If real, the real parts of the snapshots are stored.
+        If None, a complex array is allocated.
+
+    Returns
+    -------
+    X : array_like, shape `(m, n)`.
+        Snapshots at the times `t`, `out` if given.
+    """
+    t = np.asarray(t).ravel()
+    shape = (np.shape(F)[0], t.shape[0])
+
+    if out is None:
+        out = np.empty(shape, dtype=np.result_type(F, b, omega, np.complex64))
+    elif out.shape != shape:
+        raise ValueError('out must have shape %s, not %s' % (shape, out.shape))
+
+    is_complex = np.iscomplexobj(out)
+    start = 0
+    for X in iter_dmd_predictions(F, b, omega, t, chunk_size=chunk_size):
+        stop = start + X.shape[1]
+        out[:, start:stop] = X if is_complex else X.real
+        start = stop
+
+    return out
+
+
 class DMD(BaseEstimator):
 
     def __init__(self, rank=None, dt=1, modes='exact', order=True):
@@ -259,6 +558,13 @@ class DMD(BaseEstimator):
         check_is_fitted(self, ['X_', 'l_'])
         return get_vandermonde(self.X_, self.l_)
 
+    def predict(self, t, chunk_size=None, out=None):
+        '''Reconstruct or forecast the snapshots at the times t, see
+        `predict_dmd`'''
+        check_is_fitted(self, ['X_', 'F_', 'omega_'])
+        return predict_dmd(self.F_, self.amplitudes_, self.omega_, t,
+                           chunk_size=chunk_size, out=out)
+
     def fit_transform(self, X):
         '''TODO: Not Implemented'''
         raise NotImplementedError
@@ -288,3 +594,187 @@ class RDMD(DMD):
             n_subspace=self.n_subspace, modes=self.modes, order=self.order,
             random_state=self.random_state)
         return self
+
+
+class OnlineDMD(BaseEstimator):
+    """Online Dynamic Mode Decomposition.
+
+    Streaming DMD of a sequence of snapshots, which are fed one at a time
+    or in small batches to `partial_fit`. The snapshots are projected onto
+    an orthonormal basis `U` of at most `rank` columns, the dominant left
+    singular vectors of the snapshots discounted by `forgetting`, which is
+    updated by a truncated incremental SVD. The reduced operator
+    `M = P * inv(S)` is computed from the Gram statistics `P = sum y x^H` and
+    `S = sum x x^H` of the projected snapshot pairs `(x, y)`, which are
+    discounted by `forgetting` per snapshot to track time-varying systems,
+    and re-projected onto each updated basis.
+
+    A batch of `k` snapshots costs `O(m * (rank + k)**2)` operations for the
+    basis update plus `O(rank**3)` for the eigendecomposition of `M`. Only the
+    basis, its singular values, the `(rank, rank)` statistics and the last
+    snapshot are stored, never the history.
+
+    Parameters
+    ----------
+    rank : integer or None, optional (default ``None``)
+        Maximum number of basis vectors. If None, the basis may grow to the
+        number of linearly independent snapshots.
+
+    dt : scalar, optional (default: 1)
+        Time difference between the snapshots.
+
+    forgetting : float, optional (default: 1)
+        Weight `0 < forgetting <= 1` by which the statistics are discounted
+        per snapshot. If 1, all snapshot pairs are weighted equally.
+
+    tol : float, optional (default: 1e-10)
+        A snapshot extends the basis if its part outside of the range of
+        `U` has a norm larger than `tol` relative to the snapshot.
+
+    order :  bool `{True, False}`
+        True: return modes sorted.
+
+    Attributes
+    ----------
+    U_ : array_like, shape `(m, r)`.
+        Orthonormal basis, `r <= rank`.
+
+    s_ : array_like, shape `(r,)`.
+        Singular values of the discounted snapshots in the basis `U`.
+
+    operator_ : array_like, shape `(r, r)`.
+        Reduced DMD operator `U^H * A * U`.
+
+    l_ : array_like, shape `(r,)`.
+        Eigenvalues of the reduced operator.
+
+    omega_ : array_like, shape `(r,)`.
+        Time scaled eigenvalues: `ln(l)/dt`.
+
+    n_snapshots_ : integer
+        Number of snapshots seen.
+
+    References
+    ----------
+    H. Zhang, C. Rowley, E. Deem, and L. Cattafesta.
+    "Online dynamic mode decomposition for time-varying systems" (2019).
+    (available at `arXiv <https://arxiv.org/abs/1707.02876>`_).
+    """
+
+    def __init__(self, rank=None, dt=1, forgetting=1, tol=1e-10, order=True):
+        self.rank = rank
+        self.dt = dt
+        self.forgetting = forgetting
+        self.tol = tol
+        self.order = order
+
+    def fit(self, X, y=None):
+        '''Fits online DMD to the snapshots X from scratch'''
+        X = np.asarray_chkfinite(X)
+        self._initialize(X)
+        return self.partial_fit(X)
+
+    def _initialize(self, X):
+        '''empty basis and statistics for snapshots like X'''
+        dtype = np.result_type(X, np.float64)
+        self.U_ = np.empty((X.shape[0], 0), dtype=dtype)
+        self.s_ = np.empty(0)
+        self.cross_ = np.empty((0, 0), dtype=dtype)
+        self.gram_ = np.empty((0, 0), dtype=dtype)
+        self.x_last_ = None
+        self.n_snapshots_ = 0
+        for attr in ('operator_', 'l_', 'omega_', 'W_'):
+            self.__dict__.pop(attr, None)
+
+    def partial_fit(self, X, y=None):
+        '''Updates the fit with the snapshots X, shape `(m,)` or `(m, k)`'''
+        if not 0 < self.forgetting <= 1:
+            raise ValueError('forgetting must be in (0, 1], not %s'
+                             % self.forgetting)
+
+        X = np.asarray_chkfinite(X)
+        if X.ndim == 1:
+            X = X[:, None]
+
+        if not hasattr(self, 'U_'):
+            self._initialize(X)
+        elif X.shape[0] != self.U_.shape[0]:
+            raise ValueError('snapshots must have %d rows, not %d'
+                             % (self.U_.shape[0], X.shape[0]))
+
+        self._update_basis(X)
+
+        # pairs (x, y) from the last seen and the new snapshots
+        self.n_snapshots_ += X.shape[1]
+        if self.x_last_ is not None:
+            X = np.concatenate((self.x_last_[:, None], X), axis=1)
+        self.x_last_ = X[:, -1].copy()
+
+        if X.shape[1] < 2:
+            return self
+
+        # discounted update of the statistics of the projected pairs
+        Z = conjugate_transpose(self.U_).dot(X)
+        n_pairs = Z.shape[1] - 1
+        weights = self.forgetting ** np.arange(n_pairs - 1, -1, -1)
+        Zx = Z[:, :-1] * weights
+        decay = self.forgetting ** n_pairs
+        self.cross_ = decay * self.cross_ + Z[:, 1:].dot(conjugate_transpose(Zx))
+        self.gram_ = decay * self.gram_ + Z[:, :-1].dot(conjugate_transpose(Zx))
+
+        self._update_operator()
+        return self
+
+    def _update_basis(self, X):
+        '''truncated incremental SVD update of U_ by the new snapshots X'''
+        r = self.U_.shape[1]
+        rank = X.shape[0] if self.rank is None else self.rank
+
+        # discounted snapshots, the squared singular values are discounted
+        # like the statistics
+        root = np.sqrt(self.forgetting)
+        Xw = X * root ** np.arange(X.shape[1] - 1, -1, -1)
+        s = self.s_ * root ** X.shape[1]
+
+        # truncated to the dominant `rank` singular vectors
+        U, G, s, _ = _append_svd(self.U_, s, Xw, self.tol)
+        k = min(rank, s.size)
+        G, self.s_ = G[:, :k], s[:k]
+        self.U_ = U.dot(G)
+
+        # re-project the statistics, which are zero in the new directions
+        G = G[:r]
+        self.cross_ = conjugate_transpose(G).dot(self.cross_).dot(G)
+        self.gram_ = conjugate_transpose(G).dot(self.gram_).dot(G)
+
+    def _update_operator(self):
+        '''reduced operator M with M * S = P and its eigendecomposition'''
+        # S is Hermitian, M^H = pinv(S) * P^H
+        M = conjugate_transpose(linalg.lstsq(
+            self.gram_, conjugate_transpose(self.cross_), check_finite=False)[0])
+
+        l, W = linalg.eig(M, right=True, check_finite=False)
+        omega = np.log(l.astype(complex)) / self.dt
+
+        if self.order:
+            sort_idx = np.argsort(np.abs(omega))
+            W = W[:, sort_idx]
+            l = l[sort_idx]
+            omega = omega[sort_idx]
+
+        self.operator_, self.l_, self.omega_, self.W_ = M, l, omega, W
+
+    @property
+    def F_(self):
+        '''DMD modes, `U * W`'''
+        check_is_fitted(self, ['U_', 'W_'])
+        return self.U_.dot(self.W_)
+
+    def predict_next(self, X=None):
+        '''Predicts the snapshots following X, by default the last seen'''
+        check_is_fitted(self, ['U_', 'operator_'])
+        if X is None:
+            X = self.x_last_
+        X = np.asarray_chkfinite(X)
+        return self.U_.dot(self.operator_.dot(
+            conjugate_transpose(self.U_).dot(X)))
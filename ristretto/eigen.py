@@ -9,19 +9,327 @@ Randomized Singular Value Decomposition
 # TODO: conform functions to return like scipy.linalg.eig and rename
 from __future__ import division
 import warnings
+from functools import partial
 
 import numpy as np
 from scipy import linalg
+from joblib import Parallel, delayed
+from scipy import sparse as sp
+from scipy.sparse.linalg import LinearOperator
+from sklearn.metrics.pairwise import pairwise_kernels
 from sklearn.utils import check_random_state
+from sklearn.utils.extmath import safe_sparse_dot
 
-from .sketch.transforms import johnson_lindenstrauss, randomized_uniform_sampling
-from .sketch.utils import perform_subspace_iterations
+from .sketch.transforms import randomized_uniform_sampling
+from .sketch.utils import orthonormalize, shifted_subspace_iterations
 from .utils import conjugate_transpose
 
 _VALID_DTYPES = (np.float32, np.float64, np.complex64, np.complex128)
+_VALID_SAMPLINGS = ('uniform', 'rpcholesky')
+_VALID_FILTERS = (None, 'chebyshev', 'shift')
 
+# the Lanczos bounds of the spectrum are widened by this fraction of its width
+_BOUNDS_MARGIN = 0.1
 
-def compute_reigh(A, rank, oversample=10, n_subspace=2, random_state=None):
+
+def _hermitian_matmat(A, lower=None):
+    """return the order, dtype and the product X -> A * X of a Hermitian A.
+
+    If `lower` is None, `A` is a full dense or sparse matrix, or a
+    LinearOperator. Otherwise only the lower (or upper) triangle of `A` is
+    read, by BLAS symm/hemm for a 2-D array and by spmv/hpmv for a 1-D array
+    in LAPACK packed storage.
+    """
+    if isinstance(A, LinearOperator):
+        if lower is not None:
+            raise ValueError('lower is not supported for a LinearOperator A')
+        return A.shape[0], np.dtype(A.dtype or np.float64), A.matmat
+
+    if sp.issparse(A):
+        if lower is not None:
+            raise ValueError('lower is not supported for sparse A')
+        return A.shape[0], A.dtype, partial(safe_sparse_dot, A, dense_output=True)
+
+    A = np.asarray(A)
+
+    if A.ndim == 2:
+        if A.shape[0] != A.shape[1]:
+            raise ValueError('A must be square, not %s' % (A.shape,))
+        if lower is None:
+            return A.shape[0], A.dtype, A.dot
+
+        is_complex = np.iscomplexobj(A)
+        symm, = linalg.get_blas_funcs(('hemm' if is_complex else 'symm',), (A,))
+        if A.flags.f_contiguous:
+            return A.shape[0], A.dtype, partial(symm, 1, A, lower=int(lower))
+
+        # the transpose of a C ordered A is Fortran ordered, with the
+        # triangles swapped, conj(A) * conj(X) == conj(A * X)
+        At = A.T
+        if is_complex:
+            def matmat(X):
+                return symm(1, At, X.conj(), lower=int(not lower)).conj()
+            return A.shape[0], A.dtype, matmat
+        return A.shape[0], A.dtype, partial(symm, 1, At, lower=int(not lower))
+
+    if A.ndim == 1:
+        if lower is None:
+            raise ValueError('lower must be given for packed A')
+
+        n = int(round((np.sqrt(8 * A.size + 1) - 1) / 2))
+        if n * (n + 1) // 2 != A.size:
+            raise ValueError('packed A must have n * (n + 1) / 2 entries, not %d'
+                             % A.size)
+
+        is_complex = np.iscomplexobj(A)
+        spmv, = linalg.get_blas_funcs(('hpmv' if is_complex else 'spmv',), (A,))
+
+        def matmat(X):
+            Y = np.empty(X.shape, dtype=A.dtype)
+            for j in range(X.shape[1]):
+                Y[:, j] = spmv(n, 1, A, X[:, j], lower=int(lower))
+            return Y
+        return n, A.dtype, matmat
+
+    raise ValueError('A must be a 1D or 2D array, not %dD' % A.ndim)
+
+
+def _lanczos_bounds(matmat, n, dtype, n_steps, random_state):
+    """lower and upper bounds of the spectrum of a Hermitian A, from the Ritz
+    values of a few Lanczos steps widened by the last off-diagonal entry,
+    which bounds the Ritz residuals, and by a safety margin.
+
+    The bounds are estimates, not guaranteed.
+    """
+    q = random_state.standard_normal(size=n).astype(dtype)
+    q /= linalg.norm(q)
+    q_prev = np.zeros_like(q)
+
+    alpha, beta = [], [0.0]
+    for _ in range(min(n_steps, n)):
+        w = matmat(q[:, None])[:, 0] - beta[-1] * q_prev
+        alpha.append(np.real(np.vdot(q, w)))
+        w -= alpha[-1] * q
+        beta.append(linalg.norm(w))
+        if beta[-1] == 0:
+            break
+        q_prev, q = q, w / beta[-1]
+
+    theta = linalg.eigvalsh_tridiagonal(alpha, beta[1:len(alpha)])
+    margin = beta[-1] + _BOUNDS_MARGIN * (theta[-1] - theta[0])
+    return theta[0] - margin, theta[-1] + margin
+
+
+def _chebyshev_filter(matmat, X, AX, degree, a, b, top):
+    """apply the Chebyshev polynomial of degree `degree`, which is small on
+    the interval [a, b] and scaled to one at `top > b`, to X, given AX = A * X
+    """
+    e = (b - a) / 2
+    c = (b + a) / 2
+    sigma = sigma_1 = e / (top - c)
+
+    X_prev = X
+    X = (AX - c * X) * (sigma_1 / e)
+    for _ in range(2, degree + 1):
+        sigma_new = 1 / (2 / sigma_1 - sigma)
+        X_new = matmat(X)
+        X_new -= c * X
+        X_new *= 2 * sigma_new / e
+        X_new -= (sigma * sigma_new) * X_prev
+        X_prev, X = X, X_new
+        sigma = sigma_new
+    return X
+
+
+def _hermitian_range(matmat, n, dtype, l, n_subspace, random_state,
+                     filter=None, degree=8, rank=None, tol=None,
+                     init_basis=None):
+    """orthonormal Z, shape `(n, l)`, and the product Y = A * Z.
+
+    A Gaussian test matrix is followed by `2 * n_subspace` power iterations,
+    so `A` is applied `1 + 2 * n_subspace` times, the same powers of `A` as
+    the subspace iterations, and the last product is returned.
+
+    If `filter='chebyshev'`, each of the `n_subspace` iterations applies a
+    Chebyshev polynomial of degree `degree` instead, which damps the interval
+    between the lower bound of the spectrum and the smallest Ritz value of
+    the current subspace, so `A` is applied `1 + n_subspace * degree` times.
+    The lower bound is a Lanczos estimate; if a Ritz value falls below it, it
+    is widened and the last iteration is repeated.
+
+    If `filter='shift'` or `tol` is given, the power iterations apply
+    `A**2 - alpha * I` with dynamic shifts `alpha` (only if 'shift') and stop
+    once the `rank` largest Ritz values have converged to `tol`, so `A` is
+    applied at most `2 + 2 * n_subspace` times.
+
+    If `init_basis` is given, its leading `rank` columns replace as many
+    columns of the Gaussian test matrix.
+    """
+    if init_basis is None:
+        Z = random_state.standard_normal(size=(n, l)).astype(dtype)
+    else:
+        init_basis = np.asarray_chkfinite(init_basis)
+        if init_basis.ndim != 2 or init_basis.shape[0] != n:
+            raise ValueError('init_basis must have shape (%d, p), not %s'
+                             % (n, init_basis.shape))
+        init_basis = init_basis[:, :rank]
+        Z = random_state.standard_normal(
+            size=(n, l - init_basis.shape[1])).astype(dtype)
+        Z = np.concatenate((init_basis, Z), axis=1)
+    Z = orthonormalize(Z)
+    Y = matmat(Z)
+
+    if filter == 'chebyshev':
+        lower, upper = _lanczos_bounds(matmat, n, dtype, 10, random_state)
+        prev, saved = None, None
+        n_iter = 0
+        while True:
+            # the smallest Ritz value separates the wanted eigenvalues
+            ritz = linalg.eigvalsh(conjugate_transpose(Z).dot(Y),
+                                   check_finite=False)
+            if ritz[0] <= lower:
+                # the Ritz values are not below the spectrum, hence the
+                # estimated lower bound is wrong and the last filter amplified
+                # the eigenvalues below it, which is repeated with a widened
+                # damped interval
+                lower = ritz[0] - _BOUNDS_MARGIN * (upper - ritz[0])
+                if saved is not None:
+                    Z, Y, prev = saved
+                    saved = None
+                    n_iter -= 1
+                    continue
+            if n_iter == n_subspace:
+                break
+            if tol is not None and prev is not None:
+                change = np.abs(ritz[-rank:] - prev) / np.abs(ritz[-rank:]).max()
+                if change.max() < tol:
+                    break
+            cut = ritz[0]
+            if not cut < upper:
+                break
+            saved = Z, Y, prev
+            prev = ritz[-rank:]
+            Z = orthonormalize(_chebyshev_filter(matmat, Z, Y, degree, lower,
+                                                 cut, upper))
+            Y = matmat(Z)
+            n_iter += 1
+        return Z, Y
+
+    if filter == 'shift' or tol is not None:
+        Z = shifted_subspace_iterations(matmat, matmat, Y, rank,
+                                        n_iter=n_subspace, tol=tol,
+                                        shift=filter == 'shift')
+        return Z, matmat(Z)
+
+    for _ in range(2 * n_subspace):
+        Z = orthonormalize(Y)
+        Y = matmat(Z)
+    return Z, Y
+
+
+def _nystroem_shift(Y):
+    """stabilizing shift `sqrt(n) * eps * ||Y||_2` of the sketch `Y = A * S`,
+    as in Tropp et al. (2017)"""
+    return np.sqrt(Y.shape[0]) * np.finfo(Y.dtype).eps * linalg.norm(Y, 2)
+
+
+def _nystroem_eigh(Y, W, shift, rank):
+    """eigenpairs of the Nystroem approximation `Y * W**-1 * Y.H`, where
+    `Y = (A + shift * I) * Omega` and `W = Omega.H * Y`, with the shift removed.
+
+    Raises LinAlgError if W is not positive definite.
+    """
+    W = (W + conjugate_transpose(W)) / 2 # Symmetry
+
+    # Cholesky factorizatoin
+    C = linalg.cholesky(W, lower=True, overwrite_a=True, check_finite=False)
+
+    # Upper triangular solve
+    F = linalg.solve_triangular(C, conjugate_transpose(Y), lower=True,
+                                unit_diagonal=False, overwrite_b=True,
+                                check_finite=False)
+
+    #Compute SVD
+    v, w, _ = linalg.svd(conjugate_transpose(F), compute_uv=True,
+                         full_matrices=False, overwrite_a=True, check_finite=False)
+
+    return np.maximum(w[:rank]**2 - shift, 0), v[:, :rank]
+
+
+def _rpcholesky(diag, columns, l, block_size, tol, random_state):
+    """randomly pivoted partial Cholesky decomposition, A ~ F * F.H.
+
+    `diag` is the diagonal of A and `columns(S)` returns the columns A[:, S].
+    Blocks of `block_size` pivots are sampled proportional to the diagonal
+    of the residual, until `l` pivots are selected or the trace of the
+    residual drops below `tol` times the trace of A.
+
+    Returns F, shape `(n, k)`, and the pivots, with `k <= l`.
+    """
+    d = np.maximum(np.real(diag).astype(np.float64), 0)
+    n = d.size
+    trace = d.sum()
+
+    F = None
+    pivots = []
+    k = 0
+    while k < l:
+        residual = d.sum()
+        if residual <= 0 or (tol is not None and residual <= tol * trace):
+            break
+
+        S = np.unique(random_state.choice(n, size=min(block_size, l - k),
+                                          p=d / residual))
+
+        # columns of the residual, G = (A - F * F.H)[:, S]
+        G = np.asarray(columns(S))
+        G = G.astype(np.result_type(G, np.float64), copy=True)
+        if F is None:
+            F = np.empty((n, l), dtype=G.dtype)
+        G -= F[:, :k].dot(conjugate_transpose(F[S, :k]))
+
+        H = G[S]
+        H = (H + conjugate_transpose(H)) / 2 # Symmetry
+        try:
+            # jittered Cholesky factorizatoin, H = R.H * R
+            jitter = np.finfo(d.dtype).eps * np.real(np.trace(H))
+            R = linalg.cholesky(H + jitter * np.eye(S.size), lower=False,
+                                check_finite=False)
+            G = conjugate_transpose(linalg.solve_triangular(
+                R, conjugate_transpose(G), trans='C', lower=False,
+                check_finite=False))
+        except linalg.LinAlgError:
+            # the block is numerically rank deficient, keep its range
+            w, v = linalg.eigh(H, check_finite=False)
+            keep = w > S.size * np.finfo(d.dtype).eps * max(w.max(), 0)
+            if not keep.any():
+                break
+            G = G.dot(v[:, keep] / np.sqrt(w[keep]))
+
+        s = G.shape[1]
+        F[:, k:k + s] = G
+        pivots.extend(S)
+        k += s
+
+        # downdate the diagonal of the residual
+        d -= np.real(np.einsum('ij,ij->i', G, G.conj()))
+        np.maximum(d, 0, out=d)
+        d[S] = 0
+
+    if F is None:
+        F = np.empty((n, 0))
+    return F[:, :k], np.array(pivots, dtype=np.intp)
+
+
+def _factor_eigh(F, rank):
+    """eigenpairs of F * F.H"""
+    v, w, _ = linalg.svd(F, full_matrices=False, check_finite=False)
+    return w[:rank]**2, v[:, :rank]
+
+
+def compute_reigh(A, rank, oversample=10, n_subspace=2, random_state=None,
+                  pass_efficient=False, lower=None, filter=None, degree=8,
+                  tol=None, init_basis=None, return_basis=False):
     """Randomized eigendecompostion.
 
     The quality of the approximation can be controlled via the oversampling
@@ -30,8 +338,8 @@ def compute_reigh(A, rank, oversample=10, n_subspace=2, random_state=None):
 
     Parameters
     ----------
-    A : array_like, shape `(m, n)`.
-        Input array.
+    A : array_like, sparse matrix or LinearOperator, shape `(n, n)`.
+        Hermitian input array.
 
     rank : integer
         Target rank. Best if `rank << min{m,n}`
@@ -49,6 +357,48 @@ def compute_reigh(A, rank, oversample=10, n_subspace=2, random_state=None):
         If RandomState instance, random_state is the random number generator;
         If None, the random number generator is the RandomState instance used by np.random.
 
+    pass_efficient : bool, optional (default: False)
+        If True, the Rayleigh quotient is formed from the last product of the
+        power iterations in Nystroem form, `A ~ Y * pinv(Z.H * Y) * Y.H` with
+        `Y = A * Z`, which saves one pass over `A`. In total, `A` is applied
+        `1 + 2 * n_subspace` times.
+
+    lower : bool or None, optional (default ``None``)
+        If None, `A` is a full Hermitian matrix. Otherwise only the lower
+        (True) or upper (False) triangle of `A` is read, using the BLAS
+        routines symm/hemm. `A` can then also be given in packed storage, as
+        1-d array of length `n * (n + 1) / 2` holding the columns of the
+        triangle, using spmv/hpmv.
+
+    filter : str `{'chebyshev', 'shift'}` or None, optional (default ``None``)
+        If 'chebyshev', each of the `n_subspace` iterations applies a
+        Chebyshev polynomial of degree `degree` in `A`, instead of `A**2`.
+        The polynomial damps the interval between a lower bound of the
+        spectrum, estimated by a few Lanczos steps, and the smallest Ritz
+        value of the current subspace, which separates the largest
+        eigenvalues much better per product with `A`. If 'shift', each
+        iteration applies `A**2 - alpha * I`, with a shift `alpha` updated
+        from the Ritz values of the current subspace.
+
+    degree : integer, default: 8.
+        Degree of the Chebyshev polynomial.
+
+    tol : float or None, optional (default ``None``)
+        If given, the subspace iterations stop once the relative change of
+        the `rank` largest Ritz values is below `tol`, and `n_subspace` is
+        the maximum number of iterations.
+
+    init_basis : array_like or None, shape `(n, p)`, optional (default ``None``)
+        Basis of an approximate dominant eigenspace of `A` to warm start
+        from, e.g., `v` of a previous decomposition of a slowly changing `A`.
+        Its leading `min(p, rank)` columns replace as many columns of the
+        Gaussian test matrix and the remaining columns are drawn fresh.
+        Combined with `tol`, the subspace iterations then stop after few
+        passes.
+
+    return_basis : bool, optional (default ``False``)
+        If ``True``, the final basis of the range is returned as well.
+
 
     Returns
     -------
@@ -59,6 +409,12 @@ def compute_reigh(A, rank, oversample=10, n_subspace=2, random_state=None):
         The normalized selected eigenvector corresponding to the
         eigenvalue w[i] is the column v[:,i].
 
+    basis : array_like, shape `(n, rank + oversample)`.
+        Only returned if `return_basis` is ``True``. Orthonormal basis of the
+        final subspace, ordered by descending Ritz values, so that its leading
+        `k` columns are `v`. It can be passed as `init_basis` of the next
+        decomposition of a slowly changing `A`.
+
 
     References
     ----------
@@ -68,38 +424,69 @@ def compute_reigh(A, rank, oversample=10, n_subspace=2, random_state=None):
     decompositions" (2009).
     (available at `arXiv <http://arxiv.org/abs/0909.4061>`_).
     """
-    # get random sketch
-    Q = johnson_lindenstrauss(A, rank + oversample, axis=1, random_state=random_state)
+    if filter not in _VALID_FILTERS:
+        raise ValueError('filter must be one of %s, not %s'
+                         % (_VALID_FILTERS, filter))
 
-    if n_subspace > 0:
-        Q = perform_subspace_iterations(A, Q, n_iter=n_subspace, axis=1)
+    random_state = check_random_state(random_state)
+    n, dtype, matmat = _hermitian_matmat(A, lower)
+
+    # get random sketch, Y = A * Z
+    Z, Y = _hermitian_range(matmat, n, dtype, rank + oversample, n_subspace,
+                            random_state, filter=filter, degree=degree,
+                            rank=rank, tol=tol, init_basis=init_basis)
+
+    if pass_efficient:
+        # Rayleigh-Ritz from the last product, A ~ Y * pinv(Z.H * Y) * Y.H
+        Q, R = linalg.qr(Y, mode='economic', check_finite=False)
+        M = conjugate_transpose(Z).dot(Y)
+        M = (M + conjugate_transpose(M)) / 2
+        B = R.dot(linalg.pinvh(M, check_finite=False)).dot(conjugate_transpose(R))
+    else:
+        #Project the data matrix a into a lower dimensional subspace
+        Q = orthonormalize(Y)
+        B = conjugate_transpose(Q).dot(matmat(Q))
 
-    #Project the data matrix a into a lower dimensional subspace
-    B = A.dot(Q)
-    B = conjugate_transpose(Q).dot(B)
     B = (B + conjugate_transpose(B)) / 2 # Symmetry
 
-    # Eigendecomposition
-    w, v = linalg.eigh(B, eigvals_only=False, overwrite_a=True,
-                       turbo=True, eigvals=None, type=1, check_finite=False)
-
-    v[:, :A.shape[1]] = v[:, A.shape[1] - 1::-1]
-    w = w[::-1]
+    # Eigendecomposition, only the `rank` largest eigenpairs are computed,
+    # unless the whole basis is returned
+    l = B.shape[0]
+    first = 0 if return_basis else l - rank
+    w, v = linalg.eigh(B, overwrite_a=True, subset_by_index=[first, l - 1],
+                       check_finite=False)
 
-    return w[:rank], Q.dot(v)[:,:rank]
+    # Recover eigenvectors in descending order
+    w, v = w[::-1], Q.dot(v[:, ::-1])
+    if return_basis:
+        return w[:rank], v[:, :rank], v
+    return w, v
 
 
-def compute_reigh_nystroem(A, rank, oversample=10, n_subspace=2, random_state=None):
+def compute_reigh_nystroem(A, rank, oversample=10, n_subspace=2, random_state=None,
+                           pass_efficient=False, lower=None, filter=None,
+                           degree=8, tol=None, init_basis=None,
+                           return_basis=False):
     """Randomized eigendecompostion using the Nystroem method.
 
     The quality of the approximation can be controlled via the oversampling
     parameter `oversample` and `n_subspace` which specifies the number of
     subspace iterations.
 
+    The core matrix is factored by a Cholesky decomposition after shifting
+    `A` by `sqrt(n) * eps * ||A * S||_2`, which is removed from the
+    eigenvalues afterwards. This is stable for positive semidefinite `A`,
+    also if it is numerically rank deficient.
+
+    The single-pass method of Tropp et al. (2017), which reads `A` exactly
+    once, is obtained with `n_subspace=0` and `pass_efficient=True`. The
+    defaults apply subspace iterations and a separate final product, i.e.,
+    `A` is read `2 + 2 * n_subspace` times, for more accurate eigenvectors.
+
     Parameters
     ----------
-    A : array_like, shape `(m, n)`.
-        Input array.
+    A : array_like, sparse matrix or LinearOperator, shape `(n, n)`.
+        Hermitian input array.
 
     rank : integer
         Target rank. Best if `rank << min{m,n}`
@@ -117,6 +504,34 @@ def compute_reigh_nystroem(A, rank, oversample=10, n_subspace=2, random_state=No
         If RandomState instance, random_state is the random number generator;
         If None, the random number generator is the RandomState instance used by np.random.
 
+    pass_efficient : bool, optional (default: False)
+        If True, the last product of the power iterations is used as the
+        sketch `A * S`, which saves one pass over `A`. In total, `A` is applied
+        `1 + 2 * n_subspace` times, once if `n_subspace=0`.
+
+    lower : bool or None, optional (default ``None``)
+        If None, `A` is a full Hermitian matrix. Otherwise only the lower
+        (True) or upper (False) triangle of `A` is read, see `compute_reigh`.
+
+    filter : str `{'chebyshev', 'shift'}` or None, optional (default ``None``)
+        If 'chebyshev', the subspace iterations are accelerated by a
+        Chebyshev polynomial filter, if 'shift' by dynamic shifts, see
+        `compute_reigh`.
+
+    degree : integer, default: 8.
+        Degree of the Chebyshev polynomial.
+
+    tol : float or None, optional (default ``None``)
+        If given, the subspace iterations stop once the `rank` largest Ritz
+        values have converged to `tol`, see `compute_reigh`.
+
+    init_basis : array_like or None, shape `(n, p)`, optional (default ``None``)
+        Basis to warm start the range finder from, e.g., `v` of a previous
+        decomposition, see `compute_reigh`.
+
+    return_basis : bool, optional (default ``False``)
+        If ``True``, the final basis of the range is returned as well.
+
 
     Returns
     -------
@@ -127,6 +542,9 @@ def compute_reigh_nystroem(A, rank, oversample=10, n_subspace=2, random_state=No
         The normalized selected eigenvector corresponding
         to the eigenvalue w[i] is the column v[:,i].
 
+    basis : array_like, shape `(n, rank + oversample)`.
+        Only returned if `return_basis` is ``True``, see `compute_reigh`.
+
 
     References
     ----------
@@ -135,52 +553,70 @@ def compute_reigh_nystroem(A, rank, oversample=10, n_subspace=2, random_state=No
     algorithms for constructing approximate matrix
     decompositions" (2009).
     (available at `arXiv <http://arxiv.org/abs/0909.4061>`_).
-    """
-    # get random sketch
-    S = johnson_lindenstrauss(A, rank + oversample, axis=1, random_state=random_state)
 
-    if n_subspace > 0:
-        S = perform_subspace_iterations(A, S, n_iter=n_subspace, axis=1)
+    J. Tropp, A. Yurtsever, M. Udell, and V. Cevher.
+    "Fixed-rank approximation of a positive-semidefinite matrix from
+    streaming data" (2017).
+    (available at `arXiv <https://arxiv.org/abs/1706.05736>`_).
+    """
+    if filter not in _VALID_FILTERS:
+        raise ValueError('filter must be one of %s, not %s'
+                         % (_VALID_FILTERS, filter))
 
-    #Project the data matrix a into a lower dimensional subspace
-    B1 = A.dot(S)
+    random_state = check_random_state(random_state)
+    n, dtype, matmat = _hermitian_matmat(A, lower)
+
+    # get random sketch, B1 = A * S
+    S, B1 = _hermitian_range(matmat, n, dtype, rank + oversample, n_subspace,
+                             random_state, filter=filter, degree=degree,
+                             rank=rank, tol=tol, init_basis=init_basis)
+
+    if not pass_efficient:
+        #Project the data matrix a into a lower dimensional subspace
+        S = orthonormalize(B1)
+        B1 = matmat(S)
+
+    # Shift A by a multiple of the machine precision, B1 = (A + shift * I) * S,
+    # so that the core is numerically positive definite
+    shift = _nystroem_shift(B1)
+    B1 += shift * S
     B2 = conjugate_transpose(S).dot(B1)
-    B2 = (B2 + conjugate_transpose(B2)) / 2 # Symmetry
+
+    # Only the `rank` largest eigenpairs are needed, unless the whole basis
+    # is returned
+    l = B2.shape[0]
+    n_pairs = l if return_basis else rank
 
     try:
-        # Cholesky factorizatoin
-        C = linalg.cholesky(B2, lower=True, overwrite_a=True, check_finite=False)
+        w, v = _nystroem_eigh(B1, B2, shift, n_pairs)
     except linalg.LinAlgError:
         warnings.warn("Cholesky factorizatoin has failed, because array is not "
                       "positive definite. Using SVD instead.")
-        # Eigendecompositoin
-        w, v = linalg.eigh(B2, eigvals_only=False, overwrite_a=True,
-                           turbo=True, eigvals=None, type=1, check_finite=False)
-
-
-        v[:, :A.shape[1]] = v[:, A.shape[1]-1::-1]
-        w = w[::-1]
 
-        return w[:rank], S.dot(v)[:,:rank]
-
-    # Upper triangular solve
-    F = linalg.solve_triangular(C, conjugate_transpose(B1), lower=True,
-                                unit_diagonal=False, overwrite_b=True,
-                                debug=None, check_finite=False)
-
-    #Compute SVD
-    v, w, _ = linalg.svd(conjugate_transpose(F), compute_uv=True, full_matrices=False,
-                         overwrite_a=True, check_finite=False)
+        # Eigendecompositoin
+        B2 = (B2 + conjugate_transpose(B2)) / 2 # Symmetry
+        w, v = linalg.eigh(B2, overwrite_a=True,
+                           subset_by_index=[l - n_pairs, l - 1],
+                           check_finite=False)
+        w, v = w[::-1] - shift, S.dot(v[:, ::-1])
 
-    return w[:rank]**2, v[:,:rank]
+    if return_basis:
+        return w[:rank], v[:, :rank], v
+    return w, v
 
 
-def compute_reigh_nystroem_col(A, rank, oversample=0, random_state=None):
+def compute_reigh_nystroem_col(A, rank, oversample=0, random_state=None,
+                               sampling='uniform', block_size=1, tol=None):
     """Randomized eigendecompostion using the Nystroem method.
 
     The quality of the approximation can be controlled via the oversampling
     parameter `oversample`.
 
+    The core matrix is factored by a Cholesky decomposition after shifting
+    `A` by `sqrt(n) * eps * ||A[:, idx]||_2`, which is removed from the
+    eigenvalues afterwards. This is stable for positive semidefinite `A`,
+    also if it is numerically rank deficient.
+
 
     Parameters
     ----------
@@ -199,6 +635,19 @@ def compute_reigh_nystroem_col(A, rank, oversample=0, random_state=None):
         If RandomState instance, random_state is the random number generator;
         If None, the random number generator is the RandomState instance used by np.random.
 
+    sampling : str `{'uniform', 'rpcholesky'}`, default: `sampling='uniform'`.
+        'uniform' : The columns are sampled uniformly.
+        'rpcholesky' : The columns are selected by a randomly pivoted partial
+        Cholesky decomposition, see `compute_rpcholesky`.
+
+    block_size : integer, default: 1.
+        Number of columns selected at once if `sampling='rpcholesky'`.
+
+    tol : float or None, optional (default ``None``)
+        If `sampling='rpcholesky'`, the selection stops once the trace of the
+        residual is below `tol` times the trace of `A`, and fewer than `rank`
+        eigenpairs may be returned.
+
 
     Returns
     -------
@@ -217,6 +666,11 @@ def compute_reigh_nystroem_col(A, rank, oversample=0, random_state=None):
     algorithms for constructing approximate matrix
     decompositions" (2009).
     (available at `arXiv <http://arxiv.org/abs/0909.4061>`_).
+
+    J. Tropp, A. Yurtsever, M. Udell, and V. Cevher.
+    "Fixed-rank approximation of a positive-semidefinite matrix from
+    streaming data" (2017).
+    (available at `arXiv <https://arxiv.org/abs/1706.05736>`_).
     """
 
     # TODO: repace with random uniform sampling
@@ -234,37 +688,302 @@ def compute_reigh_nystroem_col(A, rank, oversample=0, random_state=None):
     if rank < 1 or rank > min(m, n):
         raise ValueError("Target rank must be >= 1 or < min(m, n), not %d" % rank)
 
+    if sampling not in _VALID_SAMPLINGS:
+        raise ValueError('sampling must be one of %s, not %s'
+                         % (' '.join(_VALID_SAMPLINGS), sampling))
+
+    if sampling == 'rpcholesky':
+        F, _ = _rpcholesky(np.diag(A), lambda S: A[:, S], rank + oversample,
+                           block_size, tol, random_state)
+        return _factor_eigh(F, rank)
+
     #Generate a random test matrix Omega
     idx = np.sort(random_state.choice(n, size=(rank+oversample), replace=False))
 
     #Project the data matrix a into a lower dimensional subspace
     B1 = A[:,idx]
-    B2 = B1[idx,:].copy()
 
-    B2 = (B2 + conjugate_transpose(B2)) / 2 # Symmetry
+    # Shift A by a multiple of the machine precision, B1 = (A + shift * I)[:, idx],
+    # so that the core is numerically positive definite
+    shift = _nystroem_shift(B1)
+    B1[idx, np.arange(idx.size)] += shift
+    B2 = B1[idx,:].copy()
 
     try:
-        # Cholesky factorizatoin
-        C = linalg.cholesky(B2, lower=True, overwrite_a=True, check_finite=False)
+        return _nystroem_eigh(B1, B2, shift, rank)
     except linalg.LinAlgError:
         warnings.warn("Cholesky factorizatoin has failed, because array is not "
                       "positive definite. Using SVD instead.")
-        # Eigendecompositoin
-        U, s, _ = linalg.svd(B2, full_matrices=False, overwrite_a=True, check_finite=False)
 
-        U = B1.dot(U / s)
-        U = U[:, :rank] * np.sqrt(rank / n)
-        s = s[:rank] * (n / rank)
+    # Eigendecompositoin
+    B2 = (B2 + conjugate_transpose(B2)) / 2 # Symmetry
+    U, s, _ = linalg.svd(B2, full_matrices=False, overwrite_a=True, check_finite=False)
 
-        return s[:rank], U
+    U = B1.dot(U / s)
+    U = U[:, :rank] * np.sqrt(rank / n)
+    s = s[:rank] * (n / rank)
 
-    # Upper triangular solve
-    F = linalg.solve_triangular(C, conjugate_transpose(B1), lower=True,
-                                unit_diagonal=False, overwrite_b=True,
-                                debug=None, check_finite=False)
+    return s[:rank], U
 
-    #Compute SVD
-    v, w, _ = linalg.svd(conjugate_transpose(F), compute_uv=True,
-                         full_matrices=False, overwrite_a=True, check_finite=False)
 
-    return w[:rank]**2, v[:, :rank]
+def compute_rpcholesky(A, rank, block_size=1, tol=None, random_state=None):
+    """Randomly pivoted partial Cholesky decomposition (RPCholesky).
+
+    Algorithm for computing the low-rank approximation `A ~ F * F.H` of a
+    positive semidefinite `(n, n)` matrix `A`. The pivot columns are sampled
+    with probabilities proportional to the diagonal of the current residual
+    `A - F * F.H`, so redundant columns are unlikely to be selected. Only the
+    diagonal and the selected columns of `A` are read.
+
+    The block variant samples `block_size` pivots at once, and updates the
+    factor with matrix-matrix products.
+
+
+    Parameters
+    ----------
+    A : array_like, shape `(n, n)`.
+        Positive semidefinite input array.
+
+    rank : integer
+        Maximum number of pivots. Best if `rank << n`
+
+    block_size : integer, default: 1.
+        Number of pivots sampled at once.
+
+    tol : float or None, optional (default ``None``)
+        The decomposition stops once the trace of the residual is below `tol`
+        times the trace of `A`.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+
+    Returns
+    -------
+    F : array_like, shape `(n, k)`.
+        Cholesky factor, with `k <= rank`.
+
+    idx : array_like, shape `(k,)`.
+        Selected pivot columns.
+
+
+    References
+    ----------
+    Y. Chen, E. Epperly, J. Tropp, and R. Webber.
+    "Randomly pivoted Cholesky: Practical approximation of a kernel matrix
+    with few entry evaluations" (2023).
+    (available at `arXiv <https://arxiv.org/abs/2207.06503>`_).
+    """
+    random_state = check_random_state(random_state)
+
+    # converts A to array, raise ValueError if A has inf or nan
+    A = np.asarray_chkfinite(A)
+    m, n = A.shape
+
+    if m != n:
+        raise ValueError('A must be square, not %s' % (A.shape,))
+
+    if rank < 1 or rank > n:
+        raise ValueError("Target rank must be >= 1 or < n, not %d" % rank)
+
+    if block_size < 1:
+        raise ValueError('block_size must be >= 1, not %d' % block_size)
+
+    return _rpcholesky(np.diag(A), lambda S: A[:, S], rank, block_size, tol,
+                       random_state)
+
+
+def _kernel_function(kernel, kernel_params):
+    """kernel function func(X, Y) from a callable or a pairwise_kernels name"""
+    if callable(kernel):
+        return partial(kernel, **kernel_params)
+    return partial(pairwise_kernels, metric=kernel, filter_params=True,
+                   **kernel_params)
+
+
+# pairwise_kernels names of the kernels with k(x, x) = 1
+_UNIT_DIAGONAL_KERNELS = ('rbf', 'laplacian', 'chi2')
+
+
+def _kernel_diagonal(X, kernel, func):
+    """diagonal of the kernel matrix, one kernel evaluation per data point"""
+    if isinstance(kernel, str) and kernel in _UNIT_DIAGONAL_KERNELS:
+        return np.ones(X.shape[0])
+    return np.array([func(X[i:i + 1], X[i:i + 1])[0, 0]
+                     for i in range(X.shape[0])])
+
+
+def _kernel_columns(X, X_sample, func, chunk_size, n_jobs):
+    """compute the kernel matrix K(X, X_sample) over row chunks of X"""
+    n = X.shape[0]
+    if chunk_size is None:
+        chunk_size = max(n, 1)
+
+    # the first chunk determines the dtype, the others are written into place
+    K = np.asarray(func(X[:chunk_size], X_sample))
+    K = np.concatenate((K, np.empty((n - K.shape[0], K.shape[1]), dtype=K.dtype)))
+
+    def fill(rows):
+        K[rows] = func(X[rows], X_sample)
+
+    chunks = [slice(start, start + chunk_size)
+              for start in range(chunk_size, n, chunk_size)]
+    if n_jobs is None or n_jobs == 1:
+        for rows in chunks:
+            fill(rows)
+    else:
+        # numpy releases the GIL, threads share K
+        Parallel(n_jobs=n_jobs, prefer='threads')(delayed(fill)(rows)
+                                                  for rows in chunks)
+    return K
+
+
+def compute_reigh_nystroem_kernel(X, kernel, rank, oversample=10,
+                                  kernel_params=None, chunk_size=None,
+                                  n_jobs=None, return_features=False,
+                                  random_state=None, sampling='uniform',
+                                  block_size=1, tol=None):
+    """Randomized eigendecompostion of a kernel matrix using the Nystroem method.
+
+    The eigendecomposition of the positive semidefinite kernel matrix
+    `K = kernel(X, X)` of the data points `X` is approximated from the
+    randomly sampled columns `K[:, idx] = kernel(X, X[idx])`, which are
+    evaluated in row chunks. The `(n, n)` kernel matrix is never formed, the
+    memory and time requirements are linear in `n`.
+
+    The quality of the approximation can be controlled via the oversampling
+    parameter `oversample`. With `sampling='rpcholesky'` the columns are
+    selected adaptively, which additionally requires the diagonal of `K`.
+
+
+    Parameters
+    ----------
+    X : array_like, shape `(n, p)`.
+        Data points.
+
+    kernel : str or callable
+        Kernel function `kernel(X, Y)` returning the `(len(X), len(Y))` kernel
+        matrix, or a kernel name supported by
+        `sklearn.metrics.pairwise.pairwise_kernels`, e.g., 'rbf'.
+
+    rank : integer
+        Target rank. Best if `rank << n`
+
+    oversample : integer, optional (default: 10)
+        Controls the oversampling of column space. Increasing this parameter
+        may improve numerical accuracy.
+
+    kernel_params : dict or None, optional (default ``None``)
+        Additional keyword arguments passed to the kernel function.
+
+    chunk_size : integer or None, optional (default ``None``)
+        Number of rows of `X` for which the kernel is evaluated at once.
+        If None, all rows are processed in a single chunk.
+
+    n_jobs : integer or None, optional (default ``None``)
+        Number of jobs evaluating the chunks in parallel with joblib.
+        If None or 1, the chunks are evaluated sequentially.
+
+    return_features : bool, optional (default: False)
+        If True, the Nystroem feature map `F = v * sqrt(w)`, with
+        `K ~ F * F.H`, is returned instead of the eigenpairs.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+    sampling : str `{'uniform', 'rpcholesky'}`, default: `sampling='uniform'`.
+        'uniform' : The columns are sampled uniformly.
+        'rpcholesky' : The columns are selected by a randomly pivoted partial
+        Cholesky decomposition, see `compute_rpcholesky`.
+
+    block_size : integer, default: 1.
+        Number of columns selected at once if `sampling='rpcholesky'`.
+
+    tol : float or None, optional (default ``None``)
+        If `sampling='rpcholesky'`, the selection stops once the trace of the
+        residual is below `tol` times the trace of `K`, and fewer than `rank`
+        eigenpairs may be returned.
+
+
+    Returns
+    -------
+    w : array_like, 1-d array of length `k`.
+        The eigenvalues.
+
+    v: array_like, shape `(n, k)`.
+        The normalized selected eigenvector corresponding
+        to the eigenvalue w[i] is the column v[:,i].
+
+    F : array_like, shape `(n, k)`, if `return_features=True`.
+        Nystroem feature map.
+
+
+    References
+    ----------
+    C. Williams and M. Seeger.
+    "Using the Nystroem method to speed up kernel machines" (2001).
+    Advances in Neural Information Processing Systems 13: 682-688.
+
+    J. Tropp, A. Yurtsever, M. Udell, and V. Cevher.
+    "Fixed-rank approximation of a positive-semidefinite matrix from
+    streaming data" (2017).
+    (available at `arXiv <https://arxiv.org/abs/1706.05736>`_).
+    """
+    random_state = check_random_state(random_state)
+
+    # converts X to array, raise ValueError if X has inf or nan
+    X = np.asarray_chkfinite(X)
+    if X.ndim != 2:
+        raise ValueError('X must be a 2D array, not %dD' % X.ndim)
+
+    n = X.shape[0]
+    l = rank + oversample
+    if rank < 1 or l > n:
+        raise ValueError("rank + oversample must be >= 1 and <= n, not %d" % l)
+
+    if sampling not in _VALID_SAMPLINGS:
+        raise ValueError('sampling must be one of %s, not %s'
+                         % (' '.join(_VALID_SAMPLINGS), sampling))
+
+    func = _kernel_function(kernel, kernel_params or {})
+
+    if sampling == 'rpcholesky':
+        columns = lambda S: _kernel_columns(X, X[S], func, chunk_size, n_jobs)
+        F, _ = _rpcholesky(_kernel_diagonal(X, kernel, func), columns, l,
+                           block_size, tol, random_state)
+        w, v = _factor_eigh(F, rank)
+        if return_features:
+            return v * np.sqrt(w)
+        return w, v
+
+    # sample the columns of the kernel matrix
+    idx = np.sort(random_state.choice(n, size=l, replace=False))
+    B1 = _kernel_columns(X, X[idx], func, chunk_size, n_jobs)
+    B1 = B1.astype(np.result_type(B1, np.float64), copy=False)
+
+    # Shift K by a multiple of the machine precision, B1 = (K + shift * I)[:, idx]
+    shift = _nystroem_shift(B1)
+    B1[idx, np.arange(l)] += shift
+    B2 = B1[idx].copy()
+
+    try:
+        w, v = _nystroem_eigh(B1, B2, shift, rank)
+    except linalg.LinAlgError:
+        warnings.warn("Cholesky factorizatoin has failed, because the kernel "
+                      "matrix is not positive definite. Using eigh instead.")
+
+        # K ~ Q * R * pinv(B2) * R.H * Q.H
+        Q, R = linalg.qr(B1, mode='economic', overwrite_a=True, check_finite=False)
+        T = R.dot(linalg.pinvh((B2 + conjugate_transpose(B2)) / 2)).dot(
+            conjugate_transpose(R))
+        w, v = linalg.eigh((T + conjugate_transpose(T)) / 2, overwrite_a=True,
+                           subset_by_index=[l - rank, l - 1], check_finite=False)
+        w, v = np.maximum(w[::-1] - shift, 0), Q.dot(v[:, ::-1])
+
+    if return_features:
+        return v * np.sqrt(w)
+    return w, v
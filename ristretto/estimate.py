@@ -0,0 +1,337 @@
+"""
+Randomized Estimators.
+"""
+# Authors: N. Benjamin Erichson
+#          Joseph Knox
+# License: GNU General Public License v3.0
+from __future__ import division
+from math import pi, sqrt
+
+import numpy as np
+from scipy import linalg, stats
+from scipy import sparse as sp
+from scipy.sparse.linalg import LinearOperator
+from sklearn.utils import check_random_state
+from sklearn.utils.extmath import safe_sparse_dot
+
+from .eigen import _hermitian_matmat
+from .sketch import _sketches
+from .sketch.utils import orthonormalize
+from .utils import conjugate_transpose
+
+_VALID_NORMS = ('spectral', 'fro')
+_VALID_TRACE_METHODS = ('hutch++', 'hutchinson')
+
+
+def estimate_residual_norm(A, Q, B, norm='spectral', confidence=0.99,
+                           n_probes=10, random_state=None):
+    """Probabilistic upper bound for the norm of the residual `A - Q * B`.
+
+    The residual is applied to `n_probes` Gaussian random vectors, which
+    costs a single pass over `A` and never forms `A - Q * B`.
+
+    For the spectral norm, the bound
+    `||A - QB|| <= alpha * sqrt(2/pi) * max_i ||(A - QB) w_i||` holds with
+    probability at least `1 - alpha**(-n_probes)`. For the Frobenius norm,
+    `mean_i ||(A - QB) w_i||**2` is an unbiased estimate of `||A - QB||_F**2`
+    and is scaled by the lower tail of the chi-squared distribution.
+
+    Parameters
+    ----------
+    A : array_like or sparse matrix, shape `(m, n)`.
+        Input array.
+
+    Q : array_like, shape `(m, k)`.
+        Left factor of the approximation.
+
+    B : array_like, shape `(k, n)`.
+        Right factor of the approximation.
+
+    norm : str `{'spectral', 'fro'}`, default: `norm='spectral'`.
+        Norm to estimate.
+
+    confidence : float, optional (default: 0.99)
+        Probability with which the returned bound holds, `0 < confidence < 1`.
+
+    n_probes : integer, optional (default: 10)
+        Number of random probe vectors.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+    Returns
+    -------
+    err : float
+        Upper bound of the norm of `A - Q * B`, holding with probability
+        `confidence`.
+
+    References
+    ----------
+    N. Halko, P. Martinsson, and J. Tropp.
+    "Finding structure with randomness: probabilistic
+    algorithms for constructing approximate matrix
+    decompositions" (2009).
+    (available at `arXiv <http://arxiv.org/abs/0909.4061>`_).
+    """
+    if norm not in _VALID_NORMS:
+        raise ValueError('norm must be one of %s, not %s'
+                         % (' '.join(_VALID_NORMS), norm))
+
+    if not 0 < confidence < 1:
+        raise ValueError('confidence must be in (0, 1), not %s' % confidence)
+
+    if n_probes < 1:
+        raise ValueError('n_probes must be >= 1, not %d' % n_probes)
+
+    random_state = check_random_state(random_state)
+
+    # apply the residual to the probes
+    Omega = _sketches.random_gaussian_map(A, n_probes, 1, random_state)
+    Y = safe_sparse_dot(A, Omega, dense_output=True)
+    Y -= safe_sparse_dot(Q, safe_sparse_dot(B, Omega), dense_output=True)
+
+    probe_norms = np.linalg.norm(Y, axis=0)
+
+    if norm == 'spectral':
+        alpha = (1 - confidence) ** (-1 / n_probes)
+        return float(alpha * sqrt(2 / pi) * probe_norms.max())
+
+    # worst case of the lower tail is a rank one residual, chi2(n_probes)
+    scale = stats.chi2.ppf(1 - confidence, n_probes) / n_probes
+    return float(sqrt(np.mean(probe_norms**2) / scale))
+
+
+def _check_estimate_error(estimate_error):
+    """map the estimate_error parameter to a norm or None"""
+    if estimate_error is False or estimate_error is None:
+        return None
+    if estimate_error is True:
+        return 'spectral'
+    if estimate_error not in _VALID_NORMS:
+        raise ValueError('estimate_error must be a bool or one of %s, not %s'
+                         % (' '.join(_VALID_NORMS), estimate_error))
+    return estimate_error
+
+
+def _confidence_interval(samples, estimate, confidence):
+    """two sided Student t interval of level `confidence` around `estimate`,
+    from the sample variance of the independent `samples`"""
+    n_samples = samples.shape[0]
+    if n_samples < 2:
+        return (-np.inf, np.inf)
+    half = (stats.t.ppf((1 + confidence) / 2, n_samples - 1)
+            * np.std(samples, ddof=1) / sqrt(n_samples))
+    return (float(estimate - half), float(estimate + half))
+
+
+def estimate_trace(A, n_matvecs=30, method='hutch++', confidence=0.95,
+                   random_state=None):
+    """Randomized trace estimator.
+
+    Hutchinson's estimator averages `w_i^H * A * w_i` over Rademacher random
+    vectors `w_i`. Hutch++ spends a third of the `n_matvecs` products with
+    `A` on a randomized range finder `Q = orth(A * S)`, computes the trace of
+    `Q^H * A * Q` exactly and applies Hutchinson's estimator only to the
+    deflated matrix `(I - QQ^H) * A * (I - QQ^H)`. For a matrix with a
+    decaying spectrum the variance drops from `O(1/n_matvecs)` to
+    `O(1/n_matvecs**2)`.
+
+    `A` is accessed only by block products, so no decomposition is formed.
+    The confidence interval is a Student t interval of the Hutchinson part
+    and is asymptotic in the number of probes.
+
+    Parameters
+    ----------
+    A : array_like, sparse matrix or LinearOperator, shape `(n, n)`.
+        Square input array.
+
+    n_matvecs : integer, optional (default: 30)
+        Number of products of `A` with a vector.
+
+    method : str `{'hutch++', 'hutchinson'}`, default: `method='hutch++'`.
+        Trace estimator.
+
+    confidence : float, optional (default: 0.95)
+        Level of the confidence interval, `0 < confidence < 1`.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+    Returns
+    -------
+    trace : float
+        Estimate of the trace of `A`.
+
+    interval : tuple of float
+        Lower and upper end of the confidence interval.
+
+    References
+    ----------
+    R. Meyer, C. Musco, C. Musco, and D. Woodruff.
+    "Hutch++: Optimal stochastic trace estimation" (2021).
+    (available at `arXiv <https://arxiv.org/abs/2010.09649>`_).
+    """
+    if method not in _VALID_TRACE_METHODS:
+        raise ValueError('method must be one of %s, not %s'
+                         % (' '.join(_VALID_TRACE_METHODS), method))
+
+    if not 0 < confidence < 1:
+        raise ValueError('confidence must be in (0, 1), not %s' % confidence)
+
+    n_probes = n_matvecs // 3 if method == 'hutch++' else n_matvecs
+    if n_probes < 1:
+        raise ValueError('n_matvecs must be >= %d, not %d'
+                         % (3 if method == 'hutch++' else 1, n_matvecs))
+
+    random_state = check_random_state(random_state)
+
+    _, _, matmat = _hermitian_matmat(A)
+    if not sp.issparse(A) and not isinstance(A, LinearOperator):
+        A = np.asarray(A)
+
+    trace = 0.0
+    G = _sketches.random_rademacher_map(A, n_probes, 1, random_state)
+    if method == 'hutch++':
+        # exact trace on the range of A * S
+        S = _sketches.random_rademacher_map(A, n_probes, 1, random_state)
+        Q = orthonormalize(matmat(S))
+        trace = float(np.real(np.sum(Q.conj() * matmat(Q))))
+
+        # deflate the probes
+        G -= Q.dot(conjugate_transpose(Q).dot(G))
+
+    samples = np.real(np.sum(G.conj() * matmat(G), axis=0))
+    trace += float(np.mean(samples))
+
+    return trace, _confidence_interval(samples, trace, confidence)
+
+
+def _lanczos_quadrature(matmat, V, n_steps, f):
+    """Gauss quadrature of `v^H * f(A) * v` for each unit column `v` of V.
+
+    The Lanczos recurrences of all columns run together, so each step is a
+    single block product with `A`. Each basis vector is reorthogonalized
+    against the earlier ones of its column.
+    """
+    n, n_probes = V.shape
+    basis = [V]
+    alpha = np.zeros((n_steps, n_probes))
+    beta = np.zeros((n_steps - 1, n_probes))
+    steps = np.full(n_probes, n_steps)
+
+    q_prev, q = np.zeros_like(V), V
+    for j in range(n_steps):
+        W = matmat(q)
+        if j > 0:
+            W -= q_prev * beta[j - 1]
+        alpha[j] = np.real(np.sum(q.conj() * W, axis=0))
+        W -= q * alpha[j]
+        for Qi in basis:
+            W -= Qi * np.sum(Qi.conj() * W, axis=0)
+
+        if j == n_steps - 1:
+            break
+
+        # a column which broke down has found an invariant subspace, its
+        # quadrature ends at this step
+        b = linalg.norm(W, axis=0)
+        done = b <= np.finfo(alpha.dtype).eps * max(np.abs(alpha[:j+1]).max(), 1)
+        steps[done & (steps > j)] = j + 1
+        beta[j] = b
+        W[:, done] = 0
+        b[done] = 1
+        q_prev, q = q, W / b
+        basis.append(q)
+
+    quad = np.empty(n_probes)
+    for i in range(n_probes):
+        k = steps[i]
+        theta, U = linalg.eigh_tridiagonal(alpha[:k, i], beta[:k-1, i])
+        quad[i] = np.sum(U[0]**2 * f(theta))
+    return quad
+
+
+def estimate_spectral_sum(A, f=np.log, n_probes=30, n_steps=20,
+                          confidence=0.95, random_state=None):
+    """Stochastic Lanczos quadrature for the spectral sum `tr(f(A))`.
+
+    For a Hermitian `(n, n)` matrix `A` the spectral sum
+    `tr(f(A)) = sum_i f(lambda_i)` is estimated by Hutchinson's estimator,
+    where each quadratic form `w^H * f(A) * w` of a Rademacher vector `w` is
+    approximated by `n_steps` steps of the Lanczos algorithm started at `w`,
+    i.e., by Gauss quadrature. The default `f = np.log` gives the
+    log-determinant of a positive definite `A`, `f = np.sqrt` the nuclear norm
+    of a positive semi-definite `A`, and `f = np.square` the squared
+    Frobenius norm.
+
+    The recurrences of all probes run together, so the cost is `n_steps`
+    block products of `A` with `n_probes` vectors. The confidence interval
+    is a Student t interval over the probes; it accounts for the randomness
+    of the probes, not for the quadrature error, which decays quickly in
+    `n_steps` for smooth `f`.
+
+    Parameters
+    ----------
+    A : array_like, sparse matrix or LinearOperator, shape `(n, n)`.
+        Hermitian input array.
+
+    f : callable, optional (default: np.log)
+        Vectorized function of the eigenvalues.
+
+    n_probes : integer, optional (default: 30)
+        Number of random probe vectors.
+
+    n_steps : integer, optional (default: 20)
+        Number of Lanczos steps per probe, the degree of the quadrature.
+
+    confidence : float, optional (default: 0.95)
+        Level of the confidence interval, `0 < confidence < 1`.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+    Returns
+    -------
+    spectral_sum : float
+        Estimate of `tr(f(A))`.
+
+    interval : tuple of float
+        Lower and upper end of the confidence interval.
+
+    References
+    ----------
+    S. Ubaru, J. Chen, and Y. Saad.
+    "Fast estimation of tr(f(A)) via stochastic Lanczos quadrature" (2017).
+    (available at `SIAM <https://doi.org/10.1137/16M1104974>`_).
+    """
+    if not callable(f):
+        raise ValueError('f must be callable')
+
+    if not 0 < confidence < 1:
+        raise ValueError('confidence must be in (0, 1), not %s' % confidence)
+
+    if n_probes < 1:
+        raise ValueError('n_probes must be >= 1, not %d' % n_probes)
+
+    if n_steps < 1:
+        raise ValueError('n_steps must be >= 1, not %d' % n_steps)
+
+    random_state = check_random_state(random_state)
+
+    n, _, matmat = _hermitian_matmat(A)
+    if not sp.issparse(A) and not isinstance(A, LinearOperator):
+        A = np.asarray(A)
+
+    V = _sketches.random_rademacher_map(A, n_probes, 1, random_state)
+    V = V / sqrt(n)
+
+    samples = n * _lanczos_quadrature(matmat, V, min(n_steps, n), f)
+    spectral_sum = float(np.mean(samples))
+
+    return spectral_sum, _confidence_interval(samples, spectral_sum, confidence)
@@ -8,14 +8,233 @@ from __future__ import division
 
 import numpy as np
 from scipy import linalg
+from sklearn.utils import check_random_state
 
+from .estimate import _check_estimate_error, estimate_residual_norm
 from .qb import compute_rqb
+from .qr import compute_rqrcp
 from .utils import conjugate_transpose
 
 _VALID_MODES = ('row', 'column')
+_VALID_QR_METHODS = ('householder', 'randomized')
 
+# LAPACK geqp3 is used if min(m, n) <= _GEQP3_FACTOR * rank
+_GEQP3_FACTOR = 4
+# number of column blocks of the trailing updates of the partial QR, which
+# bounds their temporaries by a fraction of the size of A
+_QR_SPLIT = 8
 
-def compute_interp_decomp(A, rank, mode='column', index_set=False):
+
+def _column_norms_sq(A):
+    """squared column norms, without temporaries of the size of A"""
+    if np.iscomplexobj(A):
+        return (np.einsum('ij,ij->j', A.real, A.real) +
+                np.einsum('ij,ij->j', A.imag, A.imag))
+    return np.einsum('ij,ij->j', A, A)
+
+
+def _partial_pivoted_qr(A, rank, tol=None):
+    """Householder QR with column pivoting, stopped after `rank` steps.
+
+    Only the first `rank` rows of R are computed, which costs O(m*n*rank)
+    instead of O(m*n*min(m, n)) for the full factorization. If `tol` is given
+    the factorization stops early, once the largest remaining column norm
+    is below `tol` times the largest column norm of `A`.
+
+    If `min(m, n)` is not much larger than `rank`, LAPACK geqp3 computing
+    the full factorization is faster than the partial one.
+
+    Returns R, shape `(k, n)`, and the column permutation P, with `k <= rank`.
+    """
+    m, n = A.shape
+    if min(m, n) <= _GEQP3_FACTOR * rank:
+        R, perm = linalg.qr(A, mode='r', pivoting=True, check_finite=False)
+        # the diagonal of R holds the norms of the pivot columns
+        k = rank
+        if tol is not None:
+            diag = np.abs(np.diag(R)[:rank])
+            k = max(1, int(np.count_nonzero(diag > tol * diag[0])))
+        return R[:k], perm
+
+    # working copy, overwritten by the reflected trailing matrix
+    A = np.array(A, dtype=np.result_type(A, np.float32), order='F')
+
+    perm = np.arange(n)
+    norms = _column_norms_sq(A)
+    ref_norms = norms.copy()
+    threshold = None if tol is None else tol**2 * norms.max()
+    eps = np.finfo(norms.dtype).eps
+
+    k = rank
+    for j in range(rank):
+        # select pivot column
+        p = j + np.argmax(norms[j:])
+        if threshold is not None and j > 0 and norms[p] <= threshold:
+            k = j
+            break
+
+        if p != j:
+            A[:, [j, p]] = A[:, [p, j]]
+            norms[[j, p]] = norms[[p, j]]
+            ref_norms[[j, p]] = ref_norms[[p, j]]
+            perm[[j, p]] = perm[[p, j]]
+
+        # Householder reflector mapping A[j:, j] onto -sign * alpha * e_1
+        v = A[j:, j].copy()
+        alpha = linalg.norm(v)
+        if alpha == 0:
+            continue
+        sign = v[0] / abs(v[0]) if v[0] != 0 else 1
+        v[0] += sign * alpha
+        tau = 2 / np.real(np.vdot(v, v))
+
+        # apply the reflector to the trailing matrix in _QR_SPLIT column
+        # blocks, to avoid temporaries of the size of A
+        v_conj = v.conj()
+        width = max(-(-(n - j - 1) // _QR_SPLIT), 1)
+        for start in range(j + 1, n, width):
+            block = A[j:, start:start + width]
+            block -= np.outer(v, tau * np.dot(v_conj, block))
+        A[j, j] = -sign * alpha
+
+        # downdate the column norms, recompute them in case of cancellation
+        norms[j+1:] -= np.abs(A[j, j+1:])**2
+        stale = np.flatnonzero(norms[j+1:] <= np.sqrt(eps) * ref_norms[j+1:]) + j + 1
+        for start in range(0, stale.size, 16):
+            cols = stale[start:start + 16]
+            norms[cols] = _column_norms_sq(A[j+1:, cols])
+            ref_norms[cols] = norms[cols]
+
+    return np.triu(A[:k]), perm
+
+
+class InterpolationMatrix(object):
+    """Compact representation of an interpolation matrix.
+
+    The interpolation matrix `V`, shape `(k, n)`, of an ID `A = A[:, J] * V`
+    contains a `(k, k)` identity matrix in the skeleton columns `J` and an
+    arbitrary `(k, n-k)` block `T` in the remaining columns. Only the column
+    permutation and `T` are stored, and products with `V` never form the
+    identity block.
+
+    Parameters
+    ----------
+    perm : array_like, shape `(n,)`.
+        Column permutation, the first `k` entries are the skeleton indices.
+
+    T : array_like, shape `(k, n-k)`.
+        Interpolation coefficients of the redundant columns.
+
+    adjoint : bool, optional (default: False)
+        If True, the object represents the conjugate transpose `V**H`, shape
+        `(n, k)`, as returned by the row ID.
+
+    Attributes
+    ----------
+    indices : array_like, shape `(k,)`.
+        Skeleton indices.
+
+    Notes
+    -----
+    `X @ V` calls `V.rdot(X)`, while `X.dot(V)` with an ndarray `X` converts
+    `V` to a dense array first.
+    """
+
+    ndim = 2
+    # make ndarray binary operators, notably `X @ V`, defer to this class
+    __array_ufunc__ = None
+
+    def __init__(self, perm, T, adjoint=False):
+        self.perm = np.asarray(perm)
+        self.T = np.asarray(T)
+        self.adjoint = adjoint
+
+        k = self.T.shape[0]
+        if self.T.ndim != 2 or self.T.shape[1] != self.perm.size - k:
+            raise ValueError('T must have shape (k, n-k), not %s'
+                             % (self.T.shape,))
+
+    @property
+    def indices(self):
+        return self.perm[:self.T.shape[0]]
+
+    @property
+    def shape(self):
+        k = self.T.shape[0]
+        n = self.perm.size
+        return (n, k) if self.adjoint else (k, n)
+
+    @property
+    def dtype(self):
+        return self.T.dtype
+
+    @property
+    def H(self):
+        """Conjugate transpose, shares the stored arrays."""
+        return InterpolationMatrix(self.perm, self.T, adjoint=not self.adjoint)
+
+    def dot(self, X):
+        """Matrix product `V * X`."""
+        X = np.asarray(X)
+        k = self.T.shape[0]
+        skeleton, rest = self.perm[:k], self.perm[k:]
+        if self.adjoint:
+            out = np.empty((self.perm.size,) + X.shape[1:],
+                           dtype=np.result_type(self.T, X))
+            out[skeleton] = X
+            out[rest] = conjugate_transpose(self.T).dot(X)
+            return out
+        return X[skeleton] + self.T.dot(X[rest])
+
+    def rdot(self, X):
+        """Matrix product `X * V`."""
+        X = np.asarray(X)
+        k = self.T.shape[0]
+        skeleton, rest = self.perm[:k], self.perm[k:]
+        if self.adjoint:
+            return X[..., skeleton] + X[..., rest].dot(conjugate_transpose(self.T))
+        out = np.empty(X.shape[:-1] + (self.perm.size,),
+                       dtype=np.result_type(self.T, X))
+        out[..., skeleton] = X
+        out[..., rest] = X.dot(self.T)
+        return out
+
+    __matmul__ = dot
+    __rmatmul__ = rdot
+
+    def toarray(self):
+        """Return the dense interpolation matrix."""
+        k = self.T.shape[0]
+        V = np.empty((k, self.perm.size), dtype=self.T.dtype)
+        V[:, self.perm[:k]] = np.eye(k, dtype=self.T.dtype)
+        V[:, self.perm[k:]] = self.T
+        return conjugate_transpose(V) if self.adjoint else V
+
+    def __array__(self, dtype=None, copy=None):
+        V = self.toarray()
+        return V if dtype is None else V.astype(dtype)
+
+    def save(self, file):
+        """Save the compact representation to a `.npz` file."""
+        np.savez(file, perm=self.perm, T=self.T, adjoint=self.adjoint)
+
+    @classmethod
+    def load(cls, file):
+        """Load an interpolation matrix saved with `save`."""
+        with np.load(file) as data:
+            return cls(data['perm'], data['T'], adjoint=bool(data['adjoint']))
+
+
+def _adjoint(V):
+    """conjugate transpose of a dense or compact interpolation matrix"""
+    if isinstance(V, InterpolationMatrix):
+        return V.H
+    return conjugate_transpose(V)
+
+
+def compute_interp_decomp(A, rank, mode='column', index_set=False, tol=None,
+                          qr_method='householder', random_state=None,
+                          compact=False):
     """Interpolative decomposition (ID).
 
     Algorithm for computing the low-rank ID
@@ -29,6 +248,10 @@ def compute_interp_decomp(A, rank, mode='column', index_set=False):
     row pivoted QR decomposition. The factor matrix `R` is now formed as
     a subset of rows of `A`, also called the partial row skeleton.
 
+    The pivoted QR decomposition is truncated after `rank` steps, so the
+    cost is `O(m * n * rank)`. With `qr_method='randomized'` the pivots are
+    chosen in blocks from a Gaussian sketch, see `compute_rqrcp`.
+
     Parameters
     ----------
     A : array_like, shape `(m, n)`.
@@ -44,6 +267,25 @@ def compute_interp_decomp(A, rank, mode='column', index_set=False):
     index_set: str `{'True', 'False'}`, default: `index_set='False'`.
         'True' : Return column/row index set instead of `C` or `R`.
 
+    tol : float or None, optional (default ``None``)
+        If given, the pivoted QR decomposition stops as soon as the largest
+        remaining column norm drops below `tol` times the largest column
+        norm of `A`, and the returned rank may be smaller than `rank`.
+
+    qr_method : str `{'householder', 'randomized'}`, default: `qr_method='householder'`.
+        'householder' : Householder QR with classical column pivoting.
+        'randomized' : Blocked QR with randomized column pivoting.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+        Only used if `qr_method='randomized'`.
+
+    compact : bool, optional (default: False)
+        If True, `V` (or `Z`) is returned as an `InterpolationMatrix`, which
+        stores only the skeleton indices and the non-identity block.
+
 
     Returns
     -------
@@ -73,6 +315,10 @@ def compute_interp_decomp(A, rank, mode='column', index_set=False):
         raise ValueError('mode must be one of %s, not %s'
                          % (' '.join(_VALID_MODES), mode))
 
+    if qr_method not in _VALID_QR_METHODS:
+        raise ValueError('qr_method must be one of %s, not %s'
+                         % (' '.join(_VALID_QR_METHODS), qr_method))
+
     # converts A to array, raise ValueError if A has inf or nan
     A = np.asarray_chkfinite(A)
     if mode=='row':
@@ -82,17 +328,34 @@ def compute_interp_decomp(A, rank, mode='column', index_set=False):
     if rank < 1 or rank > min(m, n):
         raise ValueError("Target rank rank must be >= 1 or < min(m, n), not %d" % rank)
 
-    #Pivoted QR decomposition
-    Q, R, P = linalg.qr(A, mode='economic', overwrite_a=False, pivoting=True,
-                        check_finite=False)
+    # Truncated pivoted QR decomposition, only the first rank rows of R
+    if qr_method == 'householder':
+        R, P = _partial_pivoted_qr(A, rank, tol=tol)
+    else:
+        _, R, P = compute_rqrcp(A, rank, random_state=random_state)
+        if tol is not None:
+            # the diagonal of R holds the norms of the pivot columns
+            diag = np.abs(np.diag(R))
+            R = R[:max(1, np.count_nonzero(diag > tol * diag[0]))]
+    rank = R.shape[0]
 
     # Select column subset
     C = A[:, P[:rank]]
 
-    # Compute V
-    T =  linalg.pinv2(R[:rank, :rank]).dot(R[:rank, rank:n])
-    V = np.bmat([[np.eye(rank), T]])
-    V = V[:, np.argsort(P)]
+    # Compute V, scattering the identity and T directly into place
+    R11, R12 = R[:, :rank], R[:, rank:]
+    diag = np.abs(np.diag(R11))
+    if diag.min() > max(m, n) * np.finfo(diag.dtype).eps * diag.max():
+        T = linalg.solve_triangular(R11, R12, lower=False, check_finite=False)
+    else:
+        # numerically rank deficient, least-squares solve
+        T = linalg.lstsq(R11, R12, check_finite=False)[0]
+    if compact:
+        V = InterpolationMatrix(P, T)
+    else:
+        V = np.empty((rank, n), dtype=T.dtype)
+        V[:, P[:rank]] = np.eye(rank, dtype=T.dtype)
+        V[:, P[rank:]] = T
 
     # Return ID
     if mode == 'column':
@@ -101,13 +364,14 @@ def compute_interp_decomp(A, rank, mode='column', index_set=False):
         return C, V
     # mode == row
     elif index_set:
-        return conjugate_transpose(V), P[:rank]
+        return _adjoint(V), P[:rank]
 
-    return conjugate_transpose(V), conjugate_transpose(C)
+    return _adjoint(V), conjugate_transpose(C)
 
 
 def compute_rinterp_decomp(A, rank, oversample=10, n_subspace=2, mode='column',
-                   index_set=False, random_state=None):
+                   index_set=False, random_state=None, estimate_error=False,
+                   confidence=0.99, compact=False):
     """Randomized interpolative decomposition (rID).
 
     Algorithm for computing the approximate low-rank ID
@@ -154,6 +418,17 @@ def compute_rinterp_decomp(A, rank, oversample=10, n_subspace=2, mode='column',
         If RandomState instance, random_state is the random number generator;
         If None, the random number generator is the RandomState instance used by np.random.
 
+    estimate_error : bool or str `{'spectral', 'fro'}`, optional (default: False)
+        If not False, an upper bound of the chosen norm of the residual
+        `A - C * V` or `A - Z * R` is computed with a few Gaussian probes and returned
+        as well. True selects the spectral norm.
+
+    confidence : float, optional (default: 0.99)
+        Probability with which the error bound holds.
+
+    compact : bool, optional (default: False)
+        If True, `V` (or `Z`) is returned as an `InterpolationMatrix`.
+
 
     Returns
     -------
@@ -171,6 +446,9 @@ def compute_rinterp_decomp(A, rank, oversample=10, n_subspace=2, mode='column',
         R : array_like, shape `(rank, n)`.
             Partial row skeleton.
 
+    err : float, if `estimate_error` is not False.
+        Upper bound of the norm of the residual.
+
     References
     ----------
     S. Voronin and P.Martinsson.
@@ -188,20 +466,32 @@ def compute_rinterp_decomp(A, rank, oversample=10, n_subspace=2, mode='column',
     if mode == 'row':
         A = conjugate_transpose(A)
 
+    # draws of the sketches and the error probes have to be independent
+    random_state = check_random_state(random_state)
+    norm = _check_estimate_error(estimate_error)
+
     # compute QB factorization
     Q, B = compute_rqb(A, rank, oversample=oversample, n_subspace=n_subspace,
                        random_state=random_state)
 
     # Deterministic ID
-    J, V = compute_interp_decomp(B, rank, mode='column', index_set=True)
+    J, V = compute_interp_decomp(B, rank, mode='column', index_set=True,
+                                 compact=compact)
     J = J[:rank]
 
     # Return ID
     if mode == 'column':
-        if index_set:
-            return J, V
-        return A[:, J], V
+        factors = (J, V) if index_set else (A[:, J], V)
     # mode == 'row'
     elif index_set:
-        return conjugate_transpose(V), J
-    return conjugate_transpose(V), conjugate_transpose(A[:, J])
+        factors = (_adjoint(V), J)
+    else:
+        factors = (_adjoint(V), conjugate_transpose(A[:, J]))
+
+    if norm is not None:
+        # the residual of the row ID is the adjoint of the one of A.H
+        err = estimate_residual_norm(A, A[:, J], V, norm=norm,
+                                     confidence=confidence,
+                                     random_state=random_state)
+        return factors + (err,)
+    return factors
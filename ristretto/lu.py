@@ -5,24 +5,60 @@ Randomized LU Decomposition
 #          Joseph Knox
 # License: GNU General Public License v3.0
 from __future__ import division
+import warnings
+from functools import partial
 
 import numpy as np
 from scipy import linalg
-from scipy import sparse
+from scipy import sparse as sp
+from scipy.sparse.linalg import LinearOperator
+from sklearn.base import BaseEstimator
+from sklearn.utils.extmath import safe_sparse_dot
+from sklearn.utils.validation import check_is_fitted
 
-from .sketch.transforms import johnson_lindenstrauss
+from .sketch.transforms import johnson_lindenstrauss, sparse_johnson_lindenstrauss
 from .sketch.utils import perform_subspace_iterations
 from .utils import conjugate_transpose
 
 
-def compute_rlu(A, rank, oversample=10, n_subspace=2, permute=False, random_state=None):
+def _pivots_to_permutation(piv, m):
+    """convert LAPACK row interchanges to a permutation vector"""
+    perm = np.arange(m)
+    for i, p in enumerate(piv):
+        perm[i], perm[p] = perm[p], perm[i]
+    return perm
+
+
+def _unit_lower(lu):
+    """extract the unit lower trapezoidal factor of a packed LU"""
+    L = np.tril(lu, -1)
+    k = min(L.shape)
+    L[np.arange(k), np.arange(k)] = 1
+    return L
+
+
+def _pivoted_lu(A):
+    """pivoted LU, A[perm] = L * U, with U kept packed in lu"""
+    with warnings.catch_warnings():
+        # rank deficient sketches have zero pivots, U is not needed then
+        warnings.simplefilter('ignore', linalg.LinAlgWarning)
+        lu, piv = linalg.lu_factor(A, overwrite_a=True, check_finite=False)
+    return lu, _pivots_to_permutation(piv, A.shape[0])
+
+
+_VALID_SOLVERS = ('triangular', 'lstsq')
+
+
+def compute_rlu(A, rank, oversample=10, n_subspace=2, permute=False,
+                sparse=False, solver='triangular', random_state=None):
     """Randomized LU Decomposition.
 
     Randomized algorithm for computing the approximate low-rank LU
     decomposition of a rectangular `(m, n)` matrix `A`, with target rank
     `rank << min{m, n}`. The input matrix is factored as `A = P * L * U * C`, where
     `L` and `U` are the lower and upper triangular matrices, respectively.
-    And `P` and `C` are the row and column permutation matrices.
+    And `P` and `C` are the row and column permutations, which are returned
+    as index vectors, i.e., `A = (L * U)[P][:, C]`.
 
     The quality of the approximation can be controlled via the oversampling
     parameter `oversample` and `n_subspace` which specifies the number of
@@ -31,8 +67,8 @@ def compute_rlu(A, rank, oversample=10, n_subspace=2, permute=False, random_stat
 
     Parameters
     ----------
-    A : array_like, shape `(m, n)`.
-        Input array.
+    A : array_like or sparse matrix, shape `(m, n)`.
+        Input array. CSR and CSC matrices are never densified.
 
     rank : integer
         Target rank. Best if `rank << min{m,n}`
@@ -46,7 +82,17 @@ def compute_rlu(A, rank, oversample=10, n_subspace=2, permute=False, random_stat
         parameter may improve numerical accuracy.
 
     permute : bool, default: `permute=False`.
-        If `True`, perform the multiplication P*L and U*C.
+        If `True`, perform the multiplication P*L and U*C, i.e., return
+        `L[P]` and `U[:, C]`.
+
+    sparse : boolean, optional (default: False)
+        If sparse == True, use a sparse random sketch.
+
+    solver : str `{'triangular', 'lstsq'}`, default: `solver='triangular'`.
+        'triangular' : B is computed by a triangular solve with the leading
+        `(rank, rank)` block of L_tilde, which only reads `rank` rows of `A`.
+        'lstsq' : B is the QR based least-squares solution over all rows of
+        `A`, which may be more accurate for noisy matrices.
 
     random_state : integer, RandomState instance or None, optional (default ``None``)
         If integer, random_state is the seed used by the random number generator;
@@ -55,8 +101,8 @@ def compute_rlu(A, rank, oversample=10, n_subspace=2, permute=False, random_stat
 
     Returns
     -------
-    P : array_like, shape `(m, m)`.
-        Row permutation matrix, only returned if `permute == False`.
+    P : array_like, shape `(m,)`.
+        Row permutation vector, only returned if `permute == False`.
 
     L :  array_like, shape `(m, rank)`.
         Lower triangular matrix.
@@ -64,8 +110,8 @@ def compute_rlu(A, rank, oversample=10, n_subspace=2, permute=False, random_stat
     U : array_like, shape `(rank, n)`.
         Upper triangular matrix.
 
-    C : array_like, shape `(n, n)`.
-        Column permutation matrix, only returned if `permute == False`.
+    C : array_like, shape `(n,)`.
+        Column permutation vector, only returned if `permute == False`.
 
 
     References
@@ -81,35 +127,239 @@ def compute_rlu(A, rank, oversample=10, n_subspace=2, permute=False, random_stat
     Applied and Computational Harmonic Analysis (2016).
     (available at `arXiv <https://arxiv.org/abs/1310.7202>`_).
     """
+    if solver not in _VALID_SOLVERS:
+        raise ValueError('solver must be one of %s, not %s'
+                         % (' '.join(_VALID_SOLVERS), solver))
+
     # get random sketch
-    S = johnson_lindenstrauss(A, rank + oversample, random_state=random_state)
+    if sparse:
+        S = sparse_johnson_lindenstrauss(A, rank + oversample,
+                                         random_state=random_state)
+    else:
+        S = johnson_lindenstrauss(A, rank + oversample, random_state=random_state)
 
     if n_subspace > 0:
         S = perform_subspace_iterations(A, S, n_iter=n_subspace, axis=1)
 
     # Compute pivoted LU decompostion of the orthonormal basis matrix Q.
-    # Q = P * L * U
-    P, L_tilde, _ = linalg.lu(S, permute_l=False, overwrite_a=True, check_finite=False)
-    _, r ,_ = sparse.find(P.T)
+    # Q[r] = L * U
+    lu, r = _pivoted_lu(S)
 
     # Truncate L_tilde
-    L_tilde = L_tilde[:, :rank]
+    L_tilde = _unit_lower(lu[:, :rank])
+
+    # Form smaller matrix B, such that A[r] = L_tilde * B
+    if solver == 'triangular':
+        # unit lower triangular leading block, only the pivot rows are read
+        A_r = A[r[:rank]]
+        A_r = A_r.toarray() if sp.issparse(A_r) else np.array(A_r)
+        B = linalg.solve_triangular(L_tilde[:rank], A_r, lower=True,
+                                    unit_diagonal=True, overwrite_b=True,
+                                    check_finite=False)
+    else:
+        Q, R = linalg.qr(L_tilde, mode='economic', check_finite=False)
 
-    # Form smaller matrix B
-    U, s, Vt = linalg.svd(L_tilde, compute_uv=True, full_matrices=False,
-                          overwrite_a=False, check_finite=False)
+        # Apply the row permutation to the small matrix Q.H instead of
+        # copying A, i.e., Q.H * A[r, :] == Q_r * A
+        Q_r = np.empty((rank, A.shape[0]), dtype=Q.dtype)
+        Q_r[:, r] = conjugate_transpose(Q)
+        B = linalg.solve_triangular(
+            R, safe_sparse_dot(Q_r, A, dense_output=True), lower=False,
+            overwrite_b=True, check_finite=False)
 
-    B = (conjugate_transpose(Vt) / s).dot(conjugate_transpose(U)).dot(A[r,:])
+    # Compute LU decompostion of B.H, B.H[c] = L * U
+    lu, c = _pivoted_lu(conjugate_transpose(B))
 
-    # Compute LU decompostion of B.
-    C, L, U = linalg.lu(conjugate_transpose(B), permute_l=False,
-                        overwrite_a=True, check_finite=False)
+    # A[r][:, c] = L_tilde * U.H * L.H
+    L = L_tilde.dot(conjugate_transpose(np.triu(lu[:rank])))
+    U = conjugate_transpose(_unit_lower(lu))
+
+    # Inverse permutations, A = (L * U)[p][:, q]
+    p = np.argsort(r)
+    q = np.argsort(c)
 
     #Return
     if permute:
-        _, r ,_ = sparse.find(P)
-        _, c ,_ = sparse.find(C)
-        return L_tilde.dot(conjugate_transpose(U))[r,:], conjugate_transpose(L)[:,c]
+        return L[p], U[:, q]
+
+    return p, L, U, q
+
+
+class RLU(BaseEstimator):
+    """Randomized LU factorization as a fast low-rank operator.
+
+    Stores the factors of `compute_rlu`, `A = (L * U)[P][:, C]`, as
+    `O((m + n) * rank)` dense factors plus two permutation vectors. The
+    fitted object applies the approximation with `matvec` and `rmatvec`, and
+    solves `(shift * I + A) x = b` with the Woodbury identity, which only
+    requires the factorization of a `(rank, rank)` core matrix. All methods
+    accept blocks of right hand sides, i.e., arrays of shape `(n, k)`.
+
+    Parameters
+    ----------
+    rank : integer
+        Target rank. Best if `rank << min{m,n}`
+
+    oversample : integer, optional (default: 10)
+        Controls the oversampling of column space.
+
+    n_subspace : integer, default: 2.
+        Parameter to control number of subspace iterations.
+
+    shift : scalar, optional (default: 0)
+        Shift of the identity used by `solve`. If zero, `solve` returns the
+        minimum norm least-squares solution of `A x = b`, and
+        `aspreconditioner` a nonsingular inverse, see there.
+
+    sparse : boolean, optional (default: False)
+        If sparse == True, use a sparse random sketch.
+
+    solver : str `{'triangular', 'lstsq'}`, default: `solver='triangular'`.
+        Method used to form the smaller matrix, see `compute_rlu`.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+    Attributes
+    ----------
+    P_ : array_like, shape `(m,)`.
+        Row permutation vector.
+
+    L_ : array_like, shape `(m, rank)`.
+        Lower triangular matrix.
+
+    U_ : array_like, shape `(rank, n)`.
+        Upper triangular matrix.
+
+    C_ : array_like, shape `(n,)`.
+        Column permutation vector.
+    """
+
+    def __init__(self, rank, oversample=10, n_subspace=2, shift=0,
+                 sparse=False, solver='triangular', random_state=None):
+        self.rank = rank
+        self.oversample = oversample
+        self.n_subspace = n_subspace
+        self.shift = shift
+        self.sparse = sparse
+        self.solver = solver
+        self.random_state = random_state
+
+    def fit(self, A, y=None):
+        '''y is for compatibility with other estimators, y is ignored'''
+        self.P_, self.L_, self.U_, self.C_ = compute_rlu(
+            A, self.rank, oversample=self.oversample, n_subspace=self.n_subspace,
+            sparse=self.sparse, solver=self.solver, random_state=self.random_state)
+
+        self._P_inv = np.argsort(self.P_)
+        self._C_inv = np.argsort(self.C_)
+        self._core = None
+        return self
+
+    @property
+    def shape(self):
+        return self.L_.shape[0], self.U_.shape[1]
+
+    @property
+    def dtype(self):
+        return np.result_type(self.L_, self.U_)
+
+    def matvec(self, x):
+        '''Compute `A * x`'''
+        check_is_fitted(self, ['L_', 'U_'])
+        x = np.asarray(x)
+        return self.L_.dot(self.U_.dot(x[self._C_inv]))[self.P_]
+
+    def rmatvec(self, x):
+        '''Compute `A.H * x`'''
+        check_is_fitted(self, ['L_', 'U_'])
+        x = np.asarray(x)
+        return conjugate_transpose(self.U_).dot(
+            conjugate_transpose(self.L_).dot(x[self._P_inv]))[self.C_]
+
+    def _factor_core(self, shift):
+        '''factor the core matrix of the Woodbury identity, cached per shift'''
+        if self._core is not None and self._core[0] == shift:
+            return self._core[1]
+
+        if shift == 0:
+            # A = L_p * U_c, minimum norm solution via QR of both factors
+            QL, RL = linalg.qr(self.L_, mode='economic', check_finite=False)
+            QU, RU = linalg.qr(conjugate_transpose(self.U_), mode='economic',
+                               check_finite=False)
+            core = (QL, RL, QU, RU)
+        else:
+            # shift * I + U_c * L_p, where U_c = U[:, C] and L_p = L[P]
+            K = self.U_.dot(self.L_[self.P_[self._C_inv]])
+            K[np.diag_indices_from(K)] += shift
+            core = linalg.lu_factor(K, check_finite=False)
+
+        self._core = (shift, core)
+        return core
+
+    def solve(self, b, shift=None):
+        '''Solve `(shift * I + A) x = b`, default shift is `self.shift`'''
+        check_is_fitted(self, ['L_', 'U_'])
+        shift = self.shift if shift is None else shift
+        b = np.asarray(b)
+
+        m, n = self.shape
+        if shift != 0 and m != n:
+            raise ValueError('shifted solves require a square matrix, not %s'
+                             % (self.shape,))
+
+        core = self._factor_core(shift)
+        if shift == 0:
+            QL, RL, QU, RU = core
+            w = linalg.solve_triangular(RL, conjugate_transpose(QL).dot(b[self._P_inv]),
+                                        lower=False, check_finite=False)
+            w = linalg.solve_triangular(RU, w, trans='C', lower=False,
+                                        check_finite=False)
+            return QU.dot(w)[self.C_]
+
+        # Woodbury: (s * I + L_p * U_c)^-1 = (I - L_p (s * I + U_c * L_p)^-1 U_c) / s
+        w = linalg.lu_solve(core, self.U_.dot(b[self._C_inv]), check_finite=False)
+        return (b - self.L_.dot(w)[self.P_]) / shift
+
+    def aslinearoperator(self):
+        '''LinearOperator view of the approximation of A'''
+        return LinearOperator(self.shape, matvec=self.matvec, rmatvec=self.rmatvec,
+                              matmat=self.matvec, rmatmat=self.rmatvec,
+                              dtype=self.dtype)
+
+    def aspreconditioner(self, shift=None):
+        '''LinearOperator applying the inverse of `shift * I + A`, e.g. to
+        be passed as the preconditioner `M` of scipy's iterative solvers.
+
+        If the shift is zero, the pseudo-inverse of the rank `k`
+        approximation `A_k` is singular and stalls the iterative solvers.
+        The operator applies the inverse of `A_k + (I - Q * Q.H)` instead,
+        where `Q` is an orthonormal basis of the range of `A_k`, i.e., the
+        complement of the range is passed through unchanged. As
+        `A_k = Q * W` this is the identity plus a rank `k` update and is
+        inverted with the Woodbury identity.'''
+        check_is_fitted(self, ['L_', 'U_'])
+        shift = self.shift if shift is None else shift
+        m, n = self.shape
+        if m != n:
+            raise ValueError('preconditioners require a square matrix, not %s'
+                             % (self.shape,))
+
+        if shift != 0:
+            solve = partial(self.solve, shift=shift)
+        else:
+            # A_k + I - Q * Q.H = I + Q * (W - Q.H), with Q = QL[P], W = RL * U_c
+            QL, RL = self._factor_core(0)[:2]
+            Q = QL[self.P_]
+            W = RL.dot(self.U_[:, self.C_])
+            core = linalg.lu_factor(W.dot(Q), check_finite=False)
+
+            def solve(b):
+                b = np.asarray(b)
+                w = W.dot(b) - conjugate_transpose(Q).dot(b)
+                return b - Q.dot(linalg.lu_solve(core, w, check_finite=False))
 
-    return P, L_tilde.dot(conjugate_transpose(U)), conjugate_transpose(L),\
-        conjugate_transpose(C)
+        return LinearOperator((n, m), matvec=solve, matmat=solve,
+                              dtype=self.dtype)
@@ -7,32 +7,50 @@ Randomized QB Decomposition
 
 import numpy as np
 from scipy import linalg
+from sklearn.utils import check_random_state
+from sklearn.utils.extmath import safe_sparse_dot
 
+from .autotune import AutotuneCache, run_plan, tune
+from .estimate import _check_estimate_error, estimate_residual_norm
 from .sketch.transforms import johnson_lindenstrauss, sparse_johnson_lindenstrauss
-from .sketch.utils import perform_subspace_iterations, orthonormalize
-from .utils import conjugate_transpose
+from .sketch.utils import (perform_shifted_subspace_iterations,
+                           perform_subspace_iterations, orthonormalize)
+from .utils import conjugate_transpose, _asarray_chkfinite
 
 
-def _compute_rqb(A, rank, oversample, n_subspace, sparse, random_state):
+def _compute_rqb(A, rank, oversample, n_subspace, sparse, random_state,
+                 shift=False, tol=None, init_basis=None):
+    # fresh random columns, which complete the initial basis
+    l = rank + oversample
+    if init_basis is not None:
+        init_basis = init_basis[:, :rank]
+        l -= init_basis.shape[1]
+
     if sparse:
-        Q = sparse_johnson_lindenstrauss(A, rank + oversample,
-                                         random_state=random_state)
+        Q = sparse_johnson_lindenstrauss(A, l, random_state=random_state)
     else:
-        Q = johnson_lindenstrauss(A, rank + oversample, random_state=random_state)
+        Q = johnson_lindenstrauss(A, l, random_state=random_state)
+
+    if init_basis is not None:
+        Q = np.concatenate((init_basis, Q), axis=1)
 
-    if n_subspace > 0:
+    if shift or tol is not None:
+        Q = perform_shifted_subspace_iterations(A, Q, rank, n_iter=n_subspace,
+                                                tol=tol, shift=shift, axis=1)
+    elif n_subspace > 0:
         Q = perform_subspace_iterations(A, Q, n_iter=n_subspace, axis=1)
     else:
         Q = orthonormalize(Q)
 
     # Project the data matrix a into a lower dimensional subspace
-    B = conjugate_transpose(Q).dot(A)
+    B = safe_sparse_dot(conjugate_transpose(Q), A, dense_output=True)
 
     return Q, B
 
 
 def compute_rqb(A, rank, oversample=20, n_subspace=2, n_blocks=1, sparse=False,
-                random_state=None):
+                random_state=None, autotune=False, estimate_error=False,
+                confidence=0.99, shift=False, tol=None, init_basis=None):
     """Randomized QB Decomposition.
 
     Randomized algorithm for computing the approximate low-rank QB
@@ -45,7 +63,7 @@ def compute_rqb(A, rank, oversample=20, n_subspace=2, n_blocks=1, sparse=False,
 
     Parameters
     ----------
-    A : array_like, shape `(m, n)`.
+    A : array_like or sparse matrix, shape `(m, n)`.
         Input array.
 
     rank : integer
@@ -73,6 +91,38 @@ def compute_rqb(A, rank, oversample=20, n_subspace=2, n_blocks=1, sparse=False,
         If RandomState instance, random_state is the random number generator;
         If None, the random number generator is the RandomState instance used by np.random.
 
+    autotune : bool or AutotuneCache, optional (default: False)
+        If True, `n_blocks` and `sparse` (and the number of BLAS threads) are
+        replaced by the fastest plan for the shape class of `A`, which is
+        benchmarked on first use and stored in the on-disk cache. An
+        `AutotuneCache` instance can be passed to use a custom cache.
+
+    estimate_error : bool or str `{'spectral', 'fro'}`, optional (default: False)
+        If not False, an upper bound of the chosen norm of the residual
+        `A - Q * B` is computed with a few Gaussian probes and returned
+        as well. True selects the spectral norm.
+
+    confidence : float, optional (default: 0.99)
+        Probability with which the error bound holds.
+
+    shift : bool, optional (default: False)
+        If True, each subspace iteration applies `A * A.H - alpha * I`
+        instead of `A * A.H`, where the shift `alpha` is updated from the
+        Ritz values of the current subspace. This speeds up convergence when
+        the singular values decay slowly, at no additional pass over `A`.
+
+    tol : float or None, optional (default ``None``)
+        If given, the subspace iterations stop once the relative change of
+        the `rank` largest estimated singular values is below `tol`, and
+        `n_subspace` is the maximum number of iterations.
+
+    init_basis : array_like or None, shape `(m, p)`, optional (default ``None``)
+        Basis of an approximate range of `A` to warm start from, e.g., `Q`
+        of a previous decomposition of a slowly changing `A`. Its leading
+        `min(p, rank)` columns replace the sketch of as many Gaussian columns
+        and the remaining columns are drawn fresh. Combined with `tol`, the
+        subspace iterations then stop after few passes.
+
     Returns
     -------
     Q:  array_like, shape `(m, rank + oversample)`.
@@ -81,6 +131,9 @@ def compute_rqb(A, rank, oversample=20, n_subspace=2, n_blocks=1, sparse=False,
     B : array_like, shape `(rank + oversample, n)`.
         Smaller matrix.
 
+    err : float, if `estimate_error` is not False.
+        Upper bound of the norm of `A - Q * B`.
+
     References
     ----------
     N. Halko, P. Martinsson, and J. Tropp.
@@ -94,7 +147,33 @@ def compute_rqb(A, rank, oversample=20, n_subspace=2, n_blocks=1, sparse=False,
     decompositions via randomized sampling on single core, multi core,
     and GPU architectures" (2015).
     (available at `arXiv <http://arxiv.org/abs/1502.05366>`_).
+
+    X. Feng, W. Yu, and Y. Xie.
+    "Algorithm 1053: Faster randomized SVD with dynamic shifts" (2024).
+    (available at `ACM <https://doi.org/10.1145/3660629>`_).
     """
+    if autotune is True or isinstance(autotune, AutotuneCache):
+        cache = autotune if isinstance(autotune, AutotuneCache) else None
+        plan = tune(compute_rqb, A, rank, oversample=oversample,
+                    n_subspace=n_subspace, cache=cache, random_state=random_state)
+        return run_plan(compute_rqb, plan, A, rank, oversample=oversample,
+                        n_subspace=n_subspace, random_state=random_state,
+                        estimate_error=estimate_error, confidence=confidence,
+                        shift=shift, tol=tol, init_basis=init_basis)
+
+    # draws of the sketches and the error probes have to be independent
+    random_state = check_random_state(random_state)
+    norm = _check_estimate_error(estimate_error)
+
+    # converts A to array, raise ValueError if A has inf or nan
+    A = _asarray_chkfinite(A)
+
+    if init_basis is not None:
+        init_basis = np.asarray_chkfinite(init_basis)
+        if init_basis.ndim != 2 or init_basis.shape[0] != A.shape[0]:
+            raise ValueError('init_basis must have shape (%d, p), not %s'
+                             % (A.shape[0], init_basis.shape))
+
     if n_blocks > 1:
         m, n = A.shape
 
@@ -106,10 +185,10 @@ def compute_rqb(A, rank, oversample=20, n_subspace=2, n_blocks=1, sparse=False,
 
         nblock = 1
         for rows in row_sets:
-            # converts A to array, raise ValueError if A has inf or nan
-            Qtemp, Ktemp = _compute_rqb(np.asarray_chkfinite(A[rows, :]), 
+            Qtemp, Ktemp = _compute_rqb(A[rows, :],
                 rank=rank, oversample=oversample, n_subspace=n_subspace, 
-                sparse=sparse, random_state=random_state)
+                sparse=sparse, random_state=random_state, shift=shift, tol=tol,
+                init_basis=None if init_basis is None else init_basis[rows])
 
             Q_block.append(Qtemp)
             K.append(Ktemp)
@@ -117,7 +196,8 @@ def compute_rqb(A, rank, oversample=20, n_subspace=2, n_blocks=1, sparse=False,
 
         Q_small, B = _compute_rqb(
             np.concatenate(K, axis=0), rank=rank, oversample=oversample,
-            n_subspace=n_subspace, sparse=sparse, random_state=random_state)
+            n_subspace=n_subspace, sparse=sparse, random_state=random_state,
+            shift=shift, tol=tol)
 
         Q_small = np.vsplit(Q_small, n_blocks)
 
@@ -125,8 +205,14 @@ def compute_rqb(A, rank, oversample=20, n_subspace=2, n_blocks=1, sparse=False,
         Q = np.concatenate(Q, axis=0)
 
     else:
-        Q, B = _compute_rqb(np.asarray_chkfinite(A), 
+        Q, B = _compute_rqb(A,
             rank=rank, oversample=oversample, n_subspace=n_subspace,
-            sparse=sparse, random_state=random_state)
-
+            sparse=sparse, random_state=random_state, shift=shift, tol=tol,
+            init_basis=init_basis)
+
+    if norm is not None:
+        err = estimate_residual_norm(A, Q, B, norm=norm,
+                                     confidence=confidence,
+                                     random_state=random_state)
+        return Q, B, err
     return Q, B
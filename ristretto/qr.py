@@ -0,0 +1,141 @@
+"""
+Randomized QR Decomposition with Column Pivoting
+"""
+# Authors: N. Benjamin Erichson
+#          Joseph Knox
+# License: GNU General Public License v3.0
+from __future__ import division
+
+import numpy as np
+from scipy import linalg
+from sklearn.utils import check_random_state
+
+from .sketch import _sketches
+from .utils import conjugate_transpose
+
+
+def compute_rqrcp(A, rank=None, block_size=32, oversample=10, random_state=None):
+    """Randomized blocked QR decomposition with column pivoting.
+
+    Algorithm for computing the (partial) column pivoted QR decomposition
+    of a rectangular `(m, n)` matrix `A`, `A[:, P] = Q * R`. The columns are
+    processed in blocks of `block_size`. The pivots of each block are chosen
+    by a classical column pivoted QR of a small Gaussian sketch
+    `G * A_trailing` with `block_size + oversample` rows, which is downdated
+    instead of recomputed after each block. The block itself is factored
+    with an unpivoted QR decomposition and the trailing matrix is updated
+    with matrix-matrix products, so most work is done by BLAS-3 routines.
+
+    Parameters
+    ----------
+    A : array_like, shape `(m, n)`.
+        Input array.
+
+    rank : integer or None, optional (default ``None``)
+        Number of pivots to compute. If None, the full factorization with
+        `min(m, n)` pivots is computed.
+
+    block_size : integer, optional (default: 32)
+        Number of columns factored per block.
+
+    oversample : integer, optional (default: 10)
+        Additional rows of the sketch used to choose the pivots of a block.
+        Increasing this parameter improves the quality of the pivots.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+    Returns
+    -------
+    Q:  array_like, shape `(m, rank)`.
+        Orthonormal basis matrix.
+
+    R : array_like, shape `(rank, n)`.
+        Upper trapezoidal matrix.
+
+    P : array_like, shape `(n,)`.
+        Column permutation vector.
+
+    References
+    ----------
+    P. Martinsson, G. Quintana-Orti, N. Heavner, and R. van de Geijn.
+    "Householder QR factorization with randomization for column pivoting
+    (HQRRP)" (2017).
+    (available at `arXiv <https://arxiv.org/abs/1512.02671>`_).
+
+    J. Duersch and M. Gu.
+    "Randomized QR with column pivoting" (2017).
+    (available at `arXiv <https://arxiv.org/abs/1509.06820>`_).
+    """
+    random_state = check_random_state(random_state)
+
+    # converts A to array, raise ValueError if A has inf or nan
+    A = np.asarray_chkfinite(A)
+    if A.ndim != 2:
+        raise ValueError('A must be a 2D array, not %dD' % A.ndim)
+
+    m, n = A.shape
+    if rank is None:
+        rank = min(m, n)
+
+    if rank < 1 or rank > min(m, n):
+        raise ValueError("Target rank must be >= 1 or < min(m, n), not %d" % rank)
+
+    if block_size < 1:
+        raise ValueError('block_size must be >= 1, not %d' % block_size)
+
+    # working copy of A, holds the trailing matrix projected onto the
+    # orthogonal complement of the computed part of Q
+    A = np.array(A, dtype=np.result_type(A, np.float32), order='F')
+
+    # sketch of the trailing matrix
+    G = conjugate_transpose(_sketches.random_gaussian_map(
+        A, min(block_size + oversample, m), 0, random_state))
+    Y = G.dot(A)
+
+    gemm, = linalg.get_blas_funcs(('gemm',), (A,))
+
+    Q = np.empty((m, rank), dtype=A.dtype, order='F')
+    R = np.zeros((rank, n), dtype=A.dtype)
+    perm = np.arange(n)
+
+    for j in range(0, rank, block_size):
+        b = min(block_size, rank - j)
+
+        # choose the pivots from the sketch of the trailing matrix
+        _, piv = linalg.qr(Y[:, j:], mode='r', pivoting=True,
+                           check_finite=False)
+
+        # move the pivots to the front of the trailing matrix, the displaced
+        # columns take their place, so at most 2 * b columns are copied
+        front = np.arange(b)
+        src = np.concatenate((piv[:b], np.setdiff1d(front, piv[:b]))) + j
+        dst = np.concatenate((front, np.setdiff1d(piv[:b], front))) + j
+        A[:, dst] = A[:, src]
+        Y[:, dst] = Y[:, src]
+        R[:j, dst] = R[:j, src]
+        perm[dst] = perm[src]
+
+        # reorthogonalize the panel against the previous blocks
+        panel = A[:, j:j+b]
+        if j > 0:
+            coef = conjugate_transpose(Q[:, :j]).dot(panel)
+            gemm(-1, Q[:, :j], coef, 1, panel, overwrite_c=True)
+            R[:j, j:j+b] += coef
+
+        # unpivoted QR of the panel
+        Qb, R[j:j+b, j:j+b] = linalg.qr(panel, mode='economic',
+                                        check_finite=False)
+        Q[:, j:j+b] = Qb
+
+        # update the trailing matrix and downdate its sketch
+        if j + b < n:
+            R12 = conjugate_transpose(Qb).dot(A[:, j+b:])
+            R[j:j+b, j+b:] = R12
+            # in-place rank-b update, no temporary of the trailing size
+            gemm(-1, Qb, R12, 1, A[:, j+b:], overwrite_c=True)
+            Y[:, j+b:] -= G.dot(Qb).dot(R12)
+
+    return Q, R, perm
@@ -17,6 +17,11 @@ def random_gaussian_map(A, l, axis, random_state):
     return random_state.standard_normal(size=(A.shape[axis], l)).astype(A.dtype)
 
 
+def random_rademacher_map(A, l, axis, random_state):
+    """generate random rademacher map"""
+    return random_state.choice((-1, 1), size=(A.shape[axis], l)).astype(A.dtype)
+
+
 def random_uniform_map(A, l, axis, random_state):
     """generate random uniform map"""
     return random_state.uniform(-1, 1, size=(A.shape[axis], l)).astype(A.dtype)
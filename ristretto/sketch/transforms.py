@@ -6,6 +6,7 @@ from math import log
 
 import numpy as np
 from scipy import fftpack
+from scipy import sparse
 from sklearn.utils import check_random_state
 from sklearn.utils.extmath import safe_sparse_dot
 
@@ -37,7 +38,8 @@ def johnson_lindenstrauss(A, l, axis=1, random_state=None):
     """
     random_state = check_random_state(random_state)
 
-    A = np.asarray(A)
+    if not sparse.issparse(A):
+        A = np.asarray(A)
     if A.ndim != 2:
         raise ValueError('A must be a 2D array, not %dD' % A.ndim)
 
@@ -49,8 +51,8 @@ def johnson_lindenstrauss(A, l, axis=1, random_state=None):
 
     # project A onto Omega
     if axis == 0:
-        return Omega.T.dot(A)
-    return A.dot(Omega)
+        return safe_sparse_dot(Omega.T, A, dense_output=True)
+    return safe_sparse_dot(A, Omega, dense_output=True)
 
 
 def sparse_johnson_lindenstrauss(A, l, density=None, axis=1, random_state=None):
@@ -66,7 +68,8 @@ def sparse_johnson_lindenstrauss(A, l, density=None, axis=1, random_state=None):
     """
     random_state = check_random_state(random_state)
 
-    A = np.asarray(A)
+    if not sparse.issparse(A):
+        A = np.asarray(A)
     if A.ndim != 2:
         raise ValueError('A must be a 2D array, not %dD' % A.ndim)
 
@@ -81,8 +84,8 @@ def sparse_johnson_lindenstrauss(A, l, density=None, axis=1, random_state=None):
 
     # project A onto Omega
     if axis == 0:
-        return safe_sparse_dot(Omega.T, A)
-    return safe_sparse_dot(A, Omega)
+        return safe_sparse_dot(Omega.T, A, dense_output=True)
+    return safe_sparse_dot(A, Omega, dense_output=True)
 
 
 def fast_johnson_lindenstrauss(A, l, axis=1, random_state=None):
@@ -1,7 +1,11 @@
 """
 Module containing utility functions for
 """
+import numpy as np
 from scipy import linalg
+from sklearn.utils.extmath import safe_sparse_dot
+
+from ..utils import conjugate_transpose
 
 
 def orthonormalize(A, overwrite_a=True, check_finite=False):
@@ -34,3 +38,59 @@ def perform_subspace_iterations(A, Q, n_iter=2, axis=1):
     if axis == 0:
         return Q.T
     return Q
+
+
+def shifted_subspace_iterations(dot, rdot, Q, rank, n_iter=2, tol=None,
+                                shift=True):
+    """perform subspace iterations with dynamic shifts on Q.
+
+    `dot` and `rdot` apply `A` and its conjugate transpose to a block of
+    vectors, Q is a sketch of the range of `A`. Each iteration applies
+    `A * A.H - alpha * I` and orthonormalizes by an SVD, whose singular
+    values give the Ritz values `s**2 - alpha` of `A * A.H`. The shift
+    `alpha` is raised to half the smallest Ritz value, which damps the
+    unwanted part of the spectrum without touching the wanted one. If `tol`
+    is given, the iterations stop once the `rank` largest estimated singular
+    values of `A` change by less than `tol` relative to their size.
+    """
+    Q = orthonormalize(Q)
+
+    alpha = 0.
+    s_prev = None
+    for _ in range(n_iter):
+        Y = dot(rdot(Q))
+        if alpha > 0:
+            Y -= alpha * Q
+        Q, ritz, _ = linalg.svd(Y, full_matrices=False, overwrite_a=True,
+                                check_finite=False)
+
+        s = np.sqrt(np.maximum(ritz[:rank] + alpha, 0))
+        if shift and ritz[-1] > alpha:
+            alpha = (ritz[-1] + alpha) / 2
+
+        if tol is not None and s_prev is not None:
+            change = np.abs(s - s_prev) / np.maximum(s, np.finfo(s.dtype).tiny)
+            if change.max() < tol:
+                break
+        s_prev = s
+
+    return Q
+
+
+def perform_shifted_subspace_iterations(A, Q, rank, n_iter=2, tol=None,
+                                        shift=True, axis=1):
+    """perform subspace iterations with dynamic shifts on Q"""
+    At = conjugate_transpose(A)
+    if axis == 0:
+        # the row space of A is the range of A.H
+        A, At = At, A
+        Q = conjugate_transpose(Q)
+
+    Q = shifted_subspace_iterations(
+        lambda X: safe_sparse_dot(A, X, dense_output=True),
+        lambda X: safe_sparse_dot(At, X, dense_output=True),
+        Q, rank, n_iter=n_iter, tol=tol, shift=shift)
+
+    if axis == 0:
+        return conjugate_transpose(Q)
+    return Q
@@ -1,5 +1,4 @@
 # TODO: improve docs (especially for classes)
-# TODO: write tests for RSVD class
 """
 Random Singular Value Decomposition.
 """
@@ -10,14 +9,21 @@ from __future__ import division
 
 import numpy as np
 from scipy import linalg
+from scipy import sparse as sp
 from sklearn.base import BaseEstimator
+from sklearn.utils import check_random_state
+from sklearn.utils.extmath import safe_sparse_dot
 from sklearn.utils.validation import check_is_fitted
 
+from .autotune import AutotuneCache, run_plan, tune
+from .estimate import _check_estimate_error, estimate_residual_norm
 from .qb import compute_rqb
 from .utils import conjugate_transpose
 
 
-def compute_rsvd(A, rank, oversample=10, n_subspace=2, n_blocks=1, sparse=False, random_state=None):
+def compute_rsvd(A, rank, oversample=10, n_subspace=2, n_blocks=1, sparse=False,
+                 random_state=None, autotune=False, estimate_error=False,
+                 confidence=0.99, shift=False, tol=None, init_basis=None):
     """Randomized Singular Value Decomposition.
 
     Randomized algorithm for computing the approximate low-rank singular value
@@ -61,6 +67,36 @@ def compute_rsvd(A, rank, oversample=10, n_subspace=2, n_blocks=1, sparse=False,
         If RandomState instance, random_state is the random number generator;
         If None, the random number generator is the RandomState instance used by np.random.
 
+    autotune : bool or AutotuneCache, optional (default: False)
+        If True, `n_blocks` and `sparse` (and the number of BLAS threads) are
+        replaced by the fastest plan for the shape class of `A`, which is
+        benchmarked on first use and stored in the on-disk cache. An
+        `AutotuneCache` instance can be passed to use a custom cache.
+
+    estimate_error : bool or str `{'spectral', 'fro'}`, optional (default: False)
+        If not False, an upper bound of the chosen norm of the residual
+        `A - U * diag(s) * Vh` is computed with a few Gaussian probes and returned
+        as well. True selects the spectral norm.
+
+    confidence : float, optional (default: 0.99)
+        Probability with which the error bound holds.
+
+    shift : bool, optional (default: False)
+        If True, the subspace iterations apply `A * A.H - alpha * I` with a
+        shift `alpha` updated from the current Ritz values, which converges
+        faster when the singular values decay slowly.
+
+    tol : float or None, optional (default ``None``)
+        If given, the subspace iterations stop once the relative change of
+        the `rank` largest estimated singular values is below `tol`, and
+        `n_subspace` is the maximum number of iterations.
+
+    init_basis : array_like or None, shape `(m, p)`, optional (default ``None``)
+        Basis of an approximate range of `A` to warm start from, e.g., `U`
+        of a previous decomposition of a slowly changing `A`. Its leading
+        `min(p, rank)` columns are completed by fresh random columns, see
+        `compute_rqb`.
+
 
     Returns
     -------
@@ -73,6 +109,9 @@ def compute_rsvd(A, rank, oversample=10, n_subspace=2, n_blocks=1, sparse=False,
     Vh : array_like
         Left singular values, array of shape `(rank, n)`.
 
+    err : float, if `estimate_error` is not False.
+        Upper bound of the norm of `A - U * diag(s) * Vh`.
+
 
     Notes
     -----
@@ -92,54 +131,153 @@ def compute_rsvd(A, rank, oversample=10, n_subspace=2, n_blocks=1, sparse=False,
     decompositions via randomized sampling on single core, multi core,
     and GPU architectures" (2015).
     (available at `arXiv <http://arxiv.org/abs/1502.05366>`_).
+
+    X. Feng, W. Yu, and Y. Xie.
+    "Algorithm 1053: Faster randomized SVD with dynamic shifts" (2024).
+    (available at `ACM <https://doi.org/10.1145/3660629>`_).
     """
+    if autotune is True or isinstance(autotune, AutotuneCache):
+        cache = autotune if isinstance(autotune, AutotuneCache) else None
+        plan = tune(compute_rsvd, A, rank, oversample=oversample,
+                    n_subspace=n_subspace, cache=cache, random_state=random_state)
+        return run_plan(compute_rsvd, plan, A, rank, oversample=oversample,
+                        n_subspace=n_subspace, random_state=random_state,
+                        estimate_error=estimate_error, confidence=confidence,
+                        shift=shift, tol=tol, init_basis=init_basis)
+
+    # draws of the sketches and the error probes have to be independent
+    random_state = check_random_state(random_state)
+    norm = _check_estimate_error(estimate_error)
+
     m, n = A.shape
 
     # Compute QB decomposition
     Q, B = compute_rqb(A, rank, oversample=oversample, n_subspace=n_subspace,
-                       n_blocks=n_blocks, sparse=sparse, random_state=random_state)
+                       n_blocks=n_blocks, sparse=sparse, random_state=random_state,
+                       shift=shift, tol=tol, init_basis=init_basis)
 
     # Compute SVD
     U, s, Vt = linalg.svd(B, compute_uv=True, full_matrices=False,
                            overwrite_a=True, check_finite=False)
 
-    # Recover right singular vectors
-    U = Q.dot(U)
+    # Recover right singular vectors, only the leading `rank` columns
+    U = Q.dot(U[:, :rank])
 
     # Return Trunc
-    return U[:, :rank], s[:rank], Vt[:rank, :]
+    s, Vt = s[:rank], Vt[:rank, :]
+    if norm is not None:
+        err = estimate_residual_norm(A, U * s, Vt, norm=norm,
+                                     confidence=confidence,
+                                     random_state=random_state)
+        return U, s, Vt, err
+    return U, s, Vt
+
+
+def _chunked_dot(X, W, chunk_size=None, dtype=None):
+    """Compute X * W streaming over row chunks of X."""
+    if not sp.issparse(X):
+        X = np.asarray(X)
+
+    if dtype is not None:
+        W = W.astype(dtype, copy=False)
+
+    n_rows = X.shape[0]
+    if chunk_size is None:
+        chunk_size = max(n_rows, 1)
+
+    out = None
+    for start in range(0, n_rows, chunk_size):
+        X_chunk = X[start:start + chunk_size]
+        if dtype is not None:
+            X_chunk = X_chunk.astype(dtype, copy=False)
+
+        product = safe_sparse_dot(X_chunk, W, dense_output=True)
+        if out is None:
+            out = np.empty((n_rows, W.shape[1]), dtype=product.dtype)
+        out[start:start + chunk_size] = product
+
+    if out is None:
+        out = np.empty((0, W.shape[1]), dtype=W.dtype)
+    return out
 
 
 class RSVD(BaseEstimator):
+    """Randomized Singular Value Decomposition.
+
+    Estimator interface to `compute_rsvd`. After fitting, new rows can be
+    projected onto the right singular vectors with `transform`, and mapped
+    back with `inverse_transform`. Both stream over chunks of `chunk_size`
+    rows, so memory is bounded by the size of a single chunk.
+
+    Parameters
+    ----------
+    rank : integer
+        Target rank. Best if `rank << min{m,n}`
+
+    oversample : integer, optional (default: 10)
+        Controls the oversampling of column space.
+
+    n_subspace : integer, default: 2.
+        Parameter to control number of subspace iterations.
+
+    sparse : boolean, optional (default: False)
+        If sparse == True, perform compressed rsvd.
+
+    random_state : integer, RandomState instance or None, optional (default ``None``)
+        If integer, random_state is the seed used by the random number generator;
+        If RandomState instance, random_state is the random number generator;
+        If None, the random number generator is the RandomState instance used by np.random.
+
+    chunk_size : integer or None, optional (default ``None``)
+        Number of rows processed at once by `transform` and
+        `inverse_transform`. If None, all rows are processed at once.
+
+    dtype : dtype or None, optional (default ``None``)
+        Precision used by `transform` and `inverse_transform`, e.g.,
+        `np.float32` for faster scoring. If None, the input precision is used.
+
+    Attributes
+    ----------
+    U_ : array_like, shape `(m, rank)`.
+        Left singular vectors of the training data.
+
+    s_ : array_like, shape `(rank,)`.
+        Singular values.
+
+    Vt_ : array_like, shape `(rank, n)`.
+        Right singular vectors.
+    """
 
     def __init__(self, rank, oversample=10, n_subspace=2, sparse=False,
-                 random_state=None):
+                 random_state=None, chunk_size=None, dtype=None):
         self.rank = rank
         self.oversample = oversample
         self.n_subspace = n_subspace
         self.sparse = sparse
         self.random_state = random_state
-
-    def _transform(self, U, s):
-        # TODO: CHECK!
-        return U * s
+        self.chunk_size = chunk_size
+        self.dtype = dtype
 
     def fit(self, X, y=None):
         '''y is for compatibility with other estimators, y is ignored'''
-        self.U_, self.s_, self.Vt = compute_rsvd(
+        self.U_, self.s_, self.Vt_ = compute_rsvd(
             X, self.rank, oversample=self.oversample, n_subspace=self.n_subspace,
             sparse=self.sparse, random_state=self.random_state)
         return self
 
-    def fit_transform(self, X):
+    def fit_transform(self, X, y=None):
+        '''Fit to X and return its projection, `U * diag(s)`'''
         self.fit(X)
-        return self._transform(self.U_ * self.s_)
+        return self.U_ * self.s_
 
     def transform(self, X):
-        check_is_fitted(self, ['U_', 's_'])
-        return self._transform(self.U_ * self.s_)
+        '''Project the rows of X onto the right singular vectors'''
+        check_is_fitted(self, ['Vt_'])
+        return _chunked_dot(X, conjugate_transpose(self.Vt_),
+                            chunk_size=self.chunk_size, dtype=self.dtype)
 
     def inverse_transform(self, X):
+        '''Map projected rows X back to the original space'''
         check_is_fitted(self, ['Vt_'])
-        # TODO: CHECK!
-        return X.dot(self.Vt_)
+        return _chunked_dot(X, self.Vt_, chunk_size=self.chunk_size,
+                            dtype=self.dtype)
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+from numpy.testing import assert_raises
+
+from ristretto import autotune
+from ristretto.autotune import AutotuneCache
+from ristretto.qb import compute_rqb
+from ristretto.svd import compute_rsvd
+
+from .utils import relative_error
+
+atol_float32 = 1e-4
+atol_float64 = 1e-8
+
+
+# =============================================================================
+# AutotuneCache class
+# =============================================================================
+def test_autotune_cache(tmpdir):
+    path = os.path.join(str(tmpdir), 'cache', 'autotune.json')
+    cache = AutotuneCache(path, max_entries=2)
+
+    # ------------------------------------------------------------------------
+    # tests persistence
+    cache.put('a', {'sparse': False, 'n_blocks': 1, 'n_threads': None})
+    assert os.path.isfile(path)
+    assert AutotuneCache(path).get('a')['n_blocks'] == 1
+
+    # ------------------------------------------------------------------------
+    # tests least recently used plan is evicted
+    cache.put('b', {'sparse': True, 'n_blocks': 2, 'n_threads': None})
+    cache.get('a')
+    cache.put('c', {'sparse': True, 'n_blocks': 4, 'n_threads': None})
+
+    assert len(cache) == 2
+    assert 'a' in cache and 'c' in cache
+    assert cache.get('b') is None
+
+    # ------------------------------------------------------------------------
+    # tests plans stored by another process are merged, not overwritten
+    other = AutotuneCache(path, max_entries=2)
+    other.put('d', {'sparse': False, 'n_blocks': 2, 'n_threads': None})
+    cache.get('c')
+    cache.put('e', {'sparse': False, 'n_blocks': 4, 'n_threads': None})
+
+    stored = AutotuneCache(path)
+    assert len(stored) == 2 and 'c' in stored and 'e' in stored
+    cache, other = AutotuneCache(path, 4), AutotuneCache(path, 4)
+    other.put('f', {'sparse': False, 'n_blocks': 1, 'n_threads': None})
+    cache.put('g', {'sparse': False, 'n_blocks': 1, 'n_threads': None})
+    stored = AutotuneCache(path)
+    assert len(stored) == 4
+    assert all(stored.get(key) is not None for key in 'cefg')
+
+    # ------------------------------------------------------------------------
+    # tests raises invalid size
+    assert_raises(ValueError, AutotuneCache, path, max_entries=0)
+
+
+def test_default_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv('RISTRETTO_CACHE_DIR', str(tmpdir))
+
+    # ------------------------------------------------------------------------
+    # tests the default cache is created once and read once per process
+    cache = autotune.get_default_cache()
+    assert autotune.get_default_cache() is cache
+    assert cache.path == os.path.join(str(tmpdir), 'autotune.json')
+
+
+# =============================================================================
+# compute_rqb / compute_rsvd autotuning
+# =============================================================================
+def test_autotune_rsvd(tmpdir, monkeypatch):
+    m, k = 200, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)
+
+    cache = AutotuneCache(os.path.join(str(tmpdir), 'autotune.json'))
+
+    # ------------------------------------------------------------------------
+    # tests first call tunes and is accurate
+    U, s, Vt = compute_rsvd(A, k, oversample=5, autotune=cache)
+    assert relative_error(A, U.dot(np.diag(s).dot(Vt))) < atol_float64
+    assert len(cache) == 1
+
+    # ------------------------------------------------------------------------
+    # tests later calls reuse the plan
+    def fail(*args, **kwargs):
+        raise AssertionError('candidate plans should not be benchmarked')
+    monkeypatch.setattr(autotune, 'candidate_plans', fail)
+
+    U, s, Vt = compute_rsvd(A, k, oversample=5, autotune=cache)
+    assert relative_error(A, U.dot(np.diag(s).dot(Vt))) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # tests the same shape class shares the plan
+    U, s, Vt = compute_rsvd(A[:190, :190], k, oversample=5, autotune=cache)
+    assert len(cache) == 1
+
+
+def test_autotune_rqb(tmpdir):
+    m, k = 200, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)
+
+    cache = AutotuneCache(os.path.join(str(tmpdir), 'autotune.json'))
+
+    Q, B = compute_rqb(A, k, oversample=5, autotune=cache)
+    assert relative_error(A, Q.dot(B)) < atol_float64
@@ -1,10 +1,13 @@
 from __future__ import division
 
 import numpy as np
+from numpy.testing import assert_raises
+from scipy import sparse
 
-from ristretto.cur import compute_cur, compute_rcur
+from ristretto import cur
+from ristretto.cur import compute_cur, compute_rcur, compute_sampling_cur
 
-from .utils import relative_error
+from .utils import relative_error, peak_memory
 
 atol_float32 = 1e-4
 atol_float64 = 1e-8
@@ -15,7 +18,8 @@ atol_float64 = 1e-8
 # =============================================================================
 def test_compute_cur():
     m, k = 100, 10
-    A = np.random.randn(m, k).astype(np.float64)
+    # seed 52: rank k+2 exceeds the numerical rank with noise level pivots
+    A = np.random.RandomState(52).randn(m, k).astype(np.float64)
     A = A.dot(A.T)[:, :50]
 
     # index_set = False
@@ -28,6 +32,11 @@ def test_compute_cur():
     A_cur = A[:, C].dot(U).dot(A[R])
     assert relative_error(A, A_cur) < atol_float32
 
+    # randomized pivoting
+    C, U, R = compute_cur(A, rank=k+2, qr_method='randomized', random_state=0)
+    A_cur = C.dot(U).dot(R)
+    assert relative_error(A, A_cur) < atol_float32
+
 
 # =============================================================================
 # compute_rcur function
@@ -46,3 +55,125 @@ def test_compute_rcur():
     C, U, R = compute_rcur(A, k+2, index_set=True)
     A_cur = A[:, C].dot(U).dot(A[R])
     assert relative_error(A, A_cur) < atol_float32
+
+
+def test_compute_rcur_core():
+    m, n, k = 100, 50, 10
+    A = np.random.randn(m, k).dot(np.random.randn(k, n))
+    A += 1e-6 * np.random.randn(m, n)
+
+    # ------------------------------------------------------------------------
+    # test least-squares core agrees with pinv and intersection core is close
+    C, U_lstsq, R = compute_rcur(A, k, core='lstsq', random_state=0)
+    _, U_pinv, _ = compute_rcur(A, k, core='pinv', random_state=0)
+    _, U_int, _ = compute_rcur(A, k, core='intersection', random_state=0)
+    assert np.allclose(U_lstsq, U_pinv)
+    assert relative_error(A, C.dot(U_lstsq).dot(R)) < 1e-5
+    assert relative_error(A, C.dot(U_int).dot(R)) < 1e-4
+
+    # ------------------------------------------------------------------------
+    # test complex input with the deterministic CUR
+    A = A + 1j * np.random.randn(m, k).dot(np.random.randn(k, n))
+    C, U, R = compute_cur(A, 2*k, core='lstsq')
+    assert relative_error(A, C.dot(U).dot(R)) < 1e-4
+
+    assert_raises(ValueError, compute_rcur, A, k, core='svd')
+
+
+def test_compute_rcur_single_sketch(monkeypatch):
+    m, k = 100, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)[:, :50]
+
+    calls = []
+    compute_rqb = cur.compute_rqb
+    def counting_rqb(*args, **kwargs):
+        calls.append(1)
+        return compute_rqb(*args, **kwargs)
+    monkeypatch.setattr(cur, 'compute_rqb', counting_rqb)
+
+    C, U, R = compute_rcur(A, k+2, random_state=0)
+    assert len(calls) == 1
+    assert relative_error(A, C.dot(U).dot(R)) < atol_float32
+
+
+def test_compute_cur_sparse():
+    m, n, k = 200, 100, 5
+    A = sparse.random(m, k, density=0.2, format='csr', random_state=1)
+    A = A.dot(sparse.random(k, n, density=0.2, format='csr', random_state=2))
+    A_dense = A.toarray()
+
+    # ------------------------------------------------------------------------
+    # test sparse factors for both CUR routines
+    for C, U, R in (compute_cur(A, k), compute_rcur(A, k, random_state=0)):
+        assert sparse.isspmatrix_csc(C) and sparse.isspmatrix_csr(R)
+        assert C.nnz <= A.nnz and R.nnz <= A.nnz
+        A_cur = C.toarray().dot(U).dot(R.toarray())
+        assert relative_error(A_dense, A_cur) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # test index_set and error estimate
+    J, U, I, err = compute_rcur(A.tocoo(), k, index_set=True, random_state=0,
+                                estimate_error=True)
+    A_cur = A_dense[:, J].dot(U).dot(A_dense[I])
+    assert relative_error(A_dense, A_cur) < atol_float64
+    assert err < 1e-6
+
+    # ------------------------------------------------------------------------
+    # test the skeletons are sliced before the format conversion
+    A = sparse.random(2000, 2000, density=1e-2, format='csr', random_state=0)
+    J = np.arange(k)
+    assert peak_memory(cur._column_skeleton, A, J) < 0.1 * A.data.nbytes
+    assert peak_memory(cur._compute_core, A, None, None, J, J,
+                       'intersection') < 0.1 * A.data.nbytes
+
+
+# =============================================================================
+# compute_sampling_cur function
+# =============================================================================
+def test_compute_sampling_cur():
+    m, n, k = 200, 100, 10
+    A = np.random.randn(m, k).dot(np.random.randn(k, n))
+
+    # ------------------------------------------------------------------------
+    # test all sampling modes recover a low rank matrix
+    for sampling in ('norm', 'leverage'):
+        for n_adaptive in (0, 1):
+            C, U, R = compute_sampling_cur(A, k, sampling=sampling,
+                                           n_adaptive=n_adaptive, random_state=0)
+            assert C.shape[1] == U.shape[0] == (n_adaptive + 1) * k + 10
+            assert relative_error(A, C.dot(U).dot(R)) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # test index_set and sparse input
+    J, U, I = compute_sampling_cur(A, k, index_set=True, random_state=0)
+    assert relative_error(A, A[:, J].dot(U).dot(A[I])) < atol_float64
+
+    A = sparse.random(m, k, density=0.2, format='csr', random_state=1)
+    A = A.dot(sparse.random(k, n, density=0.2, format='csr', random_state=2))
+    C, U, R = compute_sampling_cur(A, k, n_adaptive=1, random_state=0)
+    assert sparse.isspmatrix_csc(C) and sparse.isspmatrix_csr(R)
+    assert relative_error(A.toarray(), C.toarray().dot(U).dot(R.toarray())) < atol_float64
+
+
+    # ------------------------------------------------------------------------
+    # test a zero matrix gives empty skeletons
+    C, U, R = compute_sampling_cur(np.zeros((20, 10)), 3, random_state=0)
+    assert C.shape == (20, 0) and U.shape == (0, 0) and R.shape == (0, 10)
+
+    assert_raises(ValueError, compute_sampling_cur, A, k, sampling='uniform')
+
+
+def test_squared_norms(monkeypatch):
+    m, n = 50, 30
+    A = sparse.random(m, n, density=0.2, format='csr', random_state=0)
+    A = A + 1j * sparse.random(m, n, density=0.2, format='csr', random_state=1)
+
+    # ------------------------------------------------------------------------
+    # test dense input in several row blocks and all sparse formats
+    monkeypatch.setattr(cur, '_NORM_CHUNK', 7 * n)
+    for B in (A.toarray(), A.toarray().real, A, A.tocsc(), A.tocoo()):
+        B_sq = np.abs(B.toarray() if sparse.issparse(B) else B)**2
+        col_norms, row_norms = cur._squared_norms(B)
+        assert np.allclose(col_norms, B_sq.sum(axis=0))
+        assert np.allclose(row_norms, B_sq.sum(axis=1))
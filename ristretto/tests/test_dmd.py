@@ -1,7 +1,10 @@
 import numpy as np
 
+from numpy.testing import assert_raises
+
 from ristretto.dmd import \
-    (DMD, RDMD, compute_dmd, compute_rdmd, get_amplitudes, get_vandermonde)
+    (DMD, RDMD, OnlineDMD, compute_dmd, compute_rdmd, compute_rdmd_windows,
+     get_amplitudes, get_vandermonde, iter_dmd_predictions, predict_dmd)
 
 atol_float32 = 1e-4
 atol_float64 = 1e-8
@@ -55,6 +58,104 @@ def test_compute_rdmd():
     assert np.allclose(A, A_tilde(A, Fmodes, l), atol_float64)
 
 
+# =============================================================================
+# compute_rdmd_windows function
+def test_compute_rdmd_windows():
+    m, n, window, stride, k = 100, 300, 100, 20, 4
+    t = np.arange(n) * 0.1
+    T = np.array([np.cos(2 * t), np.sin(2 * t),
+                  np.exp(-0.1 * t) * np.cos(5 * t),
+                  np.exp(-0.1 * t) * np.sin(5 * t)])
+    A = np.random.randn(m, 4).dot(T)
+
+    # ------------------------------------------------------------------------
+    # tests eigenvalues agree with compute_dmd on each window
+    starts = range(0, n - window + 1, stride)
+    results = list(compute_rdmd_windows(A, window, stride, k, dt=0.1,
+                                        refresh=3, random_state=0))
+    assert len(results) == len(starts)
+    for start, (F, l, omega) in zip(starts, results):
+        _, l_true, _ = compute_dmd(A[:, start:start + window], rank=k, dt=0.1)
+        assert F.shape == (m, k)
+        assert np.allclose(np.sort_complex(l), np.sort_complex(l_true))
+
+    # ------------------------------------------------------------------------
+    # tests updates agree with the parallel windows computed from scratch
+    parallel = compute_rdmd_windows(A, window, stride, k, dt=0.1, n_jobs=2,
+                                    random_state=0)
+    for (F, l, omega), (F_par, l_par, omega_par) in zip(results, parallel):
+        assert np.allclose(l, l_par)
+        assert np.allclose(np.abs(F), np.abs(F_par))
+
+    # ------------------------------------------------------------------------
+    # tests modes with singular values below sqrt(eps) times the largest one
+    scale = np.array([[1], [1], [1e-9], [1e-9]])
+    A_ill = np.random.RandomState(0).randn(m, 4).dot(scale * T)
+    results = compute_rdmd_windows(A_ill, window, stride, k, dt=0.1,
+                                   random_state=0)
+    for start, (F, l, omega) in zip(starts, results):
+        _, l_true, _ = compute_dmd(A_ill[:, start:start + window], rank=k,
+                                   dt=0.1)
+        assert np.allclose(np.sort_complex(l), np.sort_complex(l_true))
+
+    # ------------------------------------------------------------------------
+    # tests the windows of a non-stationary series, with modes changing every
+    # 150 snapshots and total rank 16 > rank + oversample
+    rng = np.random.RandomState(0)
+    A = np.concatenate([rng.randn(m, 4).dot(T[:, :150]) for _ in range(4)],
+                       axis=1)
+    starts = range(0, 600 - window + 1, stride)
+    results = compute_rdmd_windows(A, window, stride, k, dt=0.1, oversample=4,
+                                   refresh=None, random_state=0)
+    for start, (F, l, omega) in zip(starts, results):
+        # the modes lie in the range of the window
+        P = np.linalg.svd(A[:, start:start + window], full_matrices=False)[0]
+        residual = F - P[:, :8].dot(P[:, :8].T.dot(F))
+        assert np.linalg.norm(residual) < atol_float64 * np.linalg.norm(F)
+
+        _, l_true, _ = compute_dmd(A[:, start:start + window], rank=k, dt=0.1)
+        assert np.allclose(np.sort_complex(l), np.sort_complex(l_true))
+
+    # ------------------------------------------------------------------------
+    # tests raises invalid parameters
+    assert_raises(ValueError, next, compute_rdmd_windows(A, 1, stride, k))
+    assert_raises(ValueError, next, compute_rdmd_windows(A, window, 0, k))
+    assert_raises(ValueError, next, compute_rdmd_windows(A, window, stride,
+                                                         window))
+
+
+# =============================================================================
+# predict_dmd function
+def test_predict_dmd(tmpdir):
+    A = get_A()
+    F, l, omega = compute_dmd(A, rank=2, dt=0.5)
+    b = get_amplitudes(A, F)
+    t = 0.5 * np.arange(A.shape[1])
+
+    # ------------------------------------------------------------------------
+    # tests reconstruction agrees with the Vandermonde matrix
+    X = predict_dmd(F, b, omega, t, chunk_size=7)
+    assert np.allclose(X, F.dot(np.diag(b).dot(get_vandermonde(A, l))))
+    assert np.allclose(X, A)
+
+    chunks = list(iter_dmd_predictions(F, b, omega, t, chunk_size=7))
+    assert len(chunks) == 9
+    assert np.allclose(np.concatenate(chunks, axis=1), X)
+
+    # ------------------------------------------------------------------------
+    # tests forecast into a real memmap
+    t = 0.5 * np.arange(1000)
+    out = np.lib.format.open_memmap(str(tmpdir.join('X.npy')), mode='w+',
+                                    dtype=np.float64, shape=(A.shape[0], 1000))
+    predict_dmd(F, b, omega, t, chunk_size=64, out=out)
+    assert np.allclose(out[:, ::50], predict_dmd(F, b, omega, t[::50]).real)
+
+    # ------------------------------------------------------------------------
+    # tests raises invalid parameters
+    assert_raises(ValueError, predict_dmd, F, b, omega, t, out=out[:, :10])
+    assert_raises(ValueError, predict_dmd, F, b, omega, t, chunk_size=0)
+
+
 # =============================================================================
 # DMD class
 def test_DMD():
@@ -66,6 +167,7 @@ def test_DMD():
     assert np.allclose(A, A_tilde(dmd.X_, dmd.F_, dmd.l_), atol_float64)
     assert np.allclose(dmd.amplitudes_, get_amplitudes(dmd.X_, dmd.F_))
     assert np.allclose(dmd.vandermonde_, get_vandermonde(dmd.X_, dmd.l_))
+    assert np.allclose(dmd.predict(np.arange(A.shape[1])), A)
 
 
 # =============================================================================
@@ -77,3 +179,56 @@ def test_RDMD():
     rdmd.fit(A)
 
     assert np.allclose(A, A_tilde(rdmd.X_, rdmd.F_, rdmd.l_), atol_float64)
+
+
+# =============================================================================
+# OnlineDMD class
+def test_OnlineDMD():
+    A = get_A()
+    _, l, _ = compute_dmd(A, rank=2)
+
+    # ------------------------------------------------------------------------
+    # tests snapshot by snapshot and batch updates agree with compute_dmd
+    odmd = OnlineDMD(rank=2)
+    for j in range(A.shape[1]):
+        odmd.partial_fit(A[:, j])
+    assert np.allclose(odmd.l_, l)
+    assert odmd.n_snapshots_ == A.shape[1]
+
+    odmd = OnlineDMD(rank=2).fit(A[:, :20]).partial_fit(A[:, 20:])
+    assert np.allclose(odmd.l_, l)
+    assert odmd.F_.shape == (A.shape[0], 2)
+
+    # ------------------------------------------------------------------------
+    # tests one step prediction, the history is not stored
+    assert np.allclose(odmd.predict_next(A[:, :-1]), A[:, 1:])
+    assert np.allclose(odmd.predict_next(), odmd.predict_next(A[:, -1]))
+    assert odmd.x_last_.shape == (A.shape[0],)
+
+    # ------------------------------------------------------------------------
+    # tests forgetting tracks a change of the dynamics
+    U = np.linalg.qr(np.random.randn(50, 2))[0]
+    z, snapshots = np.array([1., 0.]), []
+    for t in range(400):
+        theta = 0.1 if t < 200 else 0.3
+        snapshots.append(U.dot(z))
+        z = np.array([[np.cos(theta), -np.sin(theta)],
+                      [np.sin(theta), np.cos(theta)]]).dot(z)
+    X = np.array(snapshots).T
+
+    odmd = OnlineDMD(rank=2, forgetting=0.9)
+    for j in range(0, 400, 7):
+        odmd.partial_fit(X[:, j:j+7])
+    assert np.allclose(np.sort(np.angle(odmd.l_)), [-0.3, 0.3])
+
+    # ------------------------------------------------------------------------
+    # tests the basis tracks a change of the mode subspace
+    V = np.linalg.qr(np.random.RandomState(0).randn(50, 2))[0]
+    X[:, 200:] = V.dot(U.T.dot(X[:, 200:]))
+
+    odmd = OnlineDMD(rank=2, forgetting=0.9)
+    for j in range(0, 399, 7):
+        odmd.partial_fit(X[:, j:min(j+7, 399)])
+    assert np.allclose(np.sort(np.angle(odmd.l_)), [-0.3, 0.3])
+    assert np.allclose(odmd.predict_next(), X[:, 399])
+    assert np.allclose(odmd.predict_next(X[:, 300:398]), X[:, 301:399])
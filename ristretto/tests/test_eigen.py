@@ -1,12 +1,19 @@
 from __future__ import division
+import warnings
 
 import numpy as np
+from numpy.testing import assert_raises
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, aslinearoperator
 
+from ristretto import eigen
 from ristretto.eigen import compute_reigh
 from ristretto.eigen import compute_reigh_nystroem
 from ristretto.eigen import compute_reigh_nystroem_col
+from ristretto.eigen import compute_reigh_nystroem_kernel
+from ristretto.eigen import compute_rpcholesky
 
-from .utils import relative_error
+from .utils import relative_error, peak_memory
 
 atol_float32 = 1e-4
 atol_float64 = 1e-8
@@ -38,6 +45,122 @@ def test_compute_reigh_complex128():
     assert relative_error(A, Ak) < atol_float64
 
 
+def test_compute_reigh_pass_efficient():
+    m, k = 100, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)
+
+    # ------------------------------------------------------------------------
+    # tests full, triangular and packed input
+    lower = np.tril(A)
+    packed = np.concatenate([A[j:, j] for j in range(m)])
+    for A_in, tri in ((A, None), (lower, True), (lower.T, False), (packed, True)):
+        for func in (compute_reigh, compute_reigh_nystroem):
+            w, v = func(A_in, k, oversample=5, pass_efficient=True, lower=tri,
+                        random_state=0)
+            assert relative_error(A, (v * w).dot(v.T)) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # tests complex Hermitian triangle
+    A = np.random.randn(m, k) + 1j * np.random.randn(m, k)
+    A = A.dot(A.conj().T)
+    w, v = compute_reigh(np.triu(A), k, lower=False, random_state=0)
+    assert relative_error(A, (v * w).dot(v.conj().T)) < atol_float64
+
+
+def test_compute_reigh_chebyshev():
+    m, k = 300, 10
+    U = np.linalg.qr(np.random.RandomState(0).randn(m, m))[0]
+    w_true = np.r_[np.linspace(2, 1.5, k), np.linspace(1, -1, m - k)]
+    A = (U * w_true).dot(U.T)
+
+    # ------------------------------------------------------------------------
+    # tests dense, sparse and matrix-free input
+    for A_in in (A, sparse.csr_matrix(A), aslinearoperator(A)):
+        w, v = compute_reigh(A_in, k, filter='chebyshev', degree=8,
+                             random_state=0)
+        assert np.allclose(w, w_true[:k])
+        assert relative_error(U[:, :k].dot(U[:, :k].T), v.dot(v.T)) < 1e-3
+
+    w, v = compute_reigh_nystroem(A.dot(A), k, filter='chebyshev',
+                                  random_state=0)
+    assert np.allclose(w, w_true[:k]**2)
+
+
+def test_compute_reigh_chebyshev_bounds(monkeypatch):
+    m, k = 300, 10
+    U = np.linalg.qr(np.random.RandomState(0).randn(m, m))[0]
+    w_true = np.r_[np.linspace(2, 1.5, k), np.linspace(1, -1, m - 2 * k),
+                   np.linspace(-4, -5, k)]
+    A = (U * w_true).dot(U.T)
+
+    # ------------------------------------------------------------------------
+    # tests eigenvalues below a wrong lower bound of the spectrum are damped
+    lanczos_bounds = eigen._lanczos_bounds
+    monkeypatch.setattr(eigen, '_lanczos_bounds',
+                        lambda *args: (-1, lanczos_bounds(*args)[1]))
+    w, v = compute_reigh(A, k, filter='chebyshev', degree=8, random_state=0)
+    assert np.allclose(w, w_true[:k], atol=1e-3)
+    assert relative_error(U[:, :k].dot(U[:, :k].T), v.dot(v.T)) < 5e-2
+
+
+def test_compute_reigh_shift():
+    m, k = 300, 10
+    U = np.linalg.qr(np.random.randn(m, m))[0]
+    w_true = 1 / np.sqrt(np.arange(1, m + 1))
+    A = (U * w_true).dot(U.T)
+
+    # ------------------------------------------------------------------------
+    # tests shifts improve the eigenvalues of a slowly decaying spectrum
+    w, _ = compute_reigh(A, k, n_subspace=4, random_state=0)
+    w_shift, _ = compute_reigh(A, k, n_subspace=4, filter='shift',
+                               random_state=0)
+    assert np.abs(w_shift - w_true[:k]).max() < np.abs(w - w_true[:k]).max()
+
+    # ------------------------------------------------------------------------
+    # tests tolerance based stopping of all iterations
+    for filter in (None, 'chebyshev', 'shift'):
+        w, _ = compute_reigh(A, k, n_subspace=50, filter=filter, tol=1e-4,
+                             random_state=0)
+        assert np.allclose(w, w_true[:k], rtol=1e-2)
+
+    w, _ = compute_reigh_nystroem(A, k, n_subspace=50, filter='shift',
+                                  tol=1e-4, random_state=0)
+    assert np.allclose(w, w_true[:k], rtol=1e-2)
+
+
+def test_compute_reigh_init_basis():
+    m, k = 300, 10
+    U = np.linalg.qr(np.random.randn(m, m))[0]
+    w_true = 1 / np.sqrt(np.arange(1, m + 1))
+    A = (U * w_true).dot(U.T)
+
+    # ------------------------------------------------------------------------
+    # tests warm start from the exact eigenspace
+    for func in (compute_reigh, compute_reigh_nystroem):
+        w, v = func(A, k, n_subspace=0, init_basis=U[:, :k], random_state=0)
+        assert np.allclose(w, w_true[:k])
+        assert relative_error(U[:, :k].dot(U[:, :k].T), v.dot(v.T)) < 1e-8
+
+    # ------------------------------------------------------------------------
+    # tests the returned basis warm starts the next decomposition
+    for func in (compute_reigh, compute_reigh_nystroem):
+        w, v, basis = func(A, k, n_subspace=2, return_basis=True,
+                           random_state=0)
+        assert basis.shape == (m, k + 10)
+        assert np.allclose(basis[:, :k], v)
+        assert np.allclose(basis.T.dot(basis), np.eye(k + 10))
+
+        A_next = A + 1e-6 * np.eye(m)
+        w, v = func(A_next, k, n_subspace=20, tol=1e-10, init_basis=basis,
+                    random_state=1)
+        assert np.allclose(w, w_true[:k] + 1e-6, rtol=1e-3)
+
+    # ------------------------------------------------------------------------
+    # tests invalid shape raises
+    assert_raises(ValueError, compute_reigh, A, k, init_basis=U[:k])
+
+
 # =============================================================================
 # reig_nystroem function
 # =============================================================================
@@ -64,6 +187,35 @@ def test_reig_nystroem_complex128():
     assert relative_error(A, Ak) < atol_float64
 
 
+def test_reig_nystroem_rank_deficient():
+    m, k = 200, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)
+
+    # the shifted Cholesky succeeds although the core is singular
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        w, v = compute_reigh_nystroem(A, k, oversample=10, n_subspace=0,
+                                      pass_efficient=True, random_state=0)
+        assert relative_error(A, (v * w).dot(v.T)) < atol_float64
+        assert np.all(w >= 0)
+
+        w, v = compute_reigh_nystroem_col(A, k, oversample=20, random_state=0)
+        assert relative_error(A, (v * w).dot(v.T)) < atol_float64
+
+    # the single-pass method applies A exactly once
+    products = []
+    def matmat(X):
+        products.append(X.shape[1])
+        return A.dot(X)
+
+    A_op = LinearOperator(A.shape, matvec=A.dot, matmat=matmat, dtype=A.dtype)
+    w, v = compute_reigh_nystroem(A_op, k, oversample=10, n_subspace=0,
+                                  pass_efficient=True, random_state=0)
+    assert products == [k + 10]
+    assert relative_error(A, (v * w).dot(v.T)) < atol_float64
+
+
 # =============================================================================
 # reig_nystroem_col function
 # =============================================================================
@@ -88,3 +240,90 @@ def test_reig_nystroem_col_complex128():
     Ak = (v * w).dot(v.conj().T)
 
     assert relative_error(A, Ak) < atol_float64
+
+
+
+def test_reig_nystroem_col_rpcholesky():
+    m, k = 200, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)
+
+    for block_size in (1, 4):
+        w, v = compute_reigh_nystroem_col(A, k, sampling='rpcholesky',
+                                          block_size=block_size, random_state=0)
+        assert relative_error(A, (v * w).dot(v.T)) < atol_float64
+
+
+# =============================================================================
+# rpcholesky function
+# =============================================================================
+def test_rpcholesky():
+    m, k = 200, 10
+    A = np.random.randn(m, k) + 1j * np.random.randn(m, k)
+    A = A.dot(A.conj().T)
+
+    # ------------------------------------------------------------------------
+    # tests the tolerance stops at the rank of A
+    F, idx = compute_rpcholesky(A, 2*k, tol=1e-10, random_state=0)
+    assert F.shape == (m, k) and idx.size == k
+    assert relative_error(A, F.dot(F.conj().T)) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # tests the block variant, the pivot columns are interpolated exactly
+    F, idx = compute_rpcholesky(A, 6, block_size=3, random_state=0)
+    assert F.shape == (m, 6)
+    assert np.allclose(F.dot(F[idx].conj().T), A[:, idx])
+
+
+# =============================================================================
+# reigh_nystroem_kernel function
+# =============================================================================
+def test_reigh_nystroem_kernel():
+    n, p = 200, 3
+    X = np.random.randn(n, p)
+    kernel = lambda X, Y, c=1: (X.dot(Y.T) + c)**2
+    K = kernel(X, X)
+
+    # ------------------------------------------------------------------------
+    # tests a rank 10 polynomial kernel is recovered, with chunks
+    w, v = compute_reigh_nystroem_kernel(X, kernel, 10, chunk_size=64,
+                                         random_state=0)
+    assert relative_error(K, (v * w).dot(v.T)) < atol_float64
+
+    F = compute_reigh_nystroem_kernel(X, kernel, 10, kernel_params={'c': 1},
+                                      return_features=True, random_state=0)
+    assert relative_error(K, F.dot(F.T)) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # tests named sklearn kernel in parallel chunks
+    w, v = compute_reigh_nystroem_kernel(X, 'rbf', 20, oversample=40,
+                                         kernel_params={'gamma': 0.1},
+                                         chunk_size=100, n_jobs=2, random_state=0)
+    K = np.exp(-0.1 * ((X[:, None] - X[None])**2).sum(-1))
+    assert relative_error(K, (v * w).dot(v.T)) < 1e-2
+
+    w, v = compute_reigh_nystroem_kernel(X, 'rbf', 20, oversample=40,
+                                         kernel_params={'gamma': 0.1},
+                                         sampling='rpcholesky', block_size=5,
+                                         random_state=0)
+    assert relative_error(K, (v * w).dot(v.T)) < 1e-2
+
+    # ------------------------------------------------------------------------
+    # tests the diagonal evaluates the kernel once per data point
+    shapes = []
+    def counted(X, Y):
+        shapes.append(X.shape[0] * Y.shape[0])
+        return kernel(X, Y)
+
+    diag = eigen._kernel_diagonal(X, counted, counted)
+    assert np.allclose(diag, np.diag(kernel(X, X))) and sum(shapes) == n
+    assert np.array_equal(eigen._kernel_diagonal(X, 'rbf', None), np.ones(n))
+
+
+def test_compute_reigh_memory():
+    m, k = 2000, 5
+    A = np.random.randn(m, m).astype(np.float64)
+    A = A + A.T
+
+    # no temporaries of the size of A
+    assert peak_memory(compute_reigh, A, k, oversample=5) < 0.1 * A.nbytes
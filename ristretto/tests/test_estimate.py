@@ -0,0 +1,151 @@
+from __future__ import division
+
+import numpy as np
+from numpy.testing import assert_raises
+from scipy import linalg
+from scipy import sparse
+from scipy.sparse.linalg import aslinearoperator
+
+from ristretto.cur import compute_rcur
+from ristretto.estimate import estimate_residual_norm
+from ristretto.estimate import estimate_spectral_sum
+from ristretto.estimate import estimate_trace
+from ristretto.interp_decomp import compute_rinterp_decomp
+from ristretto.qb import compute_rqb
+from ristretto.svd import compute_rsvd
+
+
+def get_A(m=200, n=100, k=10):
+    U = linalg.qr(np.random.randn(m, n), mode='economic')[0]
+    V = linalg.qr(np.random.randn(n, n), mode='economic')[0]
+    s = np.exp(-np.arange(n) / k)
+    return (U * s).dot(V.T)
+
+
+# =============================================================================
+# estimate_residual_norm function
+# =============================================================================
+def test_estimate_residual_norm():
+    A = get_A()
+    Q, B = compute_rqb(A, 10, oversample=0, n_subspace=0, random_state=0)
+    E = A - Q.dot(B)
+
+    # ------------------------------------------------------------------------
+    # tests spectral norm bound holds and is not too loose
+    err = estimate_residual_norm(A, Q, B, norm='spectral', random_state=1)
+    assert linalg.norm(E, 2) <= err < 10 * linalg.norm(E, 2)
+
+    # ------------------------------------------------------------------------
+    # tests frobenius norm bound holds and is not too loose
+    err = estimate_residual_norm(A, Q, B, norm='fro', random_state=1)
+    assert linalg.norm(E, 'fro') <= err < 10 * linalg.norm(E, 'fro')
+
+    # ------------------------------------------------------------------------
+    # tests higher confidence leads to larger bounds
+    low = estimate_residual_norm(A, Q, B, confidence=0.5, random_state=1)
+    high = estimate_residual_norm(A, Q, B, confidence=0.999, random_state=1)
+    assert low < high
+
+    # ------------------------------------------------------------------------
+    # tests raises invalid parameters
+    assert_raises(ValueError, estimate_residual_norm, A, Q, B, norm='nuc')
+    assert_raises(ValueError, estimate_residual_norm, A, Q, B, confidence=1)
+    assert_raises(ValueError, estimate_residual_norm, A, Q, B, n_probes=0)
+
+
+# =============================================================================
+# estimate_trace function
+# =============================================================================
+def test_estimate_trace():
+    n = 300
+    U = linalg.qr(np.random.randn(n, n))[0]
+    w = np.exp(-np.arange(n) / 10.) + 1e-3
+    A = (U * w).dot(U.T)
+
+    # ------------------------------------------------------------------------
+    # tests hutch++ and hutchinson for dense, sparse and LinearOperator input
+    for method in ('hutch++', 'hutchinson'):
+        for B in (A, sparse.csr_matrix(A), aslinearoperator(A)):
+            trace, (low, high) = estimate_trace(B, 90, method=method,
+                                                random_state=0)
+            assert low <= trace <= high
+            assert abs(trace - w.sum()) < 0.1 * w.sum()
+
+    # ------------------------------------------------------------------------
+    # tests hutch++ is exact when the range finder captures A
+    A_low = (U[:, :10] * w[:10]).dot(U[:, :10].T)
+    trace, (low, high) = estimate_trace(A_low, 30, random_state=0)
+    assert np.allclose(trace, w[:10].sum())
+    assert np.allclose((low, high), trace)
+
+    # ------------------------------------------------------------------------
+    # tests raises invalid parameters
+    assert_raises(ValueError, estimate_trace, A, method='exact')
+    assert_raises(ValueError, estimate_trace, A, n_matvecs=2)
+    assert_raises(ValueError, estimate_trace, A, confidence=0)
+
+
+# =============================================================================
+# estimate_spectral_sum function
+# =============================================================================
+def test_estimate_spectral_sum():
+    n = 300
+    U = linalg.qr(np.random.randn(n, n))[0]
+    w = np.linspace(0.5, 10, n)
+    A = (U * w).dot(U.T)
+
+    # ------------------------------------------------------------------------
+    # tests log-determinant for dense, sparse and LinearOperator input
+    logdet = np.log(w).sum()
+    for B in (A, sparse.csr_matrix(A), aslinearoperator(A)):
+        est, (low, high) = estimate_spectral_sum(B, random_state=0)
+        assert low <= est <= high
+        assert abs(est - logdet) < 0.05 * abs(logdet)
+
+    # ------------------------------------------------------------------------
+    # tests f = x is the trace, exact for n_steps >= 2
+    est, _ = estimate_spectral_sum(np.diag(w), f=lambda x: x, n_steps=2,
+                                   random_state=0)
+    assert np.allclose(est, w.sum())
+
+    # ------------------------------------------------------------------------
+    # tests Lanczos breakdown of a matrix with few distinct eigenvalues
+    D = sparse.diags(np.repeat([1., 2., 4.], 100))
+    est, _ = estimate_spectral_sum(D, n_steps=10, random_state=0)
+    assert np.allclose(est, 100 * np.log(8.))
+
+    # ------------------------------------------------------------------------
+    # tests raises invalid parameters
+    assert_raises(ValueError, estimate_spectral_sum, A, f='log')
+    assert_raises(ValueError, estimate_spectral_sum, A, n_probes=0)
+    assert_raises(ValueError, estimate_spectral_sum, A, n_steps=0)
+
+
+def test_estimate_error():
+    A = get_A()
+    k = 10
+
+    # ------------------------------------------------------------------------
+    # tests compute_rqb
+    Q, B, err = compute_rqb(A, k, estimate_error=True, random_state=0)
+    assert linalg.norm(A - Q.dot(B), 2) <= err
+
+    # ------------------------------------------------------------------------
+    # tests compute_rsvd
+    U, s, Vt, err = compute_rsvd(A, k, estimate_error='fro', random_state=0)
+    assert linalg.norm(A - (U * s).dot(Vt), 'fro') <= err
+
+    # ------------------------------------------------------------------------
+    # tests compute_rinterp_decomp
+    Z, R, err = compute_rinterp_decomp(A, k, mode='row', estimate_error=True,
+                                       random_state=0)
+    assert linalg.norm(A - Z.dot(R), 2) <= err
+
+    # ------------------------------------------------------------------------
+    # tests compute_rcur
+    C, U, R, err = compute_rcur(A, k, estimate_error=True, random_state=0)
+    assert linalg.norm(A - C.dot(U).dot(R), 2) <= err
+
+    # ------------------------------------------------------------------------
+    # tests raises invalid norm
+    assert_raises(ValueError, compute_rqb, A, k, estimate_error='nuc')
@@ -2,11 +2,13 @@ from __future__ import division
 
 import numpy as np
 from scipy import linalg
+from numpy.testing import assert_raises
 
+from ristretto.interp_decomp import InterpolationMatrix
 from ristretto.interp_decomp import compute_interp_decomp
 from ristretto.interp_decomp import compute_rinterp_decomp
 
-from .utils import relative_error
+from .utils import relative_error, peak_memory
 
 atol_float32 = 1e-4
 atol_float64 = 1e-8
@@ -86,3 +88,130 @@ def test_rid_row():
     Z, R = compute_rinterp_decomp(A, k+2, mode='row', index_set=True)
     A_id = Z.dot(A[R, :])
     assert relative_error(A, A_id) < atol_float32
+
+
+
+def test_id_memory():
+    m, n, k = 10000, 100, 5
+    A = np.random.randn(m, n).astype(np.float64)
+
+    # only the working copy of A for the pivoted QR is allocated
+    assert peak_memory(compute_interp_decomp, A, k) < 1.2 * A.nbytes
+
+    # V is returned as ndarray
+    C, V = compute_interp_decomp(A, k)
+    assert type(V) is np.ndarray
+
+
+def test_id_tol():
+    m, n, k = 100, 50, 8
+    A = np.random.randn(m, k).dot(np.random.randn(k, n))
+
+    # ------------------------------------------------------------------------
+    # test the factorization stops at the numerical rank
+    C, V = compute_interp_decomp(A, rank=20, tol=1e-10)
+    assert C.shape == (m, k) and V.shape == (k, n)
+    assert relative_error(A, C.dot(V)) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # test complex input
+    A = A + 1j * np.random.randn(m, k).dot(np.random.randn(k, n))
+    C, V = compute_interp_decomp(A, rank=2*k)
+    assert relative_error(A, C.dot(V)) < atol_float64
+
+
+def test_id_randomized_qr():
+    m, n, k = 100, 50, 8
+    A = np.random.randn(m, k).dot(np.random.randn(k, n))
+
+    # ------------------------------------------------------------------------
+    # test column and row ID with randomized pivoting
+    C, V = compute_interp_decomp(A, rank=k, qr_method='randomized',
+                                 random_state=0)
+    assert relative_error(A, C.dot(V)) < atol_float64
+
+    Z, R = compute_interp_decomp(A, rank=k, mode='row', qr_method='randomized',
+                                 random_state=0)
+    assert relative_error(A, Z.dot(R)) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # test the factorization stops at the numerical rank
+    C, V = compute_interp_decomp(A, rank=20, tol=1e-10, qr_method='randomized',
+                                 random_state=0)
+    assert C.shape == (m, k) and V.shape == (k, n)
+
+
+def test_partial_pivoted_qr(monkeypatch):
+    from ristretto import interp_decomp
+    k = 10
+    for m, n in [(30, 400), (400, 300)]:
+        A = np.random.RandomState(0).randn(m, n)
+        R_full, perm_full = linalg.qr(A, mode='r', pivoting=True)
+
+        # --------------------------------------------------------------------
+        # test both the geqp3 and the Householder paths agree with LAPACK
+        for factor in (n, 0):
+            monkeypatch.setattr(interp_decomp, '_GEQP3_FACTOR', factor)
+            R, perm = interp_decomp._partial_pivoted_qr(A, k)
+            assert R.shape == (k, n)
+            np.testing.assert_array_equal(perm[:k], perm_full[:k])
+            np.testing.assert_allclose(np.abs(R[:, :k]),
+                                       np.abs(R_full[:k, :k]), atol=1e-8)
+
+            # tol never gives a rank 0 factorization
+            for B, tol in ((A, 2), (np.zeros((m, n)), 1e-10)):
+                R, perm = interp_decomp._partial_pivoted_qr(B, k, tol=tol)
+                assert R.shape == (1, n)
+
+
+# =============================================================================
+# InterpolationMatrix class
+# =============================================================================
+def test_interpolation_matrix(tmpdir, monkeypatch):
+    m, n, k = 100, 50, 8
+    A = np.random.randn(m, k).dot(np.random.randn(k, n))
+    A = A + 1j * np.random.randn(m, k).dot(np.random.randn(k, n))
+    X = np.random.randn(n, 3)
+
+    # ------------------------------------------------------------------------
+    # test compact column ID agrees with the dense one
+    J, V = compute_interp_decomp(A, rank=k, index_set=True)
+    J_c, V_c = compute_interp_decomp(A, rank=k, index_set=True, compact=True)
+    assert isinstance(V_c, InterpolationMatrix)
+    assert V_c.shape == V.shape
+    assert np.array_equal(J_c, V_c.indices)
+    assert np.allclose(V_c.toarray(), V)
+    assert np.allclose(V_c.dot(X), V.dot(X))
+    assert np.allclose(V_c.rdot(A[:, J]), A[:, J].dot(V))
+    assert np.allclose(V_c.dot(X[:, 0]), V.dot(X[:, 0]))
+
+    # ------------------------------------------------------------------------
+    # test compact row ID agrees with the dense one
+    Z, I = compute_interp_decomp(A, rank=k, mode='row', index_set=True)
+    Z_c, I_c = compute_interp_decomp(A, rank=k, mode='row', index_set=True,
+                                     compact=True)
+    assert Z_c.shape == Z.shape == (m, k)
+    assert np.allclose(np.asarray(Z_c), Z)
+    assert np.allclose(Z_c.dot(A[I]), Z.dot(A[I]))
+    assert np.allclose(Z_c.rdot(A.T), A.T.dot(Z))
+    assert np.allclose(Z_c.H.toarray(), Z.conj().T)
+
+    # ------------------------------------------------------------------------
+    # test ndarray @ V uses the compact product, only ndarray.dot densifies
+    def toarray(self):
+        raise RuntimeError('dense interpolation matrix formed')
+
+    V_d, Z_d = V, Z
+    monkeypatch.setattr(InterpolationMatrix, 'toarray', toarray)
+    assert np.allclose(A[:, J] @ V_c, A[:, J].dot(V_d))
+    assert np.allclose(A.T @ Z_c, A.T.dot(Z_d))
+    assert_raises(RuntimeError, A[:, J].dot, V_c)
+    monkeypatch.undo()
+
+    # ------------------------------------------------------------------------
+    # test serialization
+    path = str(tmpdir.join('V.npz'))
+    V_c.save(path)
+    V_l = InterpolationMatrix.load(path)
+    assert np.array_equal(V_l.toarray(), V_c.toarray())
+    assert not V_l.adjoint
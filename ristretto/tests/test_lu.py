@@ -1,8 +1,11 @@
 import numpy as np
+from numpy.testing import assert_raises
+from scipy import sparse
+from scipy.sparse import linalg as spla
 
-from ristretto.lu import compute_rlu
+from ristretto.lu import RLU, compute_rlu
 
-from .utils import relative_error
+from .utils import relative_error, peak_memory
 
 atol_float32 = 1e-4
 atol_float64 = 1e-8
@@ -19,7 +22,7 @@ def test_compute_rlu_float64():
     # ------------------------------------------------------------------------
     # test wth permute == False
     P, L, U, Q = compute_rlu(A, k, oversample=5, n_subspace=2, permute=False)
-    Ak = P.dot(L.dot(U)).dot(Q)
+    Ak = L.dot(U)[P][:, Q]
 
     assert relative_error(A, Ak) < atol_float64
 
@@ -40,7 +43,7 @@ def test_compute_rlu_complex128():
     # ------------------------------------------------------------------------
     # test wth permute == False
     P, L, U, Q = compute_rlu(A, k, oversample=5, n_subspace=2, permute=False)
-    Ak = P.dot(L.dot(U)).dot(Q)
+    Ak = L.dot(U)[P][:, Q]
 
     assert relative_error(A, Ak) < atol_float64
 
@@ -50,3 +53,106 @@ def test_compute_rlu_complex128():
     Ak = L.dot(U)
 
     assert relative_error(A, Ak) < atol_float64
+
+
+def test_compute_rlu_memory():
+    m, n, k = 10000, 100, 5
+    A = np.random.randn(m, n).astype(np.float64)
+
+    # no dense permutation matrices or copies of A
+    assert peak_memory(compute_rlu, A, k, oversample=5) < A.nbytes
+
+    P, L, U, Q = compute_rlu(A, k, oversample=5)
+    assert P.shape == (m,) and Q.shape == (n,)
+
+
+def test_compute_rlu_sparse():
+    m, n, k = 200, 100, 10
+    A = sparse.random(m, k, density=0.3, format='csr', random_state=1).dot(
+        sparse.random(k, n, density=0.3, format='csr', random_state=2))
+
+    for fmt in ('csr', 'csc'):
+        for solver in ('triangular', 'lstsq'):
+            P, L, U, Q = compute_rlu(A.asformat(fmt), k, oversample=5,
+                                     sparse=True, solver=solver, random_state=0)
+            Ak = L.dot(U)[P][:, Q]
+
+            assert relative_error(A.toarray(), Ak) < atol_float64
+
+
+def test_compute_rlu_lstsq():
+    m, k = 100, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)[:, :50]
+
+    L, U = compute_rlu(A, k, oversample=5, permute=True, solver='lstsq')
+    assert relative_error(A, L.dot(U)) < atol_float64
+
+    assert_raises(ValueError, compute_rlu, A, k, solver='svd')
+
+
+# =============================================================================
+# RLU class
+# =============================================================================
+def test_RLU():
+    m, k = 100, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)
+
+    rlu = RLU(k, oversample=5).fit(A)
+    X = np.random.randn(m, 3)
+
+    # ------------------------------------------------------------------------
+    # test matvec and rmatvec for vectors and blocks
+    assert np.allclose(rlu.matvec(X), A.dot(X))
+    assert np.allclose(rlu.matvec(X[:, 0]), A.dot(X[:, 0]))
+    assert np.allclose(rlu.rmatvec(X), A.T.dot(X))
+    assert np.allclose(rlu.aslinearoperator().dot(X), A.dot(X))
+
+    # ------------------------------------------------------------------------
+    # test least-squares solve of A x = b with b in the range of A
+    b = A.dot(X)
+    assert relative_error(b, A.dot(rlu.solve(b))) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # test shifted solve via Woodbury
+    x = rlu.solve(X, shift=2.)
+    assert relative_error(X, 2. * x + A.dot(x)) < atol_float64
+
+
+def test_RLU_preconditioner():
+    m, k = 200, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T) + 1e-3 * np.random.randn(m, m) + np.eye(m)
+    b = np.random.randn(m)
+
+    rlu = RLU(k, oversample=10, shift=1.).fit(A - np.eye(m))
+
+    counts = []
+    for M in (None, rlu.aspreconditioner()):
+        count = [0]
+        def callback(_):
+            count[0] += 1
+        x, info = spla.gmres(A, b, M=M, callback=callback,
+                             callback_type='pr_norm')
+        assert info == 0
+        counts.append(count[0])
+
+    assert counts[1] < counts[0]
+
+    # ------------------------------------------------------------------------
+    # test the default unshifted preconditioner is nonsingular and converges
+    # on a nonsymmetric matrix, whose range and row space differ
+    A = np.eye(m) + 10 * np.random.randn(m, k).dot(np.random.randn(k, m))
+    A += 1e-2 * np.random.randn(m, m)
+    M = RLU(k, random_state=0).fit(A).aspreconditioner()
+
+    x, info = spla.gmres(A, b, M=M, rtol=1e-8, restart=m)
+    assert info == 0
+    assert relative_error(b, A.dot(x)) < 1e-6
+
+    # ------------------------------------------------------------------------
+    # test raises shifted solve of rectangular matrix
+    rlu = RLU(k, oversample=5).fit(A[:, :50])
+    assert_raises(ValueError, rlu.solve, b, shift=1.)
+    assert_raises(ValueError, rlu.aspreconditioner)
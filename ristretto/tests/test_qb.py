@@ -1,4 +1,6 @@
 import numpy as np
+from numpy.testing import assert_raises
+from scipy import sparse
 
 from ristretto.qb import compute_rqb
 
@@ -83,3 +85,36 @@ def test_rqb_block_wide_complex128():
     Ak = Q.dot(B)
 
     assert relative_error(A, Ak) < atol_float64
+
+
+def test_rqb_sparse():
+    m, n, k = 200, 100, 5
+    A = sparse.random(m, k, density=0.2, format='csr', random_state=1)
+    A = A.dot(sparse.random(k, n, density=0.2, format='csr', random_state=2))
+
+    for n_blocks in (1, 2):
+        Q, B = compute_rqb(A, k, n_blocks=n_blocks, random_state=0)
+        assert type(B) is np.ndarray
+        assert relative_error(A.toarray(), Q.dot(B)) < atol_float64
+
+
+def test_rqb_init_basis():
+    m, n, k = 200, 100, 10
+    U = np.linalg.qr(np.random.randn(m, n))[0]
+    V = np.linalg.qr(np.random.randn(n, n))[0]
+    A = (U * 1 / np.sqrt(np.arange(1, n + 1))).dot(V.T)
+
+    # ------------------------------------------------------------------------
+    # test the exact range is reproduced without subspace iterations
+    Q, B = compute_rqb(A, k, oversample=5, n_subspace=0, init_basis=U[:, :k],
+                       random_state=0)
+    assert Q.shape == (m, k + 5)
+    assert relative_error(U[:, :k], Q.dot(Q.T.dot(U[:, :k]))) < atol_float64
+
+    Q, B = compute_rqb(A, k, oversample=5, n_blocks=2, init_basis=U[:, :k],
+                       random_state=0)
+    assert Q.shape == (m, k + 5)
+
+    # ------------------------------------------------------------------------
+    # test invalid shape raises
+    assert_raises(ValueError, compute_rqb, A, k, init_basis=U[:n, :k])
@@ -0,0 +1,54 @@
+from __future__ import division
+
+import numpy as np
+from numpy.testing import assert_raises
+
+from ristretto.qr import compute_rqrcp
+
+from .utils import relative_error
+
+atol_float32 = 1e-4
+atol_float64 = 1e-8
+
+
+# =============================================================================
+# compute_rqrcp function
+# =============================================================================
+def test_rqrcp_full():
+    m, n = 120, 80
+    A = np.random.randn(m, n)
+
+    # ------------------------------------------------------------------------
+    # tests full factorization, with a partial last block
+    Q, R, P = compute_rqrcp(A, block_size=32, random_state=0)
+    assert Q.shape == (m, n) and R.shape == (n, n)
+    assert np.array_equal(np.sort(P), np.arange(n))
+    assert np.allclose(Q.T.dot(Q), np.eye(n))
+    assert np.allclose(R, np.triu(R))
+    assert relative_error(A[:, P], Q.dot(R)) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # tests wide complex input
+    A = np.random.randn(30, 50) + 1j * np.random.randn(30, 50)
+    Q, R, P = compute_rqrcp(A, block_size=8, random_state=0)
+    assert Q.shape == (30, 30) and R.shape == (30, 50)
+    assert relative_error(A[:, P], Q.dot(R)) < atol_float64
+
+
+def test_rqrcp_partial():
+    m, n, k = 200, 100, 10
+    A = np.random.randn(m, k).dot(np.random.randn(k, n))
+    A += 1e-6 * np.random.randn(m, n)
+
+    # ------------------------------------------------------------------------
+    # tests the pivots reveal the rank
+    Q, R, P = compute_rqrcp(A, rank=k+2, block_size=4, random_state=0)
+    assert Q.shape == (m, k+2) and R.shape == (k+2, n)
+    diag = np.abs(np.diag(R))
+    assert diag[k-1] > 1e3 * diag[k]
+    assert relative_error(A[:, P], Q.dot(R)) < atol_float32
+
+    # ------------------------------------------------------------------------
+    # tests invalid arguments
+    assert_raises(ValueError, compute_rqrcp, A, rank=n+1)
+    assert_raises(ValueError, compute_rqrcp, A, block_size=0)
@@ -1,8 +1,11 @@
 import numpy as np
+from scipy import sparse
 
-from ristretto.svd import compute_rsvd
+from ristretto import svd
+from ristretto.qb import compute_rqb
+from ristretto.svd import RSVD, compute_rsvd
 
-from .utils import relative_error
+from .utils import relative_error, peak_memory
 
 atol_float32 = 1e-4
 atol_float64 = 1e-8
@@ -54,3 +57,107 @@ def test_compute_rsvd_complex128():
     Ak = U.dot(np.diag(s).dot(Vt))
 
     assert relative_error(A, Ak) < atol_float64
+
+
+
+def test_compute_rsvd_shift():
+    m, n, k = 300, 200, 10
+    U = np.linalg.qr(np.random.randn(m, n))[0]
+    V = np.linalg.qr(np.random.randn(n, n))[0]
+    s_true = 1 / np.sqrt(np.arange(1, n + 1))
+    A = (U * s_true).dot(V.T)
+
+    # ------------------------------------------------------------------------
+    # test shifts improve the singular values of a slowly decaying spectrum
+    _, s, _ = compute_rsvd(A, k, n_subspace=4, random_state=0)
+    _, s_shift, _ = compute_rsvd(A, k, n_subspace=4, shift=True, random_state=0)
+
+    assert np.abs(s_shift - s_true[:k]).max() < np.abs(s - s_true[:k]).max()
+
+    # ------------------------------------------------------------------------
+    # test tolerance based stopping and sparse input
+    _, s, _ = compute_rsvd(sparse.csr_matrix(A), k, n_subspace=50, shift=True,
+                           tol=1e-4, random_state=0)
+    assert np.allclose(s, s_true[:k], rtol=1e-2)
+
+    # ------------------------------------------------------------------------
+    # test complex low rank input is reproduced
+    B = np.random.randn(m, k) + 1j * np.random.randn(m, k)
+    B = B.dot(B.conj().T)[:, :n]
+    U, s, Vt = compute_rsvd(B, k, n_subspace=2, shift=True, tol=1e-6)
+
+    assert relative_error(B, (U * s).dot(Vt)) < atol_float64
+
+
+def test_compute_rsvd_init_basis():
+    m, n, k = 300, 200, 10
+    U = np.linalg.qr(np.random.randn(m, n))[0]
+    V = np.linalg.qr(np.random.randn(n, n))[0]
+    s_true = 1 / np.sqrt(np.arange(1, n + 1))
+    A = (U * s_true).dot(V.T)
+
+    # ------------------------------------------------------------------------
+    # test warm start from a previous basis of a perturbed matrix
+    U0, _, _ = compute_rsvd(A, k, n_subspace=20, shift=True, tol=1e-6,
+                            random_state=0)
+    A += 1e-6 * np.random.randn(m, n)
+    _, s, _ = compute_rsvd(A, k, n_subspace=1, random_state=1)
+    _, s_warm, _ = compute_rsvd(A, k, n_subspace=1, init_basis=U0,
+                                random_state=1)
+    s_true = np.linalg.svd(A, compute_uv=False)[:k]
+
+    assert np.abs(s_warm - s_true).max() < np.abs(s - s_true).max()
+    assert np.allclose(s_warm, s_true, rtol=1e-4)
+
+
+def test_compute_rsvd_memory(monkeypatch):
+    m, n, k, p = 10000, 100, 5, 5
+    A = np.random.randn(m, n).astype(np.float64)
+
+    # no temporaries of the size of A
+    assert peak_memory(compute_rsvd, A, k, oversample=p) < A.nbytes
+
+    # the singular vectors are recovered without a `(m, k + p)` temporary,
+    # the QB decomposition is precomputed to measure this step alone
+    Q, B = compute_rqb(A, k, oversample=p)
+    monkeypatch.setattr(svd, 'compute_rqb', lambda *args, **kwargs: (Q, B))
+    assert peak_memory(compute_rsvd, A, k, oversample=p) < Q.nbytes
+
+
+# =============================================================================
+# RSVD class
+# =============================================================================
+def test_RSVD():
+    m, k = 100, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)
+
+    rsvd = RSVD(k, oversample=5)
+    Z = rsvd.fit_transform(A)
+
+    # ------------------------------------------------------------------------
+    # test transform of training data matches fit_transform
+    assert np.allclose(rsvd.transform(A), Z)
+
+    # ------------------------------------------------------------------------
+    # test out-of-sample rows from the same subspace are reconstructed
+    X = np.random.randn(30, m).dot(A)
+    assert relative_error(X, rsvd.inverse_transform(rsvd.transform(X))) < atol_float64
+
+    # ------------------------------------------------------------------------
+    # test chunked and sparse input
+    rsvd.set_params(chunk_size=7)
+    assert np.allclose(rsvd.transform(X), rsvd.transform(sparse.csr_matrix(X)))
+    assert np.allclose(rsvd.transform(X), X.dot(rsvd.Vt_.T))
+
+
+def test_RSVD_float32():
+    m, k = 100, 10
+    A = np.random.randn(m, k).astype(np.float64)
+    A = A.dot(A.T)
+
+    rsvd = RSVD(k, oversample=5, chunk_size=16, dtype=np.float32).fit(A)
+    Z = rsvd.transform(A)
+
+    assert Z.dtype == np.float32
+    assert relative_error(A, rsvd.inverse_transform(Z)) < atol_float32
@@ -1,7 +1,19 @@
 from __future__ import division
+import tracemalloc
 
 from scipy import linalg
 
 
 def relative_error(A, B):
     return linalg.norm(A - B) / linalg.norm(A)
+
+
+def peak_memory(func, *args, **kwargs):
+    """Peak memory in bytes allocated while calling func."""
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
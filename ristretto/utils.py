@@ -5,11 +5,24 @@ Utility Functions.
 #          Joseph Knox
 # License: GNU General Public License v3.0
 import numpy as np
+from scipy import sparse as sp
+
+
+def _asarray_chkfinite(A):
+    """converts A to array, or to CSR/CSC if sparse, raise ValueError if A
+    has inf or nan"""
+    if sp.issparse(A):
+        if A.format not in ('csr', 'csc'):
+            A = A.tocsr()
+        if not np.isfinite(A.data).all():
+            raise ValueError('array must not contain infs or NaNs')
+        return A
+    return np.asarray_chkfinite(A)
 
 
 def conjugate_transpose(A):
     """Performs conjugate transpose of A"""
-    if A.dtype == np.complexfloating:
+    if np.iscomplexobj(A):
         return A.conj().T
     return A.T
 
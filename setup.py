@@ -29,13 +29,6 @@ KEYWORDS = ['randomized algorithms',
             'matrix approximations']
 
 
-if sys.version_info[0] < 3:
-    # Python 2.*
-    import __builtin__ as builtins
-else:
-    import builtins
-
-
 def get_version():
     here = os.path.abspath(os.path.dirname(__file__))
     init_file = os.path.join(here, 'ristretto/__init__.py')
@@ -48,8 +41,13 @@ def get_version():
 
 VERSION = get_version()
 
-SCIPY_MIN_VERSION = '0.0.13'
-NUMPY_MIN_VERSION = '1.8.2'
+# eigh(subset_by_index=) needs SciPy 1.5, the tests use the rtol argument
+# of the SciPy 1.12 sparse solvers
+SCIPY_MIN_VERSION = '1.12.0'
+NUMPY_MIN_VERSION = '1.22.4'
+# Parallel(return_as=...)
+JOBLIB_MIN_VERSION = '1.3.0'
+SKLEARN_MIN_VERSION = '1.0'
 CYTHON_MIN_VERSION = '0.23'
 
 # Custom clean command to remove build artifacts from scikit-learn setup.py
@@ -86,9 +84,12 @@ cmdclass = {'clean': CleanCommand}
 extra_setuptools_args = dict(
     zip_safe=False,
     include_package_data=True,
+    python_requires='>=3.9',
     install_requires=[
         'numpy >= {0}'.format(NUMPY_MIN_VERSION),
         'scipy >= {0}'.format(SCIPY_MIN_VERSION),
+        'scikit-learn >= {0}'.format(SKLEARN_MIN_VERSION),
+        'joblib >= {0}'.format(JOBLIB_MIN_VERSION),
         ]
 )
 
@@ -107,9 +108,9 @@ def setup_package():
                         'Intended Audience :: Science/Research',
                         'Topic :: Scientific/Engineering :: Mathematics',
                         'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
-                        'Programming Language :: Python :: 2.7',
-                        'Programming Language :: Python :: 3.5',
-                        'Programming Language :: Python :: 3.6',
+                        'Programming Language :: Python :: 3',
+                        'Programming Language :: Python :: 3 :: Only',
+                        'Programming Language :: Python :: 3.9',
                     ],
                     test_suite='nose.collector',
                     cmdclass=cmdclass,